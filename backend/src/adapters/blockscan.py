@@ -1,19 +1,31 @@
 import logging
 import traceback
-from typing import Tuple, Generator, Optional
+from typing import Tuple, Generator, Optional, Dict, Any, List, Iterator
 
+import ijson
+import orjson
 import requests
 
+from adapters.client import HttpClient, get_bucket
+from exceptions.exceptions import BlockscanError, BlockscanRateLimitError, BlockscanEmptyResult
 from models.chain import Chain
+from models.checkpoint import IngestionCheckpoint
 from models.contract import Contract
-from models.transaction import Transaction
-from schemas.blockscan import BlockScanTransaction, TokenInfo
+from schemas.blockscan import TransactionBatch, TokenInfo
 from settings import settings
 
 
 class Blockscan:
     """ Blockscan API adapter """
 
+    client = HttpClient(pool_size=settings.blockscan_pool_size)
+
+    # 10k is maximum page size, but might cause timeouts
+    page_size = 5000
+
+    # API never returns transfers past page * offset of 10k
+    result_window = 10000
+
     @classmethod
     def _get_url_and_key(cls, chain: Chain) -> Tuple[str, str]:
         if chain.id == 1:
@@ -26,91 +38,394 @@ class Blockscan:
             raise ValueError('Invalid chain name')
 
     @classmethod
-    def _get_latest_block(cls, contract: Contract):
-        return Transaction.select(Transaction.block_number).where(
-            Transaction.contract == contract
-        ).order_by(
-            Transaction.block_number.desc()
-        ).limit(1).scalar() or 0
+    def get_throttle_key(cls, chain: Chain) -> str:
+        """ Key shared by contracts whose requests count against the same limit """
+        _, api_key = cls._get_url_and_key(chain)
+        return api_key
 
     @classmethod
-    def get_transactions(cls, contract: Contract) -> Generator[BlockScanTransaction, None, None]:
+    def _parse_response(cls, response: requests.Response) -> Any:
+        """ Get result out of blockscan response, raising typed errors for error responses """
 
-        url, api_key = cls._get_url_and_key(contract.chain)
-        logging.info(f'Get Transactions for {contract.token_name} ({contract.address} on {contract.chain.name})')
+        response.raise_for_status()
+        return cls._get_result(orjson.loads(response.content))
+
+    @classmethod
+    def _parse_stream(cls, response: requests.Response) -> Iterator[Dict[str, Any]]:
+        """ Get result list out of blockscan response, parsing its items as they are iterated over.
+
+            Response is read up to the start of the result list right away, so error responses raise
+            typed errors here, same as with _parse_response.
+        """
+
+        response.raise_for_status()
+
+        events = ijson.parse(_ResponseStream(response))
+        builder = ijson.ObjectBuilder()
+
+        for prefix, event, value in events:
+            if prefix == 'result' and event == 'start_array' and builder.value.get('status') == '1':
+                return cls._stream_items(response, events)
+
+            builder.event(event, value)
+
+        return iter(cls._get_result(builder.value))
+
+    @classmethod
+    def _stream_items(cls, response: requests.Response, events: Iterator[Tuple[str, str, Any]]):
+        """ Build items of result list out of parser events """
+
+        try:
+            builder = None
+
+            for prefix, event, value in events:
+                if prefix == 'result' and event == 'end_array':
+                    return
+
+                if builder is None:
+                    builder = ijson.ObjectBuilder()
+
+                builder.event(event, value)
+
+                if prefix == 'result.item' and event == 'end_map':
+                    yield builder.value
+                    builder = None
+        finally:
+            response.close()
+
+    @classmethod
+    def _get_result(cls, data: Dict[str, Any]) -> Any:
+        """ Get result out of parsed blockscan response, raising typed errors for error responses """
+
+        result = data.get('result')
+
+        # proxy module responds in JSON-RPC format
+        if 'jsonrpc' in data:
+            if 'error' in data:
+                raise BlockscanError(data['error'].get('message', 'JSON-RPC error'))
+            return result
+
+        if data.get('status') == '1':
+            if not result:
+                raise BlockscanEmptyResult(data.get('message') or 'No records found')
+            return result
+
+        # error details are in result, e.g. {"status":"0","message":"NOTOK","result":"Max rate limit reached"}
+        message = result if isinstance(result, str) and result else data.get('message', '')
+
+        if 'rate limit' in message.lower():
+            raise BlockscanRateLimitError(message)
 
+        if not result or message.lower().startswith('no '):
+            raise BlockscanEmptyResult(message)
+
+        raise BlockscanError(message)
+
+    @classmethod
+    def _request(cls, chain: Chain, params: Dict[str, Any], stream: bool = False) -> Any:
+        """ Make rate limited blockscan API request, retrying when rate limit is hit
+
+            Args:
+                chain - chain to make request to
+                params - request params, except for API key
+                stream - return iterator over result list, parsing response body as it is read
+
+            Returns:
+                result field of response
+        """
+        url, api_key = cls._get_url_and_key(chain)
+
+        return cls.client.get(
+            url,
+            parse=cls._parse_stream if stream else cls._parse_response,
+            params={**params, 'apikey': api_key},
+            stream=stream,
+            buckets=[
+                get_bucket(f'blockscan-key:{api_key}', settings.blockscan_rate_limit),
+                get_bucket(f'blockscan-chain:{chain.id}', settings.blockscan_chain_rate_limit),
+            ],
+            retry_on=(BlockscanRateLimitError,),
+            max_retries=settings.blockscan_max_retries,
+            backoff=settings.blockscan_backoff,
+            timeout=settings.blockscan_timeout,
+        )
+
+    @classmethod
+    def _get_action_type(cls, contract: Contract) -> str:
         if contract.erc_standard == 20:
-            action_type = 'tokentx'
+            return 'tokentx'
         elif contract.erc_standard == 721:
-            action_type = 'tokennfttx'
+            return 'tokennfttx'
         elif contract.erc_standard == 1155:
-            action_type = 'token1155tx'
+            return 'token1155tx'
         else:
             raise ValueError('Invalid contract type')
 
+    @classmethod
+    def get_block_number(cls, chain: Chain) -> int:
+        """ Get number of the most recent block on chain """
+
+        return int(cls._request(chain, {'module': 'proxy', 'action': 'eth_blockNumber'}), 16)
+
+    @classmethod
+    def get_first_block(cls, contract: Contract) -> Optional[int]:
+        """ Get block of the first transfer of contract token, None if there are no transfers """
+
         params = {
             'module': 'account',
-            'action': action_type,
+            'action': cls._get_action_type(contract),
             'contractaddress': contract.address,
             'sort': 'asc',
-            'offset': 5000,  # 10k is maximum, but might cause timeouts
-            'apikey': api_key,
+            'offset': 1,
             'page': 1,
+            'startblock': 0,
             'endblock': 'latest'
         }
 
-        latest_block = cls._get_latest_block(contract)
-        while True:
+        try:
+            items = cls._request(contract.chain, params)
+        except BlockscanEmptyResult:
+            return None
+
+        return int(items[0]['blockNumber'])
+
+    @classmethod
+    def get_transactions(
+            cls,
+            contract: Contract,
+            start_block: Optional[int] = None,
+            end_block: Optional[int] = None,
+    ) -> Generator[TransactionBatch, None, None]:
+        """ Get token transfers of contract in ascending block order, as batches of whole blocks
+
+            Args:
+                contract - contract to get transfers of
+                start_block - first block to fetch, defaults to the block following the ingestion checkpoint
+                end_block - last block to fetch, defaults to the latest block
+
+            Returns:
+                generator of transfer batches, fetching pages as it goes
+        """
+
+        logging.info(f'Get Transactions for {contract.token_name} ({contract.address} on {contract.chain.name})')
+
+        params = {
+            'module': 'account',
+            'action': cls._get_action_type(contract),
+            'contractaddress': contract.address,
+            'sort': 'asc',
+            'offset': cls.page_size,
+            'page': 1,
+            'endblock': end_block if end_block is not None else 'latest'
+        }
+
+        if start_block is None:
+            start_block = IngestionCheckpoint.get_for(contract).block + 1
+
+        retries = 0
+
+        while end_block is None or start_block <= end_block:
+
+            params['startblock'] = start_block
+            logging.info(f'Start block: {start_block}')
+
+            items = cls._get_items(contract, params)
+
+            # transfers of blocks known to be complete, and of the last block seen, that may continue on the next page
+            complete: List[Dict[str, Any]] = []
+            current: List[Dict[str, Any]] = []
+            first_block = block = None
+            resume_block = start_block
+            count = 0
+
+            try:
+                for item in items:
+                    count += 1
+                    item_block = int(item['blockNumber'])
+
+                    if item_block != block:
+                        complete.extend(current)
+                        current, block = [], item_block
+
+                        if first_block is None:
+                            first_block = block
+
+                        if len(complete) >= settings.ingestion_batch_size:
+                            yield TransactionBatch.from_items(complete)
+                            complete, resume_block = [], block
 
-            params['startblock'] = latest_block + 1
-            logging.info(f'Latest block: {latest_block}')
-            r = requests.get(url, params=params)
-            items = r.json()['result']
+                    current.append(item)
+            except (requests.RequestException, ijson.JSONError) as e:
+                if retries >= settings.blockscan_max_retries:
+                    raise
 
-            if not items:
-                logging.info(f'No more items: {r.text}')
+                # transfers up to resume block are passed on already
+                retries += 1
+                logging.warning(f'Reading page from block {start_block} failed ({e!r}), retry {retries}')
+                start_block = resume_block
+                continue
+
+            retries = 0
+
+            if not count:
                 break
 
-            logging.info(f'Got {len(items)} items')
+            logging.info(f'Got {count} items')
+            logging.info(f'Latest block from received transactions: {block}')
+
+            if count < cls.page_size:
+                # page holds all transfers up to the end block
+                yield TransactionBatch.from_items(complete + current)
+                start_block = block + 1
+            elif first_block == block:
+                # whole page is a single block, page through the block itself
+                yield TransactionBatch.from_items(cls._get_block_transactions(contract, params, block, current))
+                start_block = block + 1
+            else:
+                # last block may continue on the next page, so it is fetched again from its beginning
+                if complete:
+                    yield TransactionBatch.from_items(complete)
+                start_block = block
+
+    @classmethod
+    def _get_items(cls, contract: Contract, params: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """ Items of a transfer list page, parsed from the response body as they are iterated over if streaming
+            is enabled, so only a part of the page is held in memory at a time
+        """
+        if not settings.blockscan_streaming:
+            return iter(cls._get_page(contract, params))
+
+        try:
+            return cls._request(contract.chain, params, stream=True)
+        except BlockscanEmptyResult as e:
+            logging.info(f'No more items: {e.message}')
+            return iter([])
+
+    @classmethod
+    def _get_page(cls, contract: Contract, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        try:
+            return cls._request(contract.chain, params)
+        except BlockscanEmptyResult as e:
+            logging.info(f'No more items: {e.message}')
+            return []
+
+    @classmethod
+    def _get_block_transactions(
+            cls,
+            contract: Contract,
+            params: Dict[str, Any],
+            block: int,
+            first_page: List[Dict[str, Any]],
+    ) -> List[Dict[str, Any]]:
+        """ Get all transfers of a block holding more transfers than a single page.
+
+            Block is paged through by page number, up to the API result window. Transfers beyond the window
+            are fetched from the end of the block in descending order and joined with ascending ones
+            where both windows overlap.
 
-            items = [BlockScanTransaction(**item) for item in items]
-            new_latest_block = max(items, key=lambda x: x.block_number).block_number
+            Args:
+                contract - contract to get transfers of
+                params - request params of the page that hit the block
+                block - block number
+                first_page - first page of the block
 
-            logging.info(f'Latest block from received transactions: {new_latest_block}')
+            Returns:
+                transfers of the block in ascending order
+        """
+        logging.info(f'Block {block} holds more than {cls.page_size} transfers, paging through it')
 
-            yield from items
+        params = {**params, 'startblock': block, 'endblock': block}
+        pages = cls.result_window // cls.page_size
 
-            if new_latest_block == latest_block and len(items) == params['offset']:
-                logging.warning(
-                    f'Block has more transactions than data window is capable of returning. '
-                    f'To avoid infinite loop contract {contract.address} will be skipped'
-                )
+        ascending = list(first_page)
+
+        for page in range(2, pages + 1):
+            items = cls._get_page(contract, {**params, 'page': page})
+            ascending.extend(items)
+
+            if len(items) < cls.page_size:
+                return ascending
+
+        # result window is exhausted, fetch the rest of the block from its end
+        descending: List[Dict[str, Any]] = []
+        keys = [cls._transfer_key(item) for item in ascending]
+
+        for page in range(1, pages + 1):
+            items = cls._get_page(contract, {**params, 'sort': 'desc', 'page': page})
+            descending.extend(items)
+
+            tail = list(reversed(descending))
+            overlap = cls._find_overlap(keys, [cls._transfer_key(item) for item in tail])
+
+            if overlap is not None:
+                return ascending + tail[overlap:]
+
+            if len(items) < cls.page_size:
                 break
 
-            latest_block = new_latest_block
+        logging.error(
+            f'Block {block} of {contract.address} holds more transfers than API is capable of returning, '
+            f'{len(ascending) + len(descending)} transfers from both ends of the block are used'
+        )
+        return ascending + list(reversed(descending))
+
+    @classmethod
+    def _transfer_key(cls, item: Dict[str, Any]) -> Tuple:
+        return (
+            item['hash'], item['from'], item['to'], item.get('tokenValue'), item.get('value'), item.get('tokenID')
+        )
+
+    @classmethod
+    def _find_overlap(cls, head: List[Tuple], tail: List[Tuple]) -> Optional[int]:
+        """ Find length of the longest suffix of head that is a prefix of tail
+
+            Returns:
+                overlap length, None if head and tail don't meet
+        """
+        if not tail:
+            return None
+
+        positions = [i for i, key in enumerate(head) if key == tail[0]]
+
+        for position in positions:
+            overlap = len(head) - position
+            if head[position:] == tail[:overlap]:
+                return overlap
+
+        return None
 
     @classmethod
     def get_info(cls, contract_address: str, chain: Chain) -> Optional[TokenInfo]:
-        url, api_key = cls._get_url_and_key(chain)
 
         params = {
             'module': 'token',
             'action': 'tokeninfo',
             'contractaddress': contract_address,
-            'apikey': api_key,
         }
 
-        r = requests.get(url, params=params)
-
-        data = r.json()
-
-        if data['status'] != '1':
-            logging.info(data)
-            raise ValueError(data['message'])
+        try:
+            result = cls._request(chain, params)
+        except BlockscanEmptyResult:
+            return None
 
         try:
-            return TokenInfo(**r.json()['result'][0])
+            return TokenInfo(**result[0])
         except Exception:
             traceback.print_exc()
             return None
 
+
+class _ResponseStream:
+    """ File-like view of response body for the JSON parser, decoded and read chunk by chunk """
+
+    chunk_size = 64 * 1024
+
+    def __init__(self, response: requests.Response):
+        self.chunks = response.iter_content(self.chunk_size)
+
+    def read(self, size: int = -1) -> bytes:
+        # parser probes the type of data with an empty read
+        if size == 0:
+            return b''
+
+        return next(self.chunks, b'')
@@ -0,0 +1,151 @@
+import logging
+import random
+import threading
+import time
+from typing import Optional, Dict, Any, Callable, Iterable, Tuple, Type
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class TokenBucket:
+    """ Thread safe token bucket. Allows bursts of up to `capacity` requests and `rate` requests per second
+        on average
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        """ Initialize token bucket.
+
+            Args:
+                rate - tokens added per second
+                capacity - maximum amount of tokens, defaults to rate
+        """
+
+        self.rate = rate
+        self.capacity = max(capacity or rate, 1)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """ Take one token, blocking until it is available """
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                wait = (1 - self._tokens) / self.rate
+
+            time.sleep(wait)
+
+
+_buckets: Dict[str, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def get_bucket(name: str, rate: float) -> TokenBucket:
+    """ Get process-wide token bucket by name, creating it on first use
+
+        Args:
+            name - bucket name, e.g. API key or host the limit applies to
+            rate - requests per second allowed by the bucket
+
+        Returns:
+            token bucket shared by all callers using the same name
+    """
+    with _buckets_lock:
+        bucket = _buckets.get(name)
+
+        if bucket is None or bucket.rate != rate:
+            bucket = _buckets[name] = TokenBucket(rate)
+
+        return bucket
+
+
+class HttpClient:
+    """ HTTP client with keep-alive connection pooling, token bucket rate limiting
+        and retries with jittered exponential backoff. Safe to share between threads.
+    """
+
+    retry_statuses = {429, 500, 502, 503, 504}
+
+    def __init__(self, pool_size: int = 10):
+        """ Initialize client.
+
+            Args:
+                pool_size - maximum amount of kept-alive connections per host
+        """
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def request(
+            self,
+            method: str,
+            url: str,
+            parse: Callable[[requests.Response], Any],
+            buckets: Iterable[TokenBucket] = (),
+            retry_on: Tuple[Type[Exception], ...] = (),
+            max_retries: int = 5,
+            backoff: float = 0.5,
+            timeout: float = 30,
+            **kwargs,
+    ) -> Any:
+        """ Make a request and parse the response, retrying on connection errors, throttling statuses
+            and errors listed in retry_on raised by parse.
+
+            Args:
+                method - HTTP method
+                url - request url
+                parse - turns response into the result, may raise errors from retry_on to retry the request
+                buckets - token buckets to take a token from before each attempt
+                retry_on - errors raised by parse that should be retried
+                max_retries - how many times to retry before giving up
+                backoff - base delay of exponential backoff in seconds
+                timeout - request timeout in seconds
+                kwargs - passed to requests
+
+            Returns:
+                parsed response
+        """
+
+        attempt = 0
+
+        while True:
+            for bucket in buckets:
+                bucket.acquire()
+
+            try:
+                response = self.session.request(method, url, timeout=timeout, **kwargs)
+
+                if response.status_code in self.retry_statuses:
+                    response.raise_for_status()
+
+                return parse(response)
+            except (requests.ConnectionError, requests.Timeout, requests.HTTPError, *retry_on) as e:
+                retryable_status = not isinstance(e, requests.HTTPError) or (
+                    e.response is not None and e.response.status_code in self.retry_statuses
+                )
+
+                if attempt >= max_retries or not retryable_status:
+                    raise
+
+                # "full jitter" backoff, spreads retries of concurrent workers hitting the same limit
+                delay = random.uniform(0, backoff * 2 ** attempt)
+                logging.warning(f'{method} {url} failed ({e!r}), retry {attempt + 1}/{max_retries} in {delay:.2f}s')
+                time.sleep(delay)
+                attempt += 1
+
+    def get(self, url: str, parse: Callable[[requests.Response], Any], **kwargs) -> Any:
+        return self.request('GET', url, parse, **kwargs)
+
+    def post(self, url: str, parse: Callable[[requests.Response], Any], **kwargs) -> Any:
+        return self.request('POST', url, parse, **kwargs)
@@ -0,0 +1,394 @@
+import logging
+from typing import Any, Dict, Generator, List, Optional, Sequence, Tuple, Union
+
+import orjson
+import requests
+
+from adapters.client import HttpClient, get_bucket
+from exceptions.exceptions import RpcError, RpcRateLimitError, RpcLimitError
+from models.chain import Chain
+from models.checkpoint import IngestionCheckpoint
+from models.contract import Contract
+from schemas.blockscan import TransactionBatch
+from settings import settings
+
+# keccak of the event signatures
+TRANSFER_TOPIC = '0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef'
+TRANSFER_SINGLE_TOPIC = '0xc3d58168c5ae7397731d063d5bbf3d657854427343f4c083240f7aacaa2d0f62'
+TRANSFER_BATCH_TOPIC = '0x4a39dc06d4c0dbc64b70af90fd698a233a518aa5d07e595d983b8c0526c8f7fb'
+
+# selectors of the token balance functions
+BALANCE_OF_SELECTOR = '0x70a08231'  # balanceOf(address)
+OWNER_OF_SELECTOR = '0x6352211e'  # ownerOf(uint256)
+BALANCE_OF_BATCH_SELECTOR = '0x4e1273f4'  # balanceOfBatch(address[],uint256[])
+
+# fragments of error messages nodes use for over-sized eth_getLogs calls, e.g.
+# "query returned more than 10000 results", "block range is too wide", "response size exceeded"
+LIMIT_ERRORS = ('more than', 'too many', 'range', 'too large', 'too wide', 'size exceeded', 'limit exceeded')
+
+
+class Rpc:
+    """ Transfer source reading token transfer logs straight from an RPC node of the chain """
+
+    client = HttpClient(pool_size=settings.rpc_pool_size)
+
+    @classmethod
+    def _get_url(cls, chain: Chain) -> str:
+        url = settings.rpc_endpoints.get(chain.id)
+
+        if not url:
+            raise ValueError(f'No RPC endpoint configured for chain {chain.id}')
+
+        return url
+
+    @classmethod
+    def get_throttle_key(cls, chain: Chain) -> str:
+        """ Key shared by contracts whose requests count against the same limit """
+        return cls._get_url(chain)
+
+    @classmethod
+    def _get_error(cls, error: Dict[str, Any]) -> RpcError:
+        message = error.get('message') or 'JSON-RPC error'
+        code = error.get('code')
+        lower = message.lower()
+
+        if code == 429 or 'rate limit' in lower or 'too many requests' in lower or 'rate exceeded' in lower:
+            return RpcRateLimitError(message, code)
+
+        if any(fragment in lower for fragment in LIMIT_ERRORS):
+            return RpcLimitError(message, code)
+
+        return RpcError(message, code)
+
+    @classmethod
+    def _parse_batch(cls, response: requests.Response) -> List[Union[Any, RpcError]]:
+        """ Get results out of batch response in the order of calls. Calls that failed get their error
+            in place of the result, a rate limited batch raises so it is retried as a whole
+        """
+
+        response.raise_for_status()
+        data = orjson.loads(response.content)
+
+        # whole batch was rejected
+        if isinstance(data, dict):
+            raise cls._get_error(data.get('error') or {})
+
+        responses = sorted(data, key=lambda item: item['id'])
+        results = [cls._get_error(item['error']) if 'error' in item else item.get('result') for item in responses]
+
+        for result in results:
+            if isinstance(result, RpcRateLimitError):
+                raise result
+
+        return results
+
+    @classmethod
+    def _batch(cls, chain: Chain, calls: Sequence[Tuple[str, list]]) -> List[Union[Any, RpcError]]:
+        """ Make rate limited JSON-RPC batch request, retrying when rate limit is hit
+
+            Args:
+                chain - chain to make request to
+                calls - method and params of each call
+
+            Returns:
+                result or error of each call, in the order of calls
+        """
+
+        if not calls:
+            return []
+
+        url = cls._get_url(chain)
+
+        return cls.client.post(
+            url,
+            parse=cls._parse_batch,
+            json=[
+                {'jsonrpc': '2.0', 'id': i, 'method': method, 'params': params}
+                for i, (method, params) in enumerate(calls)
+            ],
+            buckets=[get_bucket(f'rpc:{url}', settings.rpc_rate_limit)],
+            retry_on=(RpcRateLimitError,),
+            max_retries=settings.rpc_max_retries,
+            backoff=settings.rpc_backoff,
+            timeout=settings.rpc_timeout,
+        )
+
+    @classmethod
+    def _call(cls, chain: Chain, method: str, params: list) -> Any:
+        result, = cls._batch(chain, [(method, params)])
+
+        if isinstance(result, RpcError):
+            raise result
+
+        return result
+
+    @classmethod
+    def get_block_number(cls, chain: Chain) -> int:
+        """ Get number of the most recent block on chain """
+
+        return int(cls._call(chain, 'eth_blockNumber', []), 16)
+
+    @classmethod
+    def get_first_block(cls, contract: Contract) -> Optional[int]:
+        """ Get block contract was deployed in, found by binary search over its code. No transfer can precede it.
+            Falls back to the genesis block if the node doesn't keep historical state.
+
+            Returns:
+                block number, None if there is no contract at the address
+        """
+
+        tip = cls.get_block_number(contract.chain)
+
+        def has_code(block: int) -> bool:
+            return cls._call(contract.chain, 'eth_getCode', [contract.address, hex(block)]) not in (None, '0x')
+
+        if not has_code(tip):
+            return None
+
+        low, high = 0, tip
+
+        try:
+            while low < high:
+                middle = (low + high) // 2
+                if has_code(middle):
+                    high = middle
+                else:
+                    low = middle + 1
+        except RpcError as e:
+            logging.warning(f'Could not find deployment block of {contract.address} ({e.message}), using genesis block')
+            return 0
+
+        return low
+
+    @classmethod
+    def _get_topics(cls, contract: Contract) -> List[List[str]]:
+        if contract.erc_standard in (20, 721):
+            return [[TRANSFER_TOPIC]]
+        elif contract.erc_standard == 1155:
+            return [[TRANSFER_SINGLE_TOPIC, TRANSFER_BATCH_TOPIC]]
+        else:
+            raise ValueError('Invalid contract type')
+
+    @classmethod
+    def get_transactions(
+            cls,
+            contract: Contract,
+            start_block: Optional[int] = None,
+            end_block: Optional[int] = None,
+    ) -> Generator[TransactionBatch, None, None]:
+        """ Get token transfers of contract in ascending block order, as batches of whole blocks.
+
+            Logs are fetched with eth_getLogs over consecutive block windows, several windows per batch request.
+            A window the node refuses as too large is halved and the batch continues from it, the window is doubled
+            after a batch that went through in full.
+
+            Args:
+                contract - contract to get transfers of
+                start_block - first block to fetch, defaults to the block following the ingestion checkpoint
+                end_block - last block to fetch, defaults to the latest block
+
+            Returns:
+                generator of transfer batches, fetching logs as it goes
+        """
+
+        logging.info(f'Get logs of {contract.token_name} ({contract.address} on {contract.chain.name})')
+
+        if start_block is None:
+            start_block = IngestionCheckpoint.get_for(contract).block + 1
+
+        tip = cls.get_block_number(contract.chain)
+        end_block = tip if end_block is None else min(end_block, tip)
+        topics = cls._get_topics(contract)
+        window = settings.rpc_log_window
+
+        while start_block <= end_block:
+            windows = []
+
+            while len(windows) < settings.rpc_batch_size and start_block + len(windows) * window <= end_block:
+                first = start_block + len(windows) * window
+                windows.append((first, min(first + window - 1, end_block)))
+
+            results = cls._batch(contract.chain, [
+                ('eth_getLogs', [{
+                    'address': contract.address,
+                    'topics': topics,
+                    'fromBlock': hex(first),
+                    'toBlock': hex(last),
+                }])
+                for first, last in windows
+            ])
+
+            logs = []
+
+            for (first, last), result in zip(windows, results):
+                if isinstance(result, RpcLimitError) and last > first:
+                    window = max((last - first + 1) // 2, 1)
+                    logging.info(f'Blocks {first}-{last} refused ({result.message}), window reduced to {window}')
+                    break
+
+                if isinstance(result, RpcError):
+                    raise result
+
+                logs.extend(result)
+                start_block = last + 1
+            else:
+                window = min(window * 2, settings.rpc_log_window_max)
+
+            if logs:
+                yield cls._decode_logs(contract, logs, tip)
+
+    @classmethod
+    def _decode_logs(cls, contract: Contract, logs: List[Dict[str, Any]], tip: int) -> TransactionBatch:
+        """ Decode transfer logs into batch of transfers. ERC1155 batch transfers yield a row per token """
+
+        logs = sorted(
+            (log for log in logs if not log.get('removed')),
+            key=lambda log: (int(log['blockNumber'], 16), int(log['logIndex'], 16)),
+        )
+
+        timestamps = cls._get_timestamps(contract.chain, logs)
+        columns: Dict[str, list] = {column: [] for column in TransactionBatch.COLUMNS}
+
+        for log in logs:
+            block = int(log['blockNumber'], 16)
+            topics = log['topics']
+            words = _words(log['data'])
+
+            if topics[0] == TRANSFER_TOPIC:
+                # ERC721 indexes token id, ERC20 puts value into data
+                from_address, to_address = _address(topics[1]), _address(topics[2])
+                if len(topics) == 4:
+                    transfers = [(int(topics[3], 16), None)]
+                else:
+                    transfers = [(None, words[0])]
+            elif topics[0] == TRANSFER_SINGLE_TOPIC:
+                from_address, to_address = _address(topics[2]), _address(topics[3])
+                transfers = [(words[0], words[1])]
+            else:
+                # (uint256[] ids, uint256[] values), each array is an offset to its length followed by items
+                from_address, to_address = _address(topics[2]), _address(topics[3])
+                ids_at, values_at = words[0] // 32, words[1] // 32
+                count = words[ids_at]
+                transfers = list(zip(words[ids_at + 1:ids_at + 1 + count], words[values_at + 1:values_at + 1 + count]))
+
+            for token_id, value in transfers:
+                columns['block_number'].append(block)
+                columns['timestamp'].append(timestamps[block])
+                columns['hash'].append(log['transactionHash'])
+                columns['nonce'].append(None)
+                columns['block_hash'].append(log['blockHash'])
+                columns['index'].append(int(log['transactionIndex'], 16))
+                columns['log_index'].append(int(log['logIndex'], 16))
+                columns['from_address'].append(from_address)
+                columns['to_address'].append(to_address)
+                columns['value'].append(value)
+                columns['gas'].append(None)
+                columns['gas_price'].append(None)
+                columns['gas_used'].append(None)
+                columns['cumulative_gas_used'].append(None)
+                columns['token_id'].append(token_id)
+                columns['confirmations'].append(tip - block)
+
+        return TransactionBatch(**columns)
+
+    @classmethod
+    def _get_timestamps(cls, chain: Chain, logs: List[Dict[str, Any]]) -> Dict[int, int]:
+        """ Timestamps of blocks logs are in, taken from logs where node includes them or fetched with block headers """
+
+        timestamps = {
+            int(log['blockNumber'], 16): int(log['blockTimestamp'], 16) for log in logs if log.get('blockTimestamp')
+        }
+        missing = sorted({int(log['blockNumber'], 16) for log in logs} - timestamps.keys())
+
+        for i in range(0, len(missing), settings.rpc_batch_size):
+            blocks = missing[i:i + settings.rpc_batch_size]
+            headers = cls._batch(chain, [('eth_getBlockByNumber', [hex(block), False]) for block in blocks])
+
+            for block, header in zip(blocks, headers):
+                if isinstance(header, RpcError):
+                    raise header
+                timestamps[block] = int(header['timestamp'], 16)
+
+        return timestamps
+
+    @classmethod
+    def get_balances(
+            cls,
+            contract: Contract,
+            address: str,
+            token_ids: Sequence[int] = (),
+    ) -> List[Tuple[Optional[int], int]]:
+        """ Get current balances of wallet straight from the contract, with one batch request.
+
+            ERC20 balance is returned without token id. Of ERC721, owned given tokens are returned with balance 1
+            each and the rest of the balance without token id. ERC1155 balances are returned of given tokens only.
+
+            Args:
+                contract - contract to get balances of
+                address - wallet address
+                token_ids - tokens to get balances of
+
+            Returns:
+                token id and balance pairs
+        """
+
+        word = address[2:].lower().rjust(64, '0')
+        token_ids = sorted(set(token_ids))
+
+        if contract.erc_standard == 1155:
+            if not token_ids:
+                return []
+
+            # offsets of the two arrays, then each array as its length followed by items
+            count = len(token_ids)
+            data = BALANCE_OF_BATCH_SELECTOR + ''.join([
+                f'{64:064x}', f'{96 + 32 * count:064x}',
+                f'{count:064x}', *([word] * count),
+                f'{count:064x}', *(f'{token_id:064x}' for token_id in token_ids),
+            ])
+
+            words = _words(cls._call(contract.chain, 'eth_call', [{'to': contract.address, 'data': data}, 'latest']))
+
+            if not words:
+                raise RpcError(f'No balances returned by {contract.address}')
+
+            values_at = words[0] // 32
+
+            return list(zip(token_ids, words[values_at + 1:values_at + 1 + words[values_at]]))
+
+        calls = [('eth_call', [{'to': contract.address, 'data': BALANCE_OF_SELECTOR + word}, 'latest'])]
+
+        if contract.erc_standard == 721:
+            calls += [
+                ('eth_call', [{'to': contract.address, 'data': f'{OWNER_OF_SELECTOR}{token_id:064x}'}, 'latest'])
+                for token_id in token_ids
+            ]
+
+        balance, *owners = cls._batch(contract.chain, calls)
+
+        if isinstance(balance, RpcError):
+            raise balance
+
+        if not _words(balance):
+            raise RpcError(f'No balance returned by {contract.address}')
+
+        balance = _words(balance)[0]
+
+        # ownerOf reverts for tokens that don't exist
+        owned = [
+            token_id for token_id, owner in zip(token_ids, owners)
+            if not isinstance(owner, RpcError) and _address(owner) == '0x' + word[-40:]
+        ]
+
+        return [(token_id, 1) for token_id in owned] + [(None, balance - len(owned))]
+
+
+def _address(topic: str) -> str:
+    """ Address out of 32 byte topic """
+    return '0x' + topic[-40:]
+
+
+def _words(data: str) -> List[int]:
+    """ Log data split into 32 byte words """
+    data = data[2:]
+    return [int(data[i:i + 64], 16) for i in range(0, len(data), 64)]
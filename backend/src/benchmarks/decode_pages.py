@@ -0,0 +1,86 @@
+""" Compare decoding of blockscan transfer list pages: pydantic model per transfer vs columnar batch.
+
+    python -m benchmarks.decode_pages [--items 5000] [--repeat 20]
+"""
+import argparse
+import json
+import timeit
+
+import orjson
+
+from schemas.blockscan import BlockScanTransaction, TransactionBatch
+
+COLUMNS = TransactionBatch.COLUMNS
+
+
+def make_page(items: int) -> bytes:
+    """ Body of a tokentx page with given number of transfers """
+    result = [
+        {
+            "blockNumber": str(15000000 + i // 10),
+            "timeStamp": str(1660000000 + i),
+            "hash": f"0x{i:064x}",
+            "nonce": str(i),
+            "blockHash": f"0x{i // 10:064x}",
+            "from": f"0x{i:040x}",
+            "contractAddress": "0xdac17f958d2ee523a2206206994597c13d831ec7",
+            "to": f"0x{i + 1:040x}",
+            "value": str(10 ** 18 + i),
+            "tokenName": "Tether USD",
+            "tokenSymbol": "USDT",
+            "tokenDecimal": "6",
+            "transactionIndex": str(i % 200),
+            "gas": "94813",
+            "gasPrice": "30052496546",
+            "gasUsed": "63209",
+            "cumulativeGasUsed": "10750072",
+            "input": "deprecated",
+            "confirmations": "12214889",
+        }
+        for i in range(items)
+    ]
+    return json.dumps({"status": "1", "message": "OK", "result": result}).encode()
+
+
+def decode_models(body: bytes) -> list:
+    """ Previous path: stdlib json, a model per transfer, then row tuples """
+    transactions = [BlockScanTransaction(**item) for item in json.loads(body)['result']]
+    return [
+        (
+            transaction.block_number, transaction.timestamp, transaction.hash, transaction.nonce,
+            transaction.block_hash, transaction.transaction_index, transaction.log_index, transaction.from_address,
+            transaction.to_address, transaction.get_value(), transaction.gas, transaction.gas_price,
+            transaction.gas_used, transaction.cumulative_gas_used, transaction.token_id, transaction.confirmations,
+        )
+        for transaction in transactions
+    ]
+
+
+def decode_columns(body: bytes) -> list:
+    """ Current path: orjson straight into columns, rows zipped out of them """
+    return list(TransactionBatch.from_items(orjson.loads(body)['result']).rows(COLUMNS))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--items', type=int, default=5000, help='transfers per page')
+    parser.add_argument('--repeat', type=int, default=20, help='pages decoded per path')
+    args = parser.parse_args()
+
+    body = make_page(args.items)
+    assert len(decode_models(body)) == len(decode_columns(body)) == args.items
+
+    print(f'page of {args.items} transfers, {len(body) / 1024 / 1024:.1f} MB')
+
+    baseline = None
+    for name, decode in (('models', decode_models), ('columns', decode_columns)):
+        seconds = min(timeit.repeat(lambda: decode(body), number=1, repeat=args.repeat))
+        baseline = baseline or seconds
+        print(
+            f'{name:>8}: {seconds * 1000:8.1f} ms/page {args.items / seconds:12,.0f} rows/s '
+            f'{baseline / seconds:5.1f}x'
+        )
+
+
+if __name__ == '__main__':
+    main()
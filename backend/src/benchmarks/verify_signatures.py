@@ -0,0 +1,64 @@
+""" Compare signature verifications per second: web3 recoverHash vs each available recovery backend.
+
+    python -m benchmarks.verify_signatures [--items 200] [--repeat 5]
+"""
+import argparse
+import timeit
+
+from eth_account import Account
+from eth_account.messages import encode_defunct
+
+from services.signature import get_backends, recover_addresses
+from services.verification import VerificationService
+
+
+def make_items(items: int) -> list:
+    """ Address, message and signature of distinct wallets, as submitted to /verification/verify """
+    result = []
+
+    for i in range(items):
+        account = Account.from_key((i + 1).to_bytes(32, 'big'))
+        message = VerificationService.get_message(account.address.lower(), 1674728600 + i)
+        signature = account.sign_message(encode_defunct(text=message)).signature.hex()
+        result.append((account.address.lower(), message, signature))
+
+    return result
+
+
+def recover_web3(items: list) -> list:
+    """ Previous path: web3 recoverHash per signature """
+    from eth_account.messages import defunct_hash_message
+    from web3.auto import w3
+
+    return [
+        w3.eth.account.recoverHash(defunct_hash_message(text=message), signature=signature).lower()
+        for _, message, signature in items
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--items', type=int, default=200, help='signatures per run')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per path')
+    args = parser.parse_args()
+
+    items = make_items(args.items)
+    addresses = [address for address, _, _ in items]
+    paths = [('web3', recover_web3)] + [
+        (backend.name, lambda items, backend=backend: recover_addresses(
+            ((message, signature) for _, message, signature in items), backend,
+        ))
+        for backend in get_backends()
+    ]
+
+    baseline = None
+    for name, recover in paths:
+        assert recover(items) == addresses
+
+        seconds = min(timeit.repeat(lambda: recover(items), number=1, repeat=args.repeat))
+        baseline = baseline or seconds
+        print(f'{name:>10}: {args.items / seconds:10,.0f} verifications/s {baseline / seconds:5.1f}x')
+
+
+if __name__ == '__main__':
+    main()
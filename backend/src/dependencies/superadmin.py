@@ -5,9 +5,7 @@ from services.user import UserService, UserServiceType
 
 
 def _get_superadmin(user_service: UserServiceType = UserService) -> UserServiceType:
-    wallet = user_service.auth_service.get_wallet()
-
-    if not wallet.is_super_admin:
+    if not user_service.is_super_admin():
         raise ApiError('You are not a super admin')
 
     return user_service
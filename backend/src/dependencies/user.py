@@ -1,17 +1,155 @@
-from typing import Optional
+from typing import Any, Dict, List, Optional, Set, Union
 
 import jwt
 from fastapi import Depends
+from peewee import JOIN
 from starlette.requests import Request
 
 from exceptions.exceptions import ApiError
 from models.chain import Chain
-from models.organization import OrganizationContract, Organization
+from models.organization import OrganizationContract, OrganizationAdmin
 from models.profile import Profile
+from models.revocation import RevocationEpoch
 from models.wallet import Wallet
 from settings import settings
 
 
+class Identity:
+    """ Authenticated user as loaded once per request: wallet rows of the address on every chain,
+        whether any of them is a super admin and organizations they administer.
+
+        Identity is carried by JWT claims (see get_claims), so requests with current claims only read their epochs.
+        Claims are current as long as revocation epochs of the wallet and its organizations didn't change
+        since they were issued, identity is loaded from the database otherwise.
+    """
+
+    CLAIMS_VERSION = 2
+
+    def __init__(self, address: str, wallets: List[Wallet], organization_ids: Set[int], claims_based: bool = False):
+        self.address = address
+        self.wallets = wallets
+        self.is_super_admin = any(wallet.is_super_admin for wallet in wallets)
+        self.organization_ids = organization_ids
+        # wallets taken from claims hold only id, address, chain and super admin flag
+        self.claims_based = claims_based
+
+    @classmethod
+    def get_claims(cls, address: str) -> Dict[str, Any]:
+        """ JWT claims carrying identity of address with current revocation epochs
+
+            Args:
+                address - wallet address
+
+            Returns:
+                claims, empty if address has no wallet
+        """
+
+        # wallet epochs are read first, so a permission change racing with the load can only make the claims
+        # outdated. Every change of permissions bumps the wallet, organization epochs may be read after.
+        wallet_epochs = RevocationEpoch.get_wallet_epochs(address)
+        identity = cls.load(address)
+
+        if not identity.wallets:
+            return {}
+
+        wallet_id = identity.wallets[0].id
+        organization_ids = sorted(identity.organization_ids)
+        epochs = RevocationEpoch.get_epochs(
+            (RevocationEpoch.Kind.ORGANIZATION, organization_id) for organization_id in organization_ids
+        )
+
+        return {
+            'version': cls.CLAIMS_VERSION,
+            'wallet_id': wallet_id,
+            'wallets': {str(wallet.chain_id): wallet.id for wallet in identity.wallets},
+            'is_super_admin': identity.is_super_admin,
+            'organization_ids': organization_ids,
+            'epochs': {
+                'wallet': wallet_epochs.get(wallet_id, 0),
+                'organizations': {
+                    str(organization_id): epochs.get((RevocationEpoch.Kind.ORGANIZATION, organization_id), 0)
+                    for organization_id in organization_ids
+                },
+            },
+        }
+
+    @classmethod
+    def from_claims(cls, address: str, claims: Dict[str, Any]) -> Optional['Identity']:
+        """ Identity carried by JWT claims
+
+            Args:
+                address - wallet address claims were issued to
+                claims - decoded JWT payload
+
+            Returns:
+                identity, None if claims don't carry it or are outdated
+        """
+
+        if claims.get('version') != cls.CLAIMS_VERSION:
+            return None
+
+        organization_epochs = claims['epochs']['organizations']
+        epochs = RevocationEpoch.get_epochs([
+            (RevocationEpoch.Kind.WALLET, claims['wallet_id']),
+            *((RevocationEpoch.Kind.ORGANIZATION, int(organization_id)) for organization_id in organization_epochs),
+        ])
+
+        if epochs.get((RevocationEpoch.Kind.WALLET, claims['wallet_id']), 0) != claims['epochs']['wallet'] or any(
+                epochs.get((RevocationEpoch.Kind.ORGANIZATION, int(organization_id)), 0) != epoch
+                for organization_id, epoch in organization_epochs.items()
+        ):
+            return None
+
+        wallets = sorted(
+            (
+                Wallet(id=wallet_id, address=address, chain=int(chain_id), is_super_admin=claims['is_super_admin'])
+                for chain_id, wallet_id in claims['wallets'].items()
+            ),
+            key=lambda wallet: wallet.id,
+        )
+
+        return cls(address, wallets, set(claims['organization_ids']), claims_based=True)
+
+    @classmethod
+    def load(cls, address: str) -> 'Identity':
+        """ Load identity of address with one query
+
+            Args:
+                address - wallet address
+
+            Returns:
+                identity, without wallets if address has none
+        """
+
+        rows = Wallet.select(
+            Wallet,
+            OrganizationAdmin.organization.alias('admin_organization_id'),
+        ).join(
+            OrganizationAdmin,
+            JOIN.LEFT_OUTER,
+            on=(
+                (OrganizationAdmin.wallet == Wallet.id) &
+                (OrganizationAdmin.status == OrganizationAdmin.Status.ACTIVE)
+            ),
+        ).where(
+            Wallet.address == address
+        ).order_by(Wallet.id).objects()
+
+        wallets: Dict[int, Wallet] = {}
+        organization_ids: Set[int] = set()
+
+        for row in rows:
+            wallets.setdefault(row.id, row)
+            if row.admin_organization_id is not None:
+                organization_ids.add(row.admin_organization_id)
+
+        return cls(address, list(wallets.values()), organization_ids)
+
+    def get_wallet(self, chain_id: Optional[int] = None) -> Optional[Wallet]:
+        """ Wallet row on given chain, the first one created if chain is not given """
+        return next((wallet for wallet in self.wallets if chain_id is None or wallet.chain_id == chain_id), None)
+
+
 class AuthServiceType:
     """ FastAPI dependency decoding JWT and providing access to user functions """
 
@@ -35,12 +173,16 @@ class AuthServiceType:
                 raise ApiError('Invalid JWT payload')
 
         self._wallet_address = decoded['wallet_address']
+        self.identity = Identity.from_claims(self._wallet_address, decoded) or Identity.load(self._wallet_address)
 
-        wallet = self.get_wallet()
-
-        if wallet is None:
+        if not self.identity.wallets:
             raise ApiError('Wallet does not exist')
 
+    @property
+    def wallet_address(self) -> str:
+        """ Address of the authenticated wallet """
+        return self._wallet_address
+
     def get_profile(self, context: OrganizationContract) -> Optional[Profile]:
         """ Get profile of this user in given context if exists
 
@@ -50,36 +192,35 @@ class AuthServiceType:
             Returns:
                 Profile if exists
         """
-        return Profile.select().join(Wallet).where(
-            Wallet.address == self._wallet_address,
+        return Profile.select().where(
+            Profile.wallet.in_([wallet.id for wallet in self.identity.wallets]),
             Profile.context == context
         ).get_or_none()
 
-    def get_wallet(self, chain: Chain = None, or_create=False) -> Optional[Wallet]:
+    def get_wallet(self, chain: Union[Chain, int, None] = None, or_create=False) -> Optional[Wallet]:
         """ Get wallet object belonging to this user.
 
             Args:
-                chain - chain on which to get the wallet instance
+                chain - chain or chain id on which to get the wallet instance
                 or_create - whether to create a wallet if it wasn't found
 
             Returns:
                 wallet if exists or was created
         """
-        if chain:
-            wallet = Wallet.select().filter(
-                address=self._wallet_address,
-                chain=chain
-            ).get_or_none()
-        else:
-            wallet = Wallet.get_or_none(
-                address=self._wallet_address
-            )
+        chain_id = chain.id if isinstance(chain, Chain) else chain
+        wallet = self.identity.get_wallet(chain_id)
 
         if wallet is None and or_create:
-            wallet = Wallet.create(
+            # wallet may have been created after claims were issued
+            wallet, created = Wallet.get_or_create(
                 address=self._wallet_address,
-                chain=chain or 1
+                chain=chain_id or 1
             )
+            self.identity.wallets.append(wallet)
+
+            # claims issued before lack the new wallet
+            if created:
+                RevocationEpoch.bump_wallet(self._wallet_address)
 
         return wallet
 
@@ -89,7 +230,7 @@ class AuthServiceType:
         Returns:
             is superadmin
         """
-        return Wallet.select().filter(address=self._wallet_address, is_super_admin=True).exists()
+        return self.identity.is_super_admin
 
 
 def auth_service_dependency(request: Request, token: Optional[str] = None) -> AuthServiceType:
@@ -3,3 +3,36 @@ class ApiError(Exception):
     def __init__(self, message):
         self.message = message
         super().__init__(self.message)
+
+
+class BlockscanError(Exception):
+    """ Blockscan API responded with an error """
+
+    def __init__(self, message):
+        self.message = message
+        super().__init__(self.message)
+
+
+class BlockscanRateLimitError(BlockscanError):
+    """ Blockscan API rate limit was hit, request may be retried later """
+
+
+class BlockscanEmptyResult(BlockscanError):
+    """ Blockscan API has no records matching the request """
+
+
+class RpcError(Exception):
+    """ RPC node responded with an error """
+
+    def __init__(self, message, code=None):
+        self.message = message
+        self.code = code
+        super().__init__(self.message)
+
+
+class RpcRateLimitError(RpcError):
+    """ RPC node rate limit was hit, request may be retried later """
+
+
+class RpcLimitError(RpcError):
+    """ RPC node refused a call as too large, e.g. block range or number of logs over its limit """
@@ -0,0 +1,183 @@
+# auto-generated snapshot
+from peewee import *
+import datetime
+import models.common
+import peewee
+import playhouse.postgres_ext
+import uuid
+
+
+snapshot = Snapshot()
+
+
+@snapshot.append
+class Chain(peewee.Model):
+    id = IntegerField(primary_key=True)
+    name = CharField(max_length=128)
+    class Meta:
+        table_name = "chain"
+
+
+@snapshot.append
+class Contract(peewee.Model):
+    address = models.common.Web3AddressField(max_length=42)
+    token_name = CharField(max_length=128)
+    erc_standard = IntegerField()
+    holders = IntegerField()
+    chain = snapshot.ForeignKeyField(index=True, model='chain')
+    decimals = IntegerField()
+    source = IntegerField(default=0)
+    class Meta:
+        table_name = "contract"
+
+
+@snapshot.append
+class BackfillRange(peewee.Model):
+    contract = snapshot.ForeignKeyField(backref='backfill_ranges', index=True, model='contract')
+    start_block = IntegerField()
+    end_block = IntegerField()
+    status = IntegerField(default=0)
+    transactions = IntegerField(default=0)
+    created_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    updated_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    class Meta:
+        table_name = "backfillrange"
+        indexes = (
+            (('contract_id', 'start_block'), True),
+            )
+
+
+@snapshot.append
+class IngestionCheckpoint(peewee.Model):
+    contract = snapshot.ForeignKeyField(backref='checkpoints', index=True, model='contract', unique=True)
+    block = IntegerField(default=0)
+    cursor = IntegerField(default=0)
+    updated_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    class Meta:
+        table_name = "ingestioncheckpoint"
+
+
+@snapshot.append
+class Organization(peewee.Model):
+    name = CharField(max_length=128)
+    status = IntegerField(default=1)
+    created_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    updated_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    class Meta:
+        table_name = "organization"
+
+
+@snapshot.append
+class Wallet(peewee.Model):
+    address = models.common.Web3AddressField(max_length=42)
+    chain = snapshot.ForeignKeyField(index=True, model='chain')
+    is_super_admin = BooleanField(default=False)
+    verified_at = playhouse.postgres_ext.DateTimeTZField(null=True)
+    created_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    updated_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    class Meta:
+        table_name = "wallet"
+
+
+@snapshot.append
+class OrganizationAdmin(peewee.Model):
+    organization = snapshot.ForeignKeyField(index=True, model='organization')
+    wallet = snapshot.ForeignKeyField(index=True, model='wallet')
+    status = IntegerField(default=1)
+    created_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    updated_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    class Meta:
+        table_name = "organizationadmin"
+
+
+@snapshot.append
+class OrganizationContract(peewee.Model):
+    uuid = CharField(default=uuid.uuid4, max_length=36, unique=True)
+    threshold = IntegerField(default=1)
+    organization = snapshot.ForeignKeyField(index=True, model='organization')
+    contract = snapshot.ForeignKeyField(index=True, model='contract')
+    status = IntegerField(default=1)
+    token_id_whitelist = playhouse.postgres_ext.JSONField(default=[])
+    title = CharField(max_length=50, null=True)
+    image = TextField(null=True)
+    texts = playhouse.postgres_ext.JSONField(default={})
+    created_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    updated_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    class Meta:
+        table_name = "organizationcontract"
+
+
+@snapshot.append
+class Profile(peewee.Model):
+    context = snapshot.ForeignKeyField(index=True, model='organizationcontract')
+    first_name = CharField(max_length=128)
+    last_name = CharField(max_length=128)
+    email = CharField(max_length=128)
+    phone = CharField(max_length=128)
+    country = CharField(max_length=128)
+    address1 = CharField(max_length=30)
+    address2 = CharField(max_length=30)
+    address3 = CharField(max_length=30, null=True)
+    city = CharField(max_length=128)
+    region = CharField(max_length=128)
+    postal_code = CharField(max_length=16)
+    message = CharField(max_length=1000, null=True)
+    wallet = snapshot.ForeignKeyField(backref='profiles', index=True, model='wallet')
+    sizes = playhouse.postgres_ext.JSONField(default=[])
+    status = SmallIntegerField(default=1)
+    created_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    updated_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    class Meta:
+        table_name = "profile"
+        indexes = (
+            (('context_id', 'wallet_id'), True),
+            )
+
+
+@snapshot.append
+class Transaction(peewee.Model):
+    chain = snapshot.ForeignKeyField(index=True, model='chain')
+    contract = snapshot.ForeignKeyField(index=True, model='contract')
+    block_number = IntegerField()
+    timestamp = playhouse.postgres_ext.DateTimeTZField()
+    hash = models.common.Web3HashField(max_length=66)
+    nonce = IntegerField(null=True)
+    block_hash = models.common.Web3HashField(max_length=66)
+    index = IntegerField()
+    log_index = IntegerField(default=0)
+    from_address = models.common.Web3AddressField(max_length=42)
+    to_address = models.common.Web3AddressField(max_length=42)
+    gas = BigIntegerField(null=True)
+    gas_price = BigIntegerField(null=True)
+    gas_used = BigIntegerField(null=True)
+    cumulative_gas_used = BigIntegerField(null=True)
+    token_id = DecimalField(auto_round=False, decimal_places=0, max_digits=78, null=True, rounding='ROUND_HALF_EVEN')
+    value = DecimalField(auto_round=False, decimal_places=0, max_digits=78, null=True, rounding='ROUND_HALF_EVEN')
+    confirmations = BigIntegerField()
+    created_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    class Meta:
+        table_name = "transaction"
+
+
+def forward(old_orm, new_orm):
+    contract = new_orm['contract']
+    return [
+        # Apply default value 0 to the field contract.source,
+        contract.update({contract.source: 0}).where(contract.source.is_null(True)),
+    ]
+
+
+def backward(old_orm, new_orm):
+    transaction = new_orm['transaction']
+    return [
+        # Apply default value 0 to the field transaction.gas_price,
+        transaction.update({transaction.gas_price: 0}).where(transaction.gas_price.is_null(True)),
+        # Apply default value 0 to the field transaction.cumulative_gas_used,
+        transaction.update({transaction.cumulative_gas_used: 0}).where(transaction.cumulative_gas_used.is_null(True)),
+        # Apply default value 0 to the field transaction.nonce,
+        transaction.update({transaction.nonce: 0}).where(transaction.nonce.is_null(True)),
+        # Apply default value 0 to the field transaction.gas_used,
+        transaction.update({transaction.gas_used: 0}).where(transaction.gas_used.is_null(True)),
+        # Apply default value 0 to the field transaction.gas,
+        transaction.update({transaction.gas: 0}).where(transaction.gas.is_null(True)),
+    ]
@@ -0,0 +1,315 @@
+# auto-generated snapshot
+from peewee import *
+import datetime
+import models.common
+import peewee
+import playhouse.postgres_ext
+import uuid
+
+
+snapshot = Snapshot()
+
+
+@snapshot.append
+class Chain(peewee.Model):
+    id = IntegerField(primary_key=True)
+    name = CharField(max_length=128)
+    class Meta:
+        table_name = "chain"
+
+
+@snapshot.append
+class Contract(peewee.Model):
+    address = models.common.Web3AddressField(max_length=42)
+    token_name = CharField(max_length=128)
+    erc_standard = IntegerField()
+    holders = IntegerField()
+    chain = snapshot.ForeignKeyField(index=True, model='chain')
+    decimals = IntegerField()
+    source = IntegerField(default=0)
+    class Meta:
+        table_name = "contract"
+
+
+@snapshot.append
+class BackfillRange(peewee.Model):
+    contract = snapshot.ForeignKeyField(backref='backfill_ranges', index=True, model='contract')
+    start_block = IntegerField()
+    end_block = IntegerField()
+    status = IntegerField(default=0)
+    transactions = IntegerField(default=0)
+    created_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    updated_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    class Meta:
+        table_name = "backfillrange"
+        indexes = (
+            (('contract_id', 'start_block'), True),
+            )
+
+
+@snapshot.append
+class IngestionCheckpoint(peewee.Model):
+    contract = snapshot.ForeignKeyField(backref='checkpoints', index=True, model='contract', unique=True)
+    block = IntegerField(default=0)
+    cursor = IntegerField(default=0)
+    updated_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    class Meta:
+        table_name = "ingestioncheckpoint"
+
+
+@snapshot.append
+class Organization(peewee.Model):
+    name = CharField(max_length=128)
+    status = IntegerField(default=1)
+    created_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    updated_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    class Meta:
+        table_name = "organization"
+
+
+@snapshot.append
+class Wallet(peewee.Model):
+    address = models.common.Web3AddressField(max_length=42)
+    chain = snapshot.ForeignKeyField(index=True, model='chain')
+    is_super_admin = BooleanField(default=False)
+    verified_at = playhouse.postgres_ext.DateTimeTZField(null=True)
+    created_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    updated_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    class Meta:
+        table_name = "wallet"
+
+
+@snapshot.append
+class OrganizationAdmin(peewee.Model):
+    organization = snapshot.ForeignKeyField(index=True, model='organization')
+    wallet = snapshot.ForeignKeyField(index=True, model='wallet')
+    status = IntegerField(default=1)
+    created_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    updated_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    class Meta:
+        table_name = "organizationadmin"
+
+
+@snapshot.append
+class OrganizationContract(peewee.Model):
+    uuid = CharField(default=uuid.uuid4, max_length=36, unique=True)
+    threshold = IntegerField(default=1)
+    organization = snapshot.ForeignKeyField(index=True, model='organization')
+    contract = snapshot.ForeignKeyField(index=True, model='contract')
+    status = IntegerField(default=1)
+    token_id_whitelist = playhouse.postgres_ext.JSONField(default=[])
+    title = CharField(max_length=50, null=True)
+    image = TextField(null=True)
+    texts = playhouse.postgres_ext.JSONField(default={})
+    created_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    updated_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    class Meta:
+        table_name = "organizationcontract"
+
+
+@snapshot.append
+class Profile(peewee.Model):
+    context = snapshot.ForeignKeyField(index=True, model='organizationcontract')
+    first_name = CharField(max_length=128)
+    last_name = CharField(max_length=128)
+    email = CharField(max_length=128)
+    phone = CharField(max_length=128)
+    country = CharField(max_length=128)
+    address1 = CharField(max_length=30)
+    address2 = CharField(max_length=30)
+    address3 = CharField(max_length=30, null=True)
+    city = CharField(max_length=128)
+    region = CharField(max_length=128)
+    postal_code = CharField(max_length=16)
+    message = CharField(max_length=1000, null=True)
+    wallet = snapshot.ForeignKeyField(backref='profiles', index=True, model='wallet')
+    sizes = playhouse.postgres_ext.JSONField(default=[])
+    status = SmallIntegerField(default=1)
+    created_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    updated_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    class Meta:
+        table_name = "profile"
+        indexes = (
+            (('context_id', 'wallet_id'), True),
+            )
+
+
+@snapshot.append
+class Transaction(peewee.Model):
+    chain = snapshot.ForeignKeyField(index=True, model='chain')
+    contract = snapshot.ForeignKeyField(index=True, model='contract')
+    block_number = IntegerField()
+    timestamp = playhouse.postgres_ext.DateTimeTZField()
+    hash = models.common.Web3HashField(max_length=66)
+    nonce = IntegerField(null=True)
+    block_hash = models.common.Web3HashField(max_length=66)
+    index = IntegerField()
+    log_index = IntegerField(default=0)
+    from_address = models.common.Web3AddressField(max_length=42)
+    to_address = models.common.Web3AddressField(max_length=42)
+    gas = BigIntegerField(null=True)
+    gas_price = BigIntegerField(null=True)
+    gas_used = BigIntegerField(null=True)
+    cumulative_gas_used = BigIntegerField(null=True)
+    token_id = DecimalField(auto_round=False, decimal_places=0, max_digits=78, null=True, rounding='ROUND_HALF_EVEN')
+    value = DecimalField(auto_round=False, decimal_places=0, max_digits=78, null=True, rounding='ROUND_HALF_EVEN')
+    confirmations = BigIntegerField()
+    created_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    class Meta:
+        table_name = "transaction"
+
+
+@snapshot.append
+class UnfinalizedBlock(peewee.Model):
+    contract = snapshot.ForeignKeyField(backref='unfinalized_blocks', index=True, model='contract')
+    block_number = IntegerField()
+    block_hash = models.common.Web3HashField(max_length=66)
+    class Meta:
+        table_name = "unfinalizedblock"
+        indexes = (
+            (('contract', 'block_number'), True),
+            )
+
+
+
+
+# chains with a partition of their own, transfers of other chains go to the default partition
+CHAINS = (1, 56, 137)
+
+# hash partitions of each chain partition, by contract
+CONTRACT_PARTITIONS = 8
+
+# wallet_balances as created by init.sql, for text or bytea address columns
+WALLET_BALANCES = r'''
+    CREATE MATERIALIZED VIEW "wallet_balances" AS (
+        WITH tx AS (
+            SELECT
+                {from_address} AS "address",
+                "contract"."chain_id" AS "chain",
+                "contract"."id" AS "contract_id",
+                "transaction"."token_id" AS "token_id",
+                CASE WHEN "contract"."erc_standard" = 721 THEN -1 ELSE -"value" END AS "balance",
+                "timestamp"
+            FROM "transaction"
+            INNER JOIN "contract" ON "transaction"."contract_id" = "contract"."id"
+            UNION ALL
+            SELECT
+                {to_address} AS "address",
+                "contract"."chain_id" AS "chain",
+                "contract"."id" AS "contract_id",
+                "transaction"."token_id" AS "token_id",
+                CASE WHEN "contract"."erc_standard" = 721 THEN 1 ELSE "value" END AS "balance",
+                "timestamp"
+            FROM "transaction"
+            INNER JOIN "contract"
+            ON "transaction"."contract_id" = "contract"."id" AND "transaction"."chain_id" = "contract"."chain_id"
+        )
+        SELECT
+            "address",
+            "chain" AS "chain_id",
+            "contract_id",
+            "token_id",
+            SUM("tx"."balance") AS "balance",
+            MAX("tx"."timestamp") AS "date"
+        FROM "tx" WHERE "address" <> {zero_address}
+        GROUP BY 1, 2, 3, 4
+        ORDER BY "date" DESC
+    ) WITH DATA
+'''
+
+WALLET_BALANCES_TEXT = WALLET_BALANCES.format(
+    from_address='lower("from_address")',
+    to_address='lower("to_address")',
+    zero_address="'0x0000000000000000000000000000000000000000'",
+)
+
+WALLET_BALANCES_BYTEA = WALLET_BALANCES.format(
+    from_address='"from_address"',
+    to_address='"to_address"',
+    zero_address=r"'\x0000000000000000000000000000000000000000'::bytea",
+)
+
+
+def create_wallet_balances():
+    """ Create wallet_balances matching the type of address columns, text before 0008 or bytea from scratch """
+    return [
+        SQL(f'''
+            DO $$ BEGIN
+                IF (SELECT "data_type" FROM "information_schema"."columns"
+                    WHERE "table_schema" = 'public' AND "table_name" = 'transaction' AND "column_name" = 'from_address'
+                ) = 'bytea' THEN
+                    EXECUTE $view${WALLET_BALANCES_BYTEA}$view$;
+                ELSE
+                    EXECUTE $view${WALLET_BALANCES_TEXT}$view$;
+                END IF;
+            END $$
+        '''),
+        SQL('''
+            CREATE UNIQUE INDEX "unq_wallet_contract"
+            ON "wallet_balances" ("address", "contract_id", "chain_id", "token_id")
+        '''),
+    ]
+
+
+def forward(old_orm, new_orm):
+    partitions = [(f'transaction_{chain_id}', f'FOR VALUES IN ({chain_id})') for chain_id in CHAINS]
+    partitions.append(('transaction_default', 'DEFAULT'))
+
+    return [
+        # depends on the table, recreated once transfers are copied
+        SQL('DROP MATERIALIZED VIEW IF EXISTS "wallet_balances"'),
+        SQL('ALTER TABLE "transaction" RENAME TO "transaction_unpartitioned"'),
+        SQL('''
+            CREATE TABLE "transaction" (LIKE "transaction_unpartitioned" INCLUDING DEFAULTS)
+            PARTITION BY LIST ("chain_id")
+        '''),
+        *[
+            SQL(f'CREATE TABLE "{name}" PARTITION OF "transaction" {bounds} PARTITION BY HASH ("contract_id")')
+            for name, bounds in partitions
+        ],
+        *[
+            SQL(f'''
+                CREATE TABLE "{name}_{remainder}" PARTITION OF "{name}"
+                FOR VALUES WITH (MODULUS {CONTRACT_PARTITIONS}, REMAINDER {remainder})
+            ''')
+            for name, _ in partitions for remainder in range(CONTRACT_PARTITIONS)
+        ],
+        SQL('ALTER SEQUENCE "transaction_id_seq" OWNED BY "transaction"."id"'),
+        SQL('INSERT INTO "transaction" SELECT * FROM "transaction_unpartitioned"'),
+        SQL('DROP TABLE "transaction_unpartitioned"'),
+        # primary and unique keys of a partitioned table must include the partition key
+        SQL('ALTER TABLE "transaction" ADD PRIMARY KEY ("id", "chain_id", "contract_id")'),
+        SQL('ALTER TABLE "transaction" ADD FOREIGN KEY ("chain_id") REFERENCES "chain" ("id")'),
+        SQL('ALTER TABLE "transaction" ADD FOREIGN KEY ("contract_id") REFERENCES "contract" ("id")'),
+        SQL('CREATE INDEX "transaction_contract_id" ON "transaction" ("contract_id")'),
+        SQL('''
+            CREATE UNIQUE INDEX "transaction_transfer_key"
+            ON "transaction" ("chain_id", "contract_id", "hash", "log_index", COALESCE("token_id", -1))
+        '''),
+        # transfers are appended in block order, so block ranges of pages follow physical order closely
+        SQL('CREATE INDEX "transaction_block_number_brin" ON "transaction" USING BRIN ("block_number")'),
+        SQL('CREATE INDEX "transaction_timestamp_brin" ON "transaction" USING BRIN ("timestamp")'),
+        *create_wallet_balances(),
+    ]
+
+
+def backward(old_orm, new_orm):
+    return [
+        SQL('DROP MATERIALIZED VIEW IF EXISTS "wallet_balances"'),
+        SQL('ALTER TABLE "transaction" RENAME TO "transaction_partitioned"'),
+        SQL('CREATE TABLE "transaction" (LIKE "transaction_partitioned" INCLUDING DEFAULTS)'),
+        SQL('ALTER SEQUENCE "transaction_id_seq" OWNED BY "transaction"."id"'),
+        SQL('INSERT INTO "transaction" SELECT * FROM "transaction_partitioned"'),
+        # drops partitions along with it
+        SQL('DROP TABLE "transaction_partitioned"'),
+        SQL('ALTER TABLE "transaction" ADD PRIMARY KEY ("id")'),
+        SQL('ALTER TABLE "transaction" ADD FOREIGN KEY ("chain_id") REFERENCES "chain" ("id")'),
+        SQL('ALTER TABLE "transaction" ADD FOREIGN KEY ("contract_id") REFERENCES "contract" ("id")'),
+        SQL('CREATE INDEX "transaction_chain_id" ON "transaction" ("chain_id")'),
+        SQL('CREATE INDEX "transaction_contract_id" ON "transaction" ("contract_id")'),
+        SQL('''
+            CREATE UNIQUE INDEX "transaction_transfer_key"
+            ON "transaction" ("chain_id", "contract_id", "hash", "log_index", COALESCE("token_id", -1))
+        '''),
+        *create_wallet_balances(),
+    ]
@@ -0,0 +1,265 @@
+# auto-generated snapshot
+from peewee import *
+import datetime
+import models.common
+import peewee
+import playhouse.postgres_ext
+import uuid
+
+
+snapshot = Snapshot()
+
+
+@snapshot.append
+class Chain(peewee.Model):
+    id = IntegerField(primary_key=True)
+    name = CharField(max_length=128)
+    class Meta:
+        table_name = "chain"
+
+
+@snapshot.append
+class Contract(peewee.Model):
+    address = models.common.Web3AddressField()
+    token_name = CharField(max_length=128)
+    erc_standard = IntegerField()
+    holders = IntegerField()
+    chain = snapshot.ForeignKeyField(index=True, model='chain')
+    decimals = IntegerField()
+    source = IntegerField(default=0)
+    class Meta:
+        table_name = "contract"
+
+
+@snapshot.append
+class BackfillRange(peewee.Model):
+    contract = snapshot.ForeignKeyField(backref='backfill_ranges', index=True, model='contract')
+    start_block = IntegerField()
+    end_block = IntegerField()
+    status = IntegerField(default=0)
+    transactions = IntegerField(default=0)
+    created_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    updated_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    class Meta:
+        table_name = "backfillrange"
+        indexes = (
+            (('contract_id', 'start_block'), True),
+            )
+
+
+@snapshot.append
+class IngestionCheckpoint(peewee.Model):
+    contract = snapshot.ForeignKeyField(backref='checkpoints', index=True, model='contract', unique=True)
+    block = IntegerField(default=0)
+    cursor = IntegerField(default=0)
+    updated_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    class Meta:
+        table_name = "ingestioncheckpoint"
+
+
+@snapshot.append
+class Organization(peewee.Model):
+    name = CharField(max_length=128)
+    status = IntegerField(default=1)
+    created_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    updated_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    class Meta:
+        table_name = "organization"
+
+
+@snapshot.append
+class Wallet(peewee.Model):
+    address = models.common.Web3AddressField()
+    chain = snapshot.ForeignKeyField(index=True, model='chain')
+    is_super_admin = BooleanField(default=False)
+    verified_at = playhouse.postgres_ext.DateTimeTZField(null=True)
+    created_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    updated_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    class Meta:
+        table_name = "wallet"
+
+
+@snapshot.append
+class OrganizationAdmin(peewee.Model):
+    organization = snapshot.ForeignKeyField(index=True, model='organization')
+    wallet = snapshot.ForeignKeyField(index=True, model='wallet')
+    status = IntegerField(default=1)
+    created_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    updated_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    class Meta:
+        table_name = "organizationadmin"
+
+
+@snapshot.append
+class OrganizationContract(peewee.Model):
+    uuid = CharField(default=uuid.uuid4, max_length=36, unique=True)
+    threshold = IntegerField(default=1)
+    organization = snapshot.ForeignKeyField(index=True, model='organization')
+    contract = snapshot.ForeignKeyField(index=True, model='contract')
+    status = IntegerField(default=1)
+    token_id_whitelist = playhouse.postgres_ext.JSONField(default=[])
+    title = CharField(max_length=50, null=True)
+    image = TextField(null=True)
+    texts = playhouse.postgres_ext.JSONField(default={})
+    created_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    updated_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    class Meta:
+        table_name = "organizationcontract"
+
+
+@snapshot.append
+class Profile(peewee.Model):
+    context = snapshot.ForeignKeyField(index=True, model='organizationcontract')
+    first_name = CharField(max_length=128)
+    last_name = CharField(max_length=128)
+    email = CharField(max_length=128)
+    phone = CharField(max_length=128)
+    country = CharField(max_length=128)
+    address1 = CharField(max_length=30)
+    address2 = CharField(max_length=30)
+    address3 = CharField(max_length=30, null=True)
+    city = CharField(max_length=128)
+    region = CharField(max_length=128)
+    postal_code = CharField(max_length=16)
+    message = CharField(max_length=1000, null=True)
+    wallet = snapshot.ForeignKeyField(backref='profiles', index=True, model='wallet')
+    sizes = playhouse.postgres_ext.JSONField(default=[])
+    status = SmallIntegerField(default=1)
+    created_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    updated_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    class Meta:
+        table_name = "profile"
+        indexes = (
+            (('context_id', 'wallet_id'), True),
+            )
+
+
+@snapshot.append
+class Transaction(peewee.Model):
+    chain = snapshot.ForeignKeyField(index=True, model='chain')
+    contract = snapshot.ForeignKeyField(index=True, model='contract')
+    block_number = IntegerField()
+    timestamp = playhouse.postgres_ext.DateTimeTZField()
+    hash = models.common.Web3HashField()
+    nonce = IntegerField(null=True)
+    block_hash = models.common.Web3HashField(null=True)
+    index = IntegerField(null=True)
+    log_index = IntegerField(default=0)
+    from_address = models.common.Web3AddressField()
+    to_address = models.common.Web3AddressField()
+    gas = BigIntegerField(null=True)
+    gas_price = BigIntegerField(null=True)
+    gas_used = BigIntegerField(null=True)
+    cumulative_gas_used = BigIntegerField(null=True)
+    token_id = DecimalField(auto_round=False, decimal_places=0, max_digits=78, null=True, rounding='ROUND_HALF_EVEN')
+    value = DecimalField(auto_round=False, decimal_places=0, max_digits=78, null=True, rounding='ROUND_HALF_EVEN')
+    confirmations = BigIntegerField(null=True)
+    created_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    class Meta:
+        table_name = "transaction"
+
+
+@snapshot.append
+class UnfinalizedBlock(peewee.Model):
+    contract = snapshot.ForeignKeyField(backref='unfinalized_blocks', index=True, model='contract')
+    block_number = IntegerField()
+    block_hash = models.common.Web3HashField()
+    class Meta:
+        table_name = "unfinalizedblock"
+        indexes = (
+            (('contract', 'block_number'), True),
+            )
+
+
+def forward(old_orm, new_orm):
+    return [
+        SQL('DROP MATERIALIZED VIEW IF EXISTS "wallet_balances"'),
+        SQL('''
+            CREATE TABLE "wallet_balances" (
+                "address" bytea NOT NULL,
+                "chain_id" integer NOT NULL REFERENCES "chain" ("id"),
+                "contract_id" integer NOT NULL REFERENCES "contract" ("id"),
+                "token_id" numeric(78, 0),
+                "balance" numeric(78, 0) NOT NULL DEFAULT 0,
+                "date" timestamp with time zone NOT NULL
+            )
+        '''),
+        SQL('''
+            CREATE UNIQUE INDEX "wallet_balances_key"
+            ON "wallet_balances" ("address", "contract_id", "chain_id", COALESCE("token_id", -1))
+        '''),
+        # signed balance changes of the transfers in "changed", sender loses and receiver gains the value,
+        # or a single token of ERC721. The zero address only mints and burns, it has no balance
+        SQL('''
+            CREATE OR REPLACE FUNCTION "wallet_balances_apply"() RETURNS trigger LANGUAGE plpgsql AS $$
+            DECLARE
+                sign integer := CASE TG_OP WHEN 'DELETE' THEN -1 ELSE 1 END;
+            BEGIN
+                INSERT INTO "wallet_balances" ("address", "chain_id", "contract_id", "token_id", "balance", "date")
+                SELECT "address", "chain_id", "contract_id", "token_id",
+                       COALESCE(SUM("delta"), 0) * sign, MAX("timestamp")
+                FROM (
+                    SELECT "from_address" AS "address", changed."chain_id", changed."contract_id", changed."token_id",
+                           -CASE WHEN contract."erc_standard" = 721 THEN 1 ELSE changed."value" END AS "delta",
+                           changed."timestamp"
+                    FROM changed INNER JOIN "contract" ON contract."id" = changed."contract_id"
+                    UNION ALL
+                    SELECT "to_address", changed."chain_id", changed."contract_id", changed."token_id",
+                           CASE WHEN contract."erc_standard" = 721 THEN 1 ELSE changed."value" END,
+                           changed."timestamp"
+                    FROM changed INNER JOIN "contract" ON contract."id" = changed."contract_id"
+                ) AS deltas
+                WHERE "address" <> '\\x0000000000000000000000000000000000000000'::bytea
+                GROUP BY "address", "chain_id", "contract_id", "token_id"
+                -- rows are locked in the same order by concurrent writers
+                ORDER BY "address", "chain_id", "contract_id", "token_id"
+                ON CONFLICT ("address", "contract_id", "chain_id", COALESCE("token_id", -1)) DO UPDATE SET
+                    "balance" = "wallet_balances"."balance" + EXCLUDED."balance",
+                    "date" = GREATEST("wallet_balances"."date", EXCLUDED."date");
+
+                RETURN NULL;
+            END
+            $$
+        '''),
+        SQL('''
+            CREATE TRIGGER "transaction_balances_insert" AFTER INSERT ON "transaction"
+            REFERENCING NEW TABLE AS changed FOR EACH STATEMENT EXECUTE FUNCTION "wallet_balances_apply"()
+        '''),
+        SQL('''
+            CREATE TRIGGER "transaction_balances_delete" AFTER DELETE ON "transaction"
+            REFERENCING OLD TABLE AS changed FOR EACH STATEMENT EXECUTE FUNCTION "wallet_balances_apply"()
+        '''),
+        # recomputes balances of one contract, or of all when called without one, from the full history
+        SQL('''
+            CREATE OR REPLACE FUNCTION "wallet_balances_rebuild"(rebuilt_contract_id integer DEFAULT NULL) RETURNS void
+            LANGUAGE plpgsql AS $$
+            BEGIN
+                -- writers apply their changes after the rebuild commits
+                LOCK TABLE "wallet_balances" IN EXCLUSIVE MODE;
+
+                DELETE FROM "wallet_balances"
+                WHERE rebuilt_contract_id IS NULL OR "contract_id" = rebuilt_contract_id;
+
+                INSERT INTO "wallet_balances" ("address", "chain_id", "contract_id", "token_id", "balance", "date")
+                SELECT "address", "chain_id", "contract_id", "token_id",
+                       COALESCE(SUM("delta"), 0), MAX("timestamp")
+                FROM (
+                    SELECT "from_address" AS "address", changed."chain_id", changed."contract_id", changed."token_id",
+                           -CASE WHEN contract."erc_standard" = 721 THEN 1 ELSE changed."value" END AS "delta",
+                           changed."timestamp"
+                    FROM "transaction" AS changed INNER JOIN "contract" ON contract."id" = changed."contract_id"
+                    WHERE rebuilt_contract_id IS NULL OR changed."contract_id" = rebuilt_contract_id
+                    UNION ALL
+                    SELECT "to_address", changed."chain_id", changed."contract_id", changed."token_id",
+                           CASE WHEN contract."erc_standard" = 721 THEN 1 ELSE changed."value" END,
+                           changed."timestamp"
+                    FROM "transaction" AS changed INNER JOIN "contract" ON contract."id" = changed."contract_id"
+                    WHERE rebuilt_contract_id IS NULL OR changed."contract_id" = rebuilt_contract_id
+                ) AS deltas
+                WHERE "address" <> '\\x0000000000000000000000000000000000000000'::bytea
+                GROUP BY "address", "chain_id", "contract_id", "token_id";
+            END
+            $$
+        '''),
+        SQL('SELECT "wallet_balances_rebuild"()'),
+    ]
@@ -0,0 +1,268 @@
+# auto-generated snapshot
+from peewee import *
+import datetime
+import models.common
+import peewee
+import playhouse.postgres_ext
+import uuid
+
+
+snapshot = Snapshot()
+
+
+@snapshot.append
+class Chain(peewee.Model):
+    id = IntegerField(primary_key=True)
+    name = CharField(max_length=128)
+    class Meta:
+        table_name = "chain"
+
+
+@snapshot.append
+class Contract(peewee.Model):
+    address = models.common.Web3AddressField()
+    token_name = CharField(max_length=128)
+    erc_standard = IntegerField()
+    holders = IntegerField()
+    chain = snapshot.ForeignKeyField(index=True, model='chain')
+    decimals = IntegerField()
+    source = IntegerField(default=0)
+    class Meta:
+        table_name = "contract"
+
+
+@snapshot.append
+class BackfillRange(peewee.Model):
+    contract = snapshot.ForeignKeyField(backref='backfill_ranges', index=True, model='contract')
+    start_block = IntegerField()
+    end_block = IntegerField()
+    status = IntegerField(default=0)
+    transactions = IntegerField(default=0)
+    created_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    updated_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    class Meta:
+        table_name = "backfillrange"
+        indexes = (
+            (('contract_id', 'start_block'), True),
+            )
+
+
+@snapshot.append
+class IngestionCheckpoint(peewee.Model):
+    contract = snapshot.ForeignKeyField(backref='checkpoints', index=True, model='contract', unique=True)
+    block = IntegerField(default=0)
+    cursor = IntegerField(default=0)
+    updated_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    class Meta:
+        table_name = "ingestioncheckpoint"
+
+
+@snapshot.append
+class Organization(peewee.Model):
+    name = CharField(max_length=128)
+    status = IntegerField(default=1)
+    created_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    updated_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    class Meta:
+        table_name = "organization"
+
+
+@snapshot.append
+class Wallet(peewee.Model):
+    address = models.common.Web3AddressField()
+    chain = snapshot.ForeignKeyField(index=True, model='chain')
+    is_super_admin = BooleanField(default=False)
+    verified_at = playhouse.postgres_ext.DateTimeTZField(null=True)
+    created_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    updated_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    class Meta:
+        table_name = "wallet"
+
+
+@snapshot.append
+class OrganizationAdmin(peewee.Model):
+    organization = snapshot.ForeignKeyField(index=True, model='organization')
+    wallet = snapshot.ForeignKeyField(index=True, model='wallet')
+    status = IntegerField(default=1)
+    created_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    updated_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    class Meta:
+        table_name = "organizationadmin"
+
+
+@snapshot.append
+class OrganizationContract(peewee.Model):
+    uuid = CharField(default=uuid.uuid4, max_length=36, unique=True)
+    threshold = IntegerField(default=1)
+    organization = snapshot.ForeignKeyField(index=True, model='organization')
+    contract = snapshot.ForeignKeyField(index=True, model='contract')
+    status = IntegerField(default=1)
+    token_id_whitelist = playhouse.postgres_ext.JSONField(default=[])
+    title = CharField(max_length=50, null=True)
+    image = TextField(null=True)
+    texts = playhouse.postgres_ext.JSONField(default={})
+    created_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    updated_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    class Meta:
+        table_name = "organizationcontract"
+
+
+@snapshot.append
+class Profile(peewee.Model):
+    context = snapshot.ForeignKeyField(index=True, model='organizationcontract')
+    first_name = CharField(max_length=128)
+    last_name = CharField(max_length=128)
+    email = CharField(max_length=128)
+    phone = CharField(max_length=128)
+    country = CharField(max_length=128)
+    address1 = CharField(max_length=30)
+    address2 = CharField(max_length=30)
+    address3 = CharField(max_length=30, null=True)
+    city = CharField(max_length=128)
+    region = CharField(max_length=128)
+    postal_code = CharField(max_length=16)
+    message = CharField(max_length=1000, null=True)
+    wallet = snapshot.ForeignKeyField(backref='profiles', index=True, model='wallet')
+    sizes = playhouse.postgres_ext.JSONField(default=[])
+    status = SmallIntegerField(default=1)
+    created_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    updated_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    class Meta:
+        table_name = "profile"
+        indexes = (
+            (('context_id', 'wallet_id'), True),
+            )
+
+
+@snapshot.append
+class Transaction(peewee.Model):
+    chain = snapshot.ForeignKeyField(index=True, model='chain')
+    contract = snapshot.ForeignKeyField(index=True, model='contract')
+    block_number = IntegerField()
+    timestamp = playhouse.postgres_ext.DateTimeTZField()
+    hash = models.common.Web3HashField()
+    nonce = IntegerField(null=True)
+    block_hash = models.common.Web3HashField(null=True)
+    index = IntegerField(null=True)
+    log_index = IntegerField(default=0)
+    from_address = models.common.Web3AddressField()
+    to_address = models.common.Web3AddressField()
+    gas = BigIntegerField(null=True)
+    gas_price = BigIntegerField(null=True)
+    gas_used = BigIntegerField(null=True)
+    cumulative_gas_used = BigIntegerField(null=True)
+    token_id = DecimalField(auto_round=False, decimal_places=0, max_digits=78, null=True, rounding='ROUND_HALF_EVEN')
+    value = DecimalField(auto_round=False, decimal_places=0, max_digits=78, null=True, rounding='ROUND_HALF_EVEN')
+    confirmations = BigIntegerField(null=True)
+    created_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    class Meta:
+        table_name = "transaction"
+
+
+@snapshot.append
+class UnfinalizedBlock(peewee.Model):
+    contract = snapshot.ForeignKeyField(backref='unfinalized_blocks', index=True, model='contract')
+    block_number = IntegerField()
+    block_hash = models.common.Web3HashField()
+    class Meta:
+        table_name = "unfinalizedblock"
+        indexes = (
+            (('contract', 'block_number'), True),
+            )
+
+
+def forward(old_orm, new_orm):
+    return [
+        # number of token balances above zero per wallet and contract, the wallet is a holder while it is positive
+        SQL('''
+            CREATE TABLE "wallet_holdings" (
+                "contract_id" integer NOT NULL REFERENCES "contract" ("id"),
+                "address" bytea NOT NULL,
+                "tokens" integer NOT NULL,
+                PRIMARY KEY ("contract_id", "address")
+            )
+        '''),
+        # follows balances crossing zero. Rows are locked by the upsert, so concurrent writers count exactly
+        SQL('''
+            CREATE OR REPLACE FUNCTION "wallet_holdings_apply"() RETURNS trigger LANGUAGE plpgsql AS $$
+            DECLARE
+                was_held boolean := TG_OP <> 'INSERT' AND OLD."balance" > 0;
+                is_held boolean := TG_OP <> 'DELETE' AND NEW."balance" > 0;
+                changed_contract_id integer;
+                changed_address bytea;
+                held_tokens integer;
+            BEGIN
+                IF was_held = is_held THEN
+                    RETURN NULL;
+                END IF;
+
+                IF TG_OP = 'DELETE' THEN
+                    changed_contract_id := OLD."contract_id";
+                    changed_address := OLD."address";
+                ELSE
+                    changed_contract_id := NEW."contract_id";
+                    changed_address := NEW."address";
+                END IF;
+
+                INSERT INTO "wallet_holdings" ("contract_id", "address", "tokens")
+                VALUES (changed_contract_id, changed_address, CASE WHEN is_held THEN 1 ELSE -1 END)
+                ON CONFLICT ("contract_id", "address") DO UPDATE SET
+                    "tokens" = "wallet_holdings"."tokens" + EXCLUDED."tokens"
+                RETURNING "tokens" INTO held_tokens;
+
+                IF is_held AND held_tokens = 1 THEN
+                    UPDATE "contract" SET "holders" = "holders" + 1 WHERE "id" = changed_contract_id;
+                ELSIF NOT is_held AND held_tokens = 0 THEN
+                    UPDATE "contract" SET "holders" = "holders" - 1 WHERE "id" = changed_contract_id;
+                    DELETE FROM "wallet_holdings"
+                    WHERE "contract_id" = changed_contract_id AND "address" = changed_address AND "tokens" = 0;
+                END IF;
+
+                RETURN NULL;
+            END
+            $$
+        '''),
+        SQL('''
+            CREATE TRIGGER "wallet_balances_holdings" AFTER INSERT OR UPDATE OF "balance" OR DELETE ON "wallet_balances"
+            FOR EACH ROW EXECUTE FUNCTION "wallet_holdings_apply"()
+        '''),
+        # rebuild starts holder counts of the contracts it rebuilds from scratch as well
+        SQL('''
+            CREATE OR REPLACE FUNCTION "wallet_balances_rebuild"(rebuilt_contract_id integer DEFAULT NULL) RETURNS void
+            LANGUAGE plpgsql AS $$
+            BEGIN
+                -- writers apply their changes after the rebuild commits
+                LOCK TABLE "wallet_balances" IN EXCLUSIVE MODE;
+
+                DELETE FROM "wallet_balances"
+                WHERE rebuilt_contract_id IS NULL OR "contract_id" = rebuilt_contract_id;
+
+                DELETE FROM "wallet_holdings"
+                WHERE rebuilt_contract_id IS NULL OR "contract_id" = rebuilt_contract_id;
+
+                UPDATE "contract" SET "holders" = 0
+                WHERE rebuilt_contract_id IS NULL OR "id" = rebuilt_contract_id;
+
+                INSERT INTO "wallet_balances" ("address", "chain_id", "contract_id", "token_id", "balance", "date")
+                SELECT "address", "chain_id", "contract_id", "token_id",
+                       COALESCE(SUM("delta"), 0), MAX("timestamp")
+                FROM (
+                    SELECT "from_address" AS "address", changed."chain_id", changed."contract_id", changed."token_id",
+                           -CASE WHEN contract."erc_standard" = 721 THEN 1 ELSE changed."value" END AS "delta",
+                           changed."timestamp"
+                    FROM "transaction" AS changed INNER JOIN "contract" ON contract."id" = changed."contract_id"
+                    WHERE rebuilt_contract_id IS NULL OR changed."contract_id" = rebuilt_contract_id
+                    UNION ALL
+                    SELECT "to_address", changed."chain_id", changed."contract_id", changed."token_id",
+                           CASE WHEN contract."erc_standard" = 721 THEN 1 ELSE changed."value" END,
+                           changed."timestamp"
+                    FROM "transaction" AS changed INNER JOIN "contract" ON contract."id" = changed."contract_id"
+                    WHERE rebuilt_contract_id IS NULL OR changed."contract_id" = rebuilt_contract_id
+                ) AS deltas
+                WHERE "address" <> '\\x0000000000000000000000000000000000000000'::bytea
+                GROUP BY "address", "chain_id", "contract_id", "token_id";
+            END
+            $$
+        '''),
+        SQL('SELECT "wallet_balances_rebuild"()'),
+    ]
@@ -0,0 +1,305 @@
+# auto-generated snapshot
+from peewee import *
+import datetime
+import models.common
+import peewee
+import playhouse.postgres_ext
+import uuid
+
+
+snapshot = Snapshot()
+
+
+@snapshot.append
+class Chain(peewee.Model):
+    id = IntegerField(primary_key=True)
+    name = CharField(max_length=128)
+    class Meta:
+        table_name = "chain"
+
+
+@snapshot.append
+class Contract(peewee.Model):
+    address = models.common.Web3AddressField()
+    token_name = CharField(max_length=128)
+    erc_standard = IntegerField()
+    holders = IntegerField()
+    chain = snapshot.ForeignKeyField(index=True, model='chain')
+    decimals = IntegerField()
+    source = IntegerField(default=0)
+    class Meta:
+        table_name = "contract"
+
+
+@snapshot.append
+class BackfillRange(peewee.Model):
+    contract = snapshot.ForeignKeyField(backref='backfill_ranges', index=True, model='contract')
+    start_block = IntegerField()
+    end_block = IntegerField()
+    status = IntegerField(default=0)
+    transactions = IntegerField(default=0)
+    block = IntegerField()
+    cursor = IntegerField(default=0)
+    created_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    updated_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    class Meta:
+        table_name = "backfillrange"
+        indexes = (
+            (('contract_id', 'start_block'), True),
+            )
+
+
+@snapshot.append
+class BalanceSnapshot(peewee.Model):
+    contract = snapshot.ForeignKeyField(backref='snapshots', index=True, model='contract')
+    block_number = IntegerField()
+    title = CharField(max_length=50, null=True)
+    created_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    class Meta:
+        table_name = "balancesnapshot"
+        indexes = (
+            (('contract', 'block_number'), True),
+            )
+
+
+@snapshot.append
+class IngestionCheckpoint(peewee.Model):
+    contract = snapshot.ForeignKeyField(backref='checkpoints', index=True, model='contract', unique=True)
+    block = IntegerField(default=0)
+    cursor = IntegerField(default=0)
+    updated_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    class Meta:
+        table_name = "ingestioncheckpoint"
+
+
+@snapshot.append
+class Organization(peewee.Model):
+    name = CharField(max_length=128)
+    status = IntegerField(default=1)
+    created_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    updated_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    class Meta:
+        table_name = "organization"
+
+
+@snapshot.append
+class Wallet(peewee.Model):
+    address = models.common.Web3AddressField()
+    chain = snapshot.ForeignKeyField(index=True, model='chain')
+    is_super_admin = BooleanField(default=False)
+    verified_at = playhouse.postgres_ext.DateTimeTZField(null=True)
+    created_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    updated_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    class Meta:
+        table_name = "wallet"
+
+
+@snapshot.append
+class OrganizationAdmin(peewee.Model):
+    organization = snapshot.ForeignKeyField(index=True, model='organization')
+    wallet = snapshot.ForeignKeyField(index=True, model='wallet')
+    status = IntegerField(default=1)
+    created_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    updated_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    class Meta:
+        table_name = "organizationadmin"
+
+
+@snapshot.append
+class OrganizationContract(peewee.Model):
+    uuid = CharField(default=uuid.uuid4, max_length=36, unique=True)
+    threshold = IntegerField(default=1)
+    organization = snapshot.ForeignKeyField(index=True, model='organization')
+    contract = snapshot.ForeignKeyField(index=True, model='contract')
+    status = IntegerField(default=1)
+    token_id_whitelist = playhouse.postgres_ext.JSONField(default=[])
+    title = CharField(max_length=50, null=True)
+    image = TextField(null=True)
+    texts = playhouse.postgres_ext.JSONField(default={})
+    snapshot = snapshot.ForeignKeyField(index=True, model='balancesnapshot', null=True)
+    created_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    updated_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    class Meta:
+        table_name = "organizationcontract"
+
+
+@snapshot.append
+class Profile(peewee.Model):
+    context = snapshot.ForeignKeyField(index=True, model='organizationcontract')
+    first_name = CharField(max_length=128)
+    last_name = CharField(max_length=128)
+    email = CharField(max_length=128)
+    phone = CharField(max_length=128)
+    country = CharField(max_length=128)
+    address1 = CharField(max_length=30)
+    address2 = CharField(max_length=30)
+    address3 = CharField(max_length=30, null=True)
+    city = CharField(max_length=128)
+    region = CharField(max_length=128)
+    postal_code = CharField(max_length=16)
+    message = CharField(max_length=1000, null=True)
+    wallet = snapshot.ForeignKeyField(backref='profiles', index=True, model='wallet')
+    sizes = playhouse.postgres_ext.JSONField(default=[])
+    status = SmallIntegerField(default=1)
+    created_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    updated_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    class Meta:
+        table_name = "profile"
+        indexes = (
+            (('context_id', 'wallet_id'), True),
+            )
+
+
+@snapshot.append
+class RevocationEpoch(peewee.Model):
+    kind = SmallIntegerField()
+    key = IntegerField()
+    epoch = IntegerField(default=0)
+    class Meta:
+        table_name = "revocationepoch"
+        indexes = (
+            (('kind', 'key'), True),
+            )
+
+
+@snapshot.append
+class SnapshotBalance(peewee.Model):
+    contract = snapshot.ForeignKeyField(index=True, model='contract')
+    snapshot = snapshot.ForeignKeyField(backref='balances', index=True, model='balancesnapshot', on_delete='CASCADE')
+    block_number = IntegerField()
+    address = models.common.Web3AddressField()
+    token_id = DecimalField(auto_round=False, decimal_places=0, max_digits=78, null=True, rounding='ROUND_HALF_EVEN')
+    balance = DecimalField(auto_round=False, decimal_places=0, max_digits=78, rounding='ROUND_HALF_EVEN')
+    class Meta:
+        table_name = "snapshotbalance"
+        indexes = (
+            (('contract', 'address', 'block_number'), False),
+            )
+
+
+@snapshot.append
+class Transaction(peewee.Model):
+    chain = snapshot.ForeignKeyField(index=True, model='chain')
+    contract = snapshot.ForeignKeyField(index=True, model='contract')
+    block_number = IntegerField()
+    timestamp = playhouse.postgres_ext.DateTimeTZField()
+    hash = models.common.Web3HashField()
+    nonce = IntegerField(null=True)
+    block_hash = models.common.Web3HashField(null=True)
+    index = IntegerField(null=True)
+    log_index = IntegerField(default=0)
+    from_address = models.common.Web3AddressField()
+    to_address = models.common.Web3AddressField()
+    gas = BigIntegerField(null=True)
+    gas_price = BigIntegerField(null=True)
+    gas_used = BigIntegerField(null=True)
+    cumulative_gas_used = BigIntegerField(null=True)
+    token_id = DecimalField(auto_round=False, decimal_places=0, max_digits=78, null=True, rounding='ROUND_HALF_EVEN')
+    value = DecimalField(auto_round=False, decimal_places=0, max_digits=78, null=True, rounding='ROUND_HALF_EVEN')
+    confirmations = BigIntegerField(null=True)
+    created_at = playhouse.postgres_ext.DateTimeTZField(default=datetime.datetime.now)
+    class Meta:
+        table_name = "transaction"
+
+
+@snapshot.append
+class UnfinalizedBlock(peewee.Model):
+    contract = snapshot.ForeignKeyField(backref='unfinalized_blocks', index=True, model='contract')
+    block_number = IntegerField()
+    block_hash = models.common.Web3HashField()
+    class Meta:
+        table_name = "unfinalizedblock"
+        indexes = (
+            (('contract', 'block_number'), True),
+            )
+
+
+def forward(old_orm, new_orm):
+    return [
+        SQL('DROP TRIGGER IF EXISTS "wallet_balances_holdings" ON "wallet_balances"'),
+        # follows balances crossing zero, once per statement. Holdings rows are locked in key order after the balance
+        # rows and holder counts are applied last, with one update per contract, so concurrent writers never wait
+        # for the contract row while holding locks on balances other writers need
+        SQL('''
+            CREATE OR REPLACE FUNCTION "wallet_holdings_apply"() RETURNS trigger LANGUAGE plpgsql AS $$
+            DECLARE
+                changed_contract_ids integer[];
+                changed_addresses bytea[];
+                changed_tokens integer[];
+            BEGIN
+                -- transition tables exist only for the events of the trigger, each branch reads its own
+                IF TG_OP = 'INSERT' THEN
+                    SELECT array_agg("contract_id"), array_agg("address"), array_agg(1)
+                    INTO changed_contract_ids, changed_addresses, changed_tokens
+                    FROM new_rows WHERE "balance" > 0;
+                ELSIF TG_OP = 'UPDATE' THEN
+                    SELECT array_agg("contract_id"), array_agg("address"), array_agg("tokens")
+                    INTO changed_contract_ids, changed_addresses, changed_tokens
+                    FROM (
+                        SELECT "contract_id", "address", 1 AS "tokens" FROM new_rows WHERE "balance" > 0
+                        UNION ALL
+                        SELECT "contract_id", "address", -1 FROM old_rows WHERE "balance" > 0
+                    ) AS held;
+                ELSE
+                    SELECT array_agg("contract_id"), array_agg("address"), array_agg(-1)
+                    INTO changed_contract_ids, changed_addresses, changed_tokens
+                    FROM old_rows WHERE "balance" > 0;
+                END IF;
+
+                IF changed_contract_ids IS NULL THEN
+                    RETURN NULL;
+                END IF;
+
+                WITH changed AS (
+                    SELECT "contract_id", "address", SUM("tokens")::integer AS "tokens"
+                    FROM unnest(changed_contract_ids, changed_addresses, changed_tokens)
+                        AS held ("contract_id", "address", "tokens")
+                    GROUP BY "contract_id", "address"
+                    HAVING SUM("tokens") <> 0
+                ), applied AS (
+                    INSERT INTO "wallet_holdings" ("contract_id", "address", "tokens")
+                    SELECT "contract_id", "address", "tokens" FROM changed
+                    ORDER BY "contract_id", "address"
+                    ON CONFLICT ("contract_id", "address") DO UPDATE SET
+                        "tokens" = "wallet_holdings"."tokens" + EXCLUDED."tokens"
+                    RETURNING "contract_id", "address", "tokens"
+                ), crossed AS (
+                    -- wallet became a holder if it held no tokens before, stopped being one if it holds none now
+                    SELECT applied."contract_id",
+                           SUM(CASE
+                               WHEN applied."tokens" > 0 AND applied."tokens" = changed."tokens" THEN 1
+                               WHEN applied."tokens" = 0 THEN -1
+                               ELSE 0
+                           END) AS "holders"
+                    FROM applied INNER JOIN changed USING ("contract_id", "address")
+                    GROUP BY applied."contract_id"
+                )
+                UPDATE "contract" SET "holders" = "contract"."holders" + crossed."holders"
+                FROM crossed
+                WHERE "contract"."id" = crossed."contract_id" AND crossed."holders" <> 0;
+
+                DELETE FROM "wallet_holdings"
+                USING unnest(changed_contract_ids, changed_addresses, changed_tokens)
+                    AS held ("contract_id", "address", "tokens")
+                WHERE held."tokens" < 0 AND "wallet_holdings"."tokens" = 0
+                  AND "wallet_holdings"."contract_id" = held."contract_id"
+                  AND "wallet_holdings"."address" = held."address";
+
+                RETURN NULL;
+            END
+            $$
+        '''),
+        SQL('''
+            CREATE TRIGGER "wallet_balances_holdings_insert" AFTER INSERT ON "wallet_balances"
+            REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION "wallet_holdings_apply"()
+        '''),
+        SQL('''
+            CREATE TRIGGER "wallet_balances_holdings_update" AFTER UPDATE ON "wallet_balances"
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION "wallet_holdings_apply"()
+        '''),
+        SQL('''
+            CREATE TRIGGER "wallet_balances_holdings_delete" AFTER DELETE ON "wallet_balances"
+            REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION "wallet_holdings_apply"()
+        '''),
+    ]
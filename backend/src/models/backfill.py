@@ -0,0 +1,71 @@
+import datetime
+from typing import List
+
+from peewee import ForeignKeyField, IntegerField, Tuple as SqlTuple
+from playhouse.postgres_ext import DateTimeTZField
+
+from database import BaseModel
+from models.contract import Contract
+
+
+class BackfillRange(BaseModel):
+    """ Block range of contract history to be fetched by the backfill.
+
+        Bulks of a range are committed one by one. Like IngestionCheckpoint, `block` is the last block of the range
+        whose transfers are all saved and `cursor` the number of transfers of the following block saved already,
+        so an interrupted range resumes where it stopped.
+    """
+
+    class Status:
+        PENDING = 0
+        DONE = 1
+
+    contract = ForeignKeyField(Contract, backref='backfill_ranges')
+    start_block = IntegerField()
+    end_block = IntegerField()
+    status = IntegerField(default=Status.PENDING)
+    transactions = IntegerField(default=0)
+    block = IntegerField()
+    cursor = IntegerField(default=0)
+
+    created_at = DateTimeTZField(default=datetime.datetime.now)
+    updated_at = DateTimeTZField(default=datetime.datetime.now)
+
+    class Meta:
+        indexes = (
+            (('contract_id', 'start_block'), True),
+        )
+
+    @classmethod
+    def get_pending(cls, contract: Contract) -> List['BackfillRange']:
+        """ Ranges of contract that are not yet backfilled
+
+            Args:
+                contract - contract to get ranges of
+
+            Returns:
+                pending ranges in block order
+        """
+        return list(cls.select().where(
+            cls.contract == contract,
+            cls.status == cls.Status.PENDING
+        ).order_by(cls.start_block))
+
+    @classmethod
+    def advance(cls, range_id: int, block: int, cursor: int = 0):
+        """ Move position of range forward, positions behind the saved one are ignored
+
+            Args:
+                range_id - ID of range to move position of
+                block - last block whose transfers are all saved
+                cursor - number of saved transfers of the following block
+        """
+        cls.update(block=block, cursor=cursor).where(
+            cls.id == range_id,
+            SqlTuple(cls.block, cls.cursor) < SqlTuple(block, cursor),
+        ).execute()
+
+    @classmethod
+    def exists_for(cls, contract: Contract) -> bool:
+        """ Whether backfill was ever planned for contract """
+        return cls.select().where(cls.contract == contract).exists()
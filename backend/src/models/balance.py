@@ -1,14 +1,21 @@
+from typing import Optional
+
 from peewee import ForeignKeyField, DecimalField
 from playhouse.postgres_ext import DateTimeTZField
 
-from database import BaseModel
+from database import BaseModel, db
 from models.chain import Chain
 from models.common import Web3AddressField
 from models.contract import Contract
 
 
 class Balance(BaseModel):
-    """ A materialized view of balance of a wallet on a chain """
+    """ Balance of a wallet on a chain, per token for ERC1155.
+
+        Kept up to date by triggers on transaction: every insert or delete of transfers applies their signed
+        changes in the same database transaction, so the cost follows the number of new transfers, not history.
+        Last activity `date` is not moved back when transfers are deleted.
+    """
 
     address = Web3AddressField()
     chain = ForeignKeyField(Chain)
@@ -19,3 +26,13 @@ class Balance(BaseModel):
 
     class Meta:
         table_name = 'wallet_balances'
+        primary_key = False
+
+    @classmethod
+    def rebuild(cls, contract: Optional[Contract] = None):
+        """ Recompute balances from the full transaction history, for repair. Ingestion waits for it to finish.
+
+            Args:
+                contract - contract to rebuild balances of, all contracts by default
+        """
+        db.execute_sql('SELECT "wallet_balances_rebuild"(%s)', (contract.id if contract else None,))
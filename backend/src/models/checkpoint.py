@@ -0,0 +1,119 @@
+import datetime
+from typing import Tuple
+
+from peewee import ForeignKeyField, IntegerField, EXCLUDED, Tuple as SqlTuple
+from playhouse.postgres_ext import DateTimeTZField
+
+from database import BaseModel
+from models.common import Web3HashField, hash_regex
+from models.contract import Contract
+from schemas.blockscan import TransactionBatch
+
+
+class IngestionCheckpoint(BaseModel):
+    """ Position up to which transfers of a contract are saved, advanced in the same database transaction as each batch.
+
+        `block` is the last block whose transfers are all saved, `cursor` is the number of transfers
+        of the following block that are saved already.
+    """
+
+    contract = ForeignKeyField(Contract, backref='checkpoints', unique=True)
+    block = IntegerField(default=0)
+    cursor = IntegerField(default=0)
+
+    updated_at = DateTimeTZField(default=datetime.datetime.now)
+
+    @property
+    def position(self) -> Tuple[int, int]:
+        return self.block, self.cursor
+
+    @classmethod
+    def get_for(cls, contract: Contract) -> 'IngestionCheckpoint':
+        """ Checkpoint of contract, unsaved one at the beginning of the chain if contract has none
+
+            Args:
+                contract - contract to get checkpoint of
+
+            Returns:
+                checkpoint
+        """
+        return cls.get_or_none(cls.contract == contract) or cls(contract=contract)
+
+    @classmethod
+    def advance(cls, contract: Contract, block: int, cursor: int = 0):
+        """ Move checkpoint of contract forward. Positions behind the saved one are ignored,
+            so writers committing out of order never move it back.
+
+            Args:
+                contract - contract to move checkpoint of
+                block - last block whose transfers are all saved
+                cursor - number of saved transfers of the following block
+        """
+        cls.insert(
+            contract=contract,
+            block=block,
+            cursor=cursor,
+            updated_at=datetime.datetime.now(),
+        ).on_conflict(
+            conflict_target=[cls.contract],
+            update={
+                cls.block: EXCLUDED.block,
+                cls.cursor: EXCLUDED.cursor,
+                cls.updated_at: EXCLUDED.updated_at,
+            },
+            where=SqlTuple(cls.block, cls.cursor) < SqlTuple(EXCLUDED.block, EXCLUDED.cursor),
+        ).execute()
+
+    @classmethod
+    def rewind(cls, contract: Contract, block: int):
+        """ Move checkpoint of contract back, so transfers following given block are fetched again.
+            Checkpoints already behind it are left as they are.
+
+            Args:
+                contract - contract to move checkpoint of
+                block - last block whose transfers are kept
+        """
+        cls.update(block=block, cursor=0, updated_at=datetime.datetime.now()).where(
+            cls.contract == contract,
+            SqlTuple(cls.block, cls.cursor) > SqlTuple(block, 0),
+        ).execute()
+
+
+class UnfinalizedBlock(BaseModel):
+    """ Block a contract has transfers saved in while it was not final yet, with the hash they were saved at.
+        Compared to the chain on every run until the block is final, see services.finality.
+    """
+
+    contract = ForeignKeyField(Contract, backref='unfinalized_blocks')
+    block_number = IntegerField()
+    block_hash = Web3HashField()
+
+    class Meta:
+        indexes = (
+            (('contract', 'block_number'), True),
+        )
+
+    @classmethod
+    def track(cls, contract: Contract, batch: TransactionBatch, finalized_block: int):
+        """ Remember blocks of batch past the last final block. Blocks tracked already keep their first hash,
+            so a reorg within a run is caught by the next one.
+
+            Args:
+                contract - contract the batch is saved for
+                batch - saved transfers
+                finalized_block - last final block of the chain
+        """
+        blocks = {
+            block_number: block_hash.lower()
+            for block_number, block_hash in zip(batch.block_number, batch.block_hash)
+            # rows the bulk load rejected can't be tracked either
+            if block_number > finalized_block and isinstance(block_hash, str) and hash_regex.match(block_hash)
+        }
+
+        if not blocks:
+            return
+
+        cls.insert_many([
+            {'contract': contract, 'block_number': block_number, 'block_hash': block_hash}
+            for block_number, block_hash in blocks.items()
+        ]).on_conflict_ignore().execute()
@@ -1,50 +1,54 @@
 import re
 
-from peewee import CharField, Model
+from peewee import BlobField, Model
 
 address_regex = re.compile("^0x[a-fA-F0-9]{40}$")
 hash_regex = re.compile("^0x[a-fA-F0-9]{64}$")
 
 
-class Web3AddressField(CharField):
-    """ Field that stores a Web3 address (0x prefixed lowercase 20 byte hex string) """
+class Web3BytesField(BlobField):
+    """ Field that stores a fixed size Web3 value as raw bytes (bytea), converted from and to 0x prefixed
+        lowercase hex string at the model boundary. Takes half the space of hex text and compares bytewise.
+    """
+
+    kind = "value"
+    regex = re.compile("^0x[a-fA-F0-9]*$")
 
     def __init__(self, **kwargs):
+        # older migration snapshots declare these fields with varchar length
         if 'max_length' in kwargs:
             del kwargs['max_length']
 
-        super().__init__(max_length=42, **kwargs)
+        super().__init__(**kwargs)
 
     def db_value(self, value):
+        if value is None:
+            return None
+
         if not isinstance(value, str):
-            raise ValueError("Web3AddressField must be a string")
+            raise ValueError(f"{self.__class__.__name__} must be a string")
 
-        if not address_regex.match(value):
-            raise ValueError(f"{value} is not a valid Ethereum address")
+        if not self.regex.match(value):
+            raise ValueError(f"{value} is not a valid Ethereum {self.kind}")
 
-        return super().db_value(value.lower())
+        return super().db_value(bytes.fromhex(value[2:]))
 
     def python_value(self, value):
-        return value.lower()
+        if value is None:
+            return None
 
+        return '0x' + bytes(value).hex()
 
-class Web3HashField(CharField):
-    """ Field that stores a Web3 hash (0x prefixed lowercase 32 byte hex string) """
 
-    def __init__(self, **kwargs):
-        if 'max_length' in kwargs:
-            del kwargs['max_length']
+class Web3AddressField(Web3BytesField):
+    """ Field that stores a Web3 address (0x prefixed 20 byte hex string) as 20 bytes """
 
-        super().__init__(max_length=66, **kwargs)
+    kind = "address"
+    regex = address_regex
 
-    def db_value(self, value):
-        if not isinstance(value, str):
-            raise ValueError("Web3HashField must be a string")
 
-        if not hash_regex.match(value):
-            raise ValueError(f"{value} is not a valid Ethereum hash")
+class Web3HashField(Web3BytesField):
+    """ Field that stores a Web3 hash (0x prefixed 32 byte hex string) as 32 bytes """
 
-        return super().db_value(value.lower())
-
-    def python_value(self, value):
-        return value.lower()
+    kind = "hash"
+    regex = hash_regex
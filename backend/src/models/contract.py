@@ -19,12 +19,27 @@ from utils import fill_breakdown
 class Contract(BaseModel):
     """ A smart contract on a chain """
 
+    class Source:
+        """ Where transfers of the contract are ingested from """
+        BLOCKSCAN = 0
+        RPC = 1
+
     address: str = Web3AddressField()
     token_name: str = CharField(max_length=128)
     erc_standard: int = IntegerField()
+    # wallets with a positive balance, maintained by database triggers on wallet_balances
     holders: int = IntegerField()
     chain = ForeignKeyField(Chain)
     decimals = IntegerField()
+    source = IntegerField(default=Source.BLOCKSCAN)
+
+    def get_source(self):
+        """ Adapter transfers of this contract are ingested with, Blockscan or Rpc """
+
+        from adapters.blockscan import Blockscan
+        from adapters.rpc import Rpc
+
+        return Rpc if self.source == self.Source.RPC else Blockscan
 
     def get_tx_breakdowns(self) -> Breakdown:
         """ return transactions within last 30 days grouped by day """
@@ -35,7 +50,7 @@ class Contract(BaseModel):
             fn.DATE(Transaction.timestamp).alias('label'),
             fn.COUNT('*').alias('count')
         ).where(
-            Transaction.contract == self,
+            Transaction.for_contract(self),
             Transaction.timestamp > datetime.now() - timedelta(days=30)
         ).group_by(
             fn.DATE(Transaction.timestamp)
@@ -64,10 +79,10 @@ class Contract(BaseModel):
         if contract:
             return contract
 
-        from adapters.blockscan import get_info
+        from adapters.blockscan import Blockscan
 
         # get contract metadata from blockscan
-        info = get_info(address, chain)
+        info = Blockscan.get_info(address, chain)
 
         if not info:
             raise ApiError(f'Contract {address} not found on chain {chain}')
@@ -142,7 +157,7 @@ class Contract(BaseModel):
         from models.transaction import Transaction
 
         return Transaction.select().where(
-            Transaction.contract == self,
+            Transaction.for_contract(self),
             Transaction.timestamp > datetime.now() - timedelta(days=days)
         ).count()
 
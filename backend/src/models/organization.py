@@ -11,6 +11,8 @@ from playhouse.postgres_ext import DateTimeTZField, JSONField
 
 from database import BaseModel
 from models.contract import Contract
+from models.revocation import RevocationEpoch
+from models.snapshot import BalanceSnapshot
 from models.wallet import Wallet
 from schemas.organization import Breakdown
 
@@ -137,12 +139,15 @@ class Organization(BaseModel):
             Args:
                 wallet - wallet of administrator to add
         """
-        OrganizationAdmin.get_or_create(
+        _, created = OrganizationAdmin.get_or_create(
             organization=self,
             wallet=wallet,
             status=OrganizationAdmin.Status.ACTIVE
         )
 
+        if created:
+            RevocationEpoch.bump_wallet(wallet.address)
+
     def add_contract(
             self,
             contract: Contract,
@@ -183,11 +188,15 @@ class Organization(BaseModel):
             Args:
                 wallet - admin to remove
         """
-        OrganizationAdmin.update(status=OrganizationAdmin.Status.DELETED).where(
+        removed = OrganizationAdmin.update(status=OrganizationAdmin.Status.DELETED).where(
             OrganizationAdmin.organization == self,
             OrganizationAdmin.wallet == wallet
         ).execute()
 
+        if removed:
+            RevocationEpoch.bump_organizations([self.id])
+            RevocationEpoch.bump_wallet(wallet.address)
+
     def is_address_admin(self, address: str) -> bool:
         """ Check if address has administrative permissions in this organization.
 
@@ -224,6 +233,7 @@ class OrganizationContract(BaseModel):
         organization and contract combination, such as token_id_whitelist, title, image, texts.
         Each context will have its own verification URL, and such URLs of same organization will
         be seemingly unrelated to the end user.
+        A context referencing a snapshot checks eligibility against balances at the snapshot block instead of live ones.
 
         **NOTE** Same contract may be registered multiple times even within same organization.
         Organization + contract pair does not uniquely identify a context. Use UUID of context instead.
@@ -243,6 +253,7 @@ class OrganizationContract(BaseModel):
     title = CharField(max_length=50, null=True)
     image = TextField(null=True)
     texts = JSONField(default={})
+    snapshot = ForeignKeyField(BalanceSnapshot, null=True)
 
     created_at = DateTimeTZField(default=datetime.datetime.now)
     updated_at = DateTimeTZField(default=datetime.datetime.now)
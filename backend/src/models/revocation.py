@@ -0,0 +1,100 @@
+from typing import Dict, Iterable, Tuple
+
+from peewee import IntegerField, SmallIntegerField, Tuple as SqlTuple, Value
+
+from database import BaseModel
+from models.wallet import Wallet
+
+
+class RevocationEpoch(BaseModel):
+    """ Counter bumped whenever permissions of a wallet or an organization change.
+
+        JWT claims carry epochs of the wallet and organizations they were issued with, claims issued before
+        a bump are not trusted anymore. Only wallets and organizations ever bumped have a row, epochs are read
+        from the database on every use, so bumps made by any process are seen right away.
+    """
+
+    class Kind:
+        WALLET = 0
+        ORGANIZATION = 1
+
+    kind = SmallIntegerField()
+    key = IntegerField()
+    epoch = IntegerField(default=0)
+
+    class Meta:
+        indexes = (
+            (('kind', 'key'), True),
+        )
+
+    @classmethod
+    def get_epochs(cls, keys: Iterable[Tuple[int, int]]) -> Dict[Tuple[int, int], int]:
+        """ Current epochs of given wallets and organizations, with one indexed query
+
+            Args:
+                keys - kind and key pairs
+
+            Returns:
+                epoch of each pair ever bumped, others are at 0
+        """
+
+        keys = list(keys)
+
+        if not keys:
+            return {}
+
+        return {
+            (row.kind, row.key): row.epoch
+            for row in cls.select().where(SqlTuple(cls.kind, cls.key).in_(keys))
+        }
+
+    @classmethod
+    def get_wallet_epochs(cls, address: str) -> Dict[int, int]:
+        """ Current epochs of wallets of address on every chain
+
+            Args:
+                address - wallet address
+
+            Returns:
+                epoch of each wallet ID ever bumped, others are at 0
+        """
+        return {
+            row.key: row.epoch
+            for row in cls.select().where(
+                cls.kind == cls.Kind.WALLET,
+                cls.key.in_(Wallet.select(Wallet.id).where(Wallet.address == address)),
+            )
+        }
+
+    @classmethod
+    def bump_wallet(cls, address: str):
+        """ Invalidate claims issued to address, on every chain
+
+            Args:
+                address - wallet address
+        """
+        cls._bump(Wallet.select(Value(cls.Kind.WALLET), Wallet.id, Value(1)).where(Wallet.address == address))
+
+    @classmethod
+    def bump_organizations(cls, organization_ids: Iterable[int]):
+        """ Invalidate claims of administering given organizations
+
+            Args:
+                organization_ids - IDs of organizations
+        """
+        rows = [(cls.Kind.ORGANIZATION, organization_id, 1) for organization_id in organization_ids]
+
+        if rows:
+            cls._bump(rows)
+
+    @classmethod
+    def _bump(cls, rows):
+        if isinstance(rows, list):
+            query = cls.insert_many(rows, fields=[cls.kind, cls.key, cls.epoch])
+        else:
+            query = cls.insert_from(rows, fields=[cls.kind, cls.key, cls.epoch])
+
+        query.on_conflict(
+            conflict_target=[cls.kind, cls.key],
+            update={cls.epoch: cls.epoch + 1},
+        ).execute()
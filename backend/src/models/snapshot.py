@@ -0,0 +1,133 @@
+import datetime
+from typing import Optional, Sequence
+
+from peewee import ForeignKeyField, IntegerField, DecimalField, CharField, SelectQuery
+from playhouse.postgres_ext import DateTimeTZField
+
+from database import BaseModel, db
+from models.common import Web3AddressField
+from models.contract import Contract
+
+
+class BalanceSnapshot(BaseModel):
+    """ Balances of a contract at a block height, for gating on tokens held at that block.
+
+        Only balances that changed since the previous snapshot of the contract (by block) are stored, see
+        SnapshotBalance. Balance of a wallet at a snapshot is its latest row at or before the snapshot block.
+    """
+
+    contract = ForeignKeyField(Contract, backref='snapshots')
+    block_number = IntegerField()
+    title = CharField(max_length=50, null=True)
+
+    created_at = DateTimeTZField(default=datetime.datetime.now)
+
+    class Meta:
+        indexes = (
+            (('contract', 'block_number'), True),
+        )
+
+    def get_previous(self) -> Optional['BalanceSnapshot']:
+        """ Snapshot of the same contract this one stores changes against """
+        return BalanceSnapshot.select().where(
+            BalanceSnapshot.contract == self.contract_id,
+            BalanceSnapshot.block_number < self.block_number,
+        ).order_by(BalanceSnapshot.block_number.desc()).first()
+
+    def get_next(self) -> Optional['BalanceSnapshot']:
+        """ Snapshot of the same contract storing changes against this one """
+        return BalanceSnapshot.select().where(
+            BalanceSnapshot.contract == self.contract_id,
+            BalanceSnapshot.block_number > self.block_number,
+        ).order_by(BalanceSnapshot.block_number).first()
+
+    def materialize(self):
+        """ (Re)compute balance rows of this snapshot from transfers between the previous snapshot and its block.
+            Only wallets whose balance changed in between get a row, with their balance at this snapshot.
+        """
+
+        previous = self.get_previous()
+
+        SnapshotBalance.delete().where(SnapshotBalance.snapshot == self).execute()
+
+        db.execute_sql('''
+            INSERT INTO "snapshotbalance"
+                ("contract_id", "snapshot_id", "block_number", "address", "token_id", "balance")
+            SELECT %(contract_id)s, %(snapshot_id)s, %(block_number)s, changes."address", changes."token_id",
+                   COALESCE(previous."balance", 0) + changes."delta"
+            FROM (
+                SELECT "address", "token_id", SUM("delta") AS "delta"
+                FROM (
+                    SELECT "from_address" AS "address", changed."token_id",
+                           -CASE WHEN contract."erc_standard" = 721 THEN 1 ELSE changed."value" END AS "delta"
+                    FROM "transaction" AS changed INNER JOIN "contract" ON contract."id" = changed."contract_id"
+                    WHERE changed."chain_id" = %(chain_id)s AND changed."contract_id" = %(contract_id)s
+                      AND changed."block_number" > %(previous_block)s AND changed."block_number" <= %(block_number)s
+                    UNION ALL
+                    SELECT "to_address", changed."token_id",
+                           CASE WHEN contract."erc_standard" = 721 THEN 1 ELSE changed."value" END
+                    FROM "transaction" AS changed INNER JOIN "contract" ON contract."id" = changed."contract_id"
+                    WHERE changed."chain_id" = %(chain_id)s AND changed."contract_id" = %(contract_id)s
+                      AND changed."block_number" > %(previous_block)s AND changed."block_number" <= %(block_number)s
+                ) AS deltas
+                WHERE "address" <> '\\x0000000000000000000000000000000000000000'::bytea
+                GROUP BY "address", "token_id"
+                HAVING SUM("delta") <> 0
+            ) AS changes
+            LEFT JOIN LATERAL (
+                SELECT "balance" FROM "snapshotbalance"
+                WHERE "contract_id" = %(contract_id)s AND "address" = changes."address"
+                  AND "token_id" IS NOT DISTINCT FROM changes."token_id" AND "block_number" <= %(previous_block)s
+                ORDER BY "block_number" DESC
+                LIMIT 1
+            ) AS previous ON true
+        ''', {
+            'chain_id': self.contract.chain_id,
+            'contract_id': self.contract_id,
+            'snapshot_id': self.id,
+            'block_number': self.block_number,
+            'previous_block': previous.block_number if previous else -1,
+        })
+
+    def get_balances(self, address: str, token_ids: Optional[Sequence[int]] = None) -> SelectQuery:
+        """ Positive balances of wallet at this snapshot, same lookup cost as live balances
+
+            Args:
+                address - wallet address
+                token_ids - only balances of these tokens
+
+            Returns:
+                query of rows with token_id and balance
+        """
+
+        latest = SnapshotBalance.select(SnapshotBalance.token_id, SnapshotBalance.balance).where(
+            SnapshotBalance.contract == self.contract_id,
+            SnapshotBalance.address == address,
+            SnapshotBalance.block_number <= self.block_number,
+        ).order_by(
+            SnapshotBalance.token_id,
+            SnapshotBalance.block_number.desc(),
+        ).distinct(SnapshotBalance.token_id)
+
+        if token_ids is not None:
+            latest = latest.where(SnapshotBalance.token_id.in_(token_ids))
+
+        return latest.select_from(latest.c.token_id, latest.c.balance).where(latest.c.balance > 0)
+
+
+class SnapshotBalance(BaseModel):
+    """ Balance of a wallet at a snapshot, stored only if it changed since the previous snapshot of the contract.
+        Contract and block are copied from the snapshot, so lookups are a single index range scan.
+    """
+
+    contract = ForeignKeyField(Contract)
+    snapshot = ForeignKeyField(BalanceSnapshot, backref='balances', on_delete='CASCADE')
+    block_number = IntegerField()
+    address = Web3AddressField()
+    token_id = DecimalField(decimal_places=0, max_digits=78, null=True)
+    balance = DecimalField(decimal_places=0, max_digits=78)
+
+    class Meta:
+        indexes = (
+            (('contract', 'address', 'block_number'), False),
+        )
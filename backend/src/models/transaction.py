@@ -1,33 +1,153 @@
+import csv
 import datetime
+import io
+from typing import Iterable, Sequence, Tuple
 
-from peewee import ForeignKeyField, IntegerField, TextField, DecimalField, BigIntegerField
+from peewee import ForeignKeyField, IntegerField, TextField, DecimalField, BigIntegerField, Expression
 from playhouse.postgres_ext import DateTimeTZField
 
-from database import BaseModel
+from database import BaseModel, db
 from models.chain import Chain
-from models.common import Web3HashField, Web3AddressField
+from models.common import Web3HashField, Web3AddressField, address_regex, hash_regex
 from models.contract import Contract
+from settings import settings
 
 
 class Transaction(BaseModel):
-    """ Blockchain transaction """
+    """ Blockchain transaction, one row per token transfer.
+
+        A transfer is identified by (chain_id, contract_id, hash, log_index, COALESCE(token_id, -1)),
+        enforced by unique index "transaction_transfer_key" created in a migration, as peewee can't declare
+        expression indexes. Saving a transfer again is a no-op.
+
+        The table is partitioned by list of chain_id, each chain partition by hash of contract_id (see migrations).
+        Filter by for_contract() rather than by contract alone, so queries are pruned to a single partition.
+        Transfers of chains without a partition of their own go to the default one.
+
+        With the lean storage profile (settings.transaction_storage) only LEAN_COLUMNS are saved, the rest stay NULL.
+    """
+
+    class Storage:
+        FULL = 'full'
+        LEAN = 'lean'
 
     chain = ForeignKeyField(Chain)
     contract = ForeignKeyField(Contract)
     block_number = IntegerField()
     timestamp = DateTimeTZField()
     hash = Web3HashField()
-    nonce = IntegerField()
-    block_hash = Web3HashField()
-    index = IntegerField()
+    nonce = IntegerField(null=True)
+    block_hash = Web3HashField(null=True)
+    index = IntegerField(null=True)
+    log_index = IntegerField(default=0)
     from_address = Web3AddressField()
     to_address = Web3AddressField()
-    gas = BigIntegerField()
-    gas_price = BigIntegerField()
-    gas_used = BigIntegerField()
-    cumulative_gas_used = BigIntegerField()
+    gas = BigIntegerField(null=True)
+    gas_price = BigIntegerField(null=True)
+    gas_used = BigIntegerField(null=True)
+    cumulative_gas_used = BigIntegerField(null=True)
     token_id = DecimalField(decimal_places=0, max_digits=78, null=True)
     value = DecimalField(decimal_places=0, max_digits=78, null=True)
-    confirmations = BigIntegerField()
+    confirmations = BigIntegerField(null=True)
 
     created_at = DateTimeTZField(default=datetime.datetime.now)
+
+    # columns of rows passed to bulk_load, in order. timestamp is unix time
+    LOAD_COLUMNS = (
+        'block_number', 'timestamp', 'hash', 'nonce', 'block_hash', 'index', 'log_index', 'from_address',
+        'to_address', 'value', 'gas', 'gas_price', 'gas_used', 'cumulative_gas_used', 'token_id', 'confirmations',
+    )
+
+    # columns balances are computed from, along with the transfer key
+    LEAN_COLUMNS = (
+        'block_number', 'timestamp', 'hash', 'log_index', 'from_address', 'to_address', 'value', 'token_id',
+    )
+
+    # how staged text is turned into column values, columns not listed are taken as they are
+    LOAD_EXPRESSIONS = {
+        'timestamp': 'to_timestamp("timestamp")',
+        'hash': 'decode(substr("hash", 3), \'hex\')',
+        'block_hash': 'decode(substr("block_hash", 3), \'hex\')',
+        'from_address': 'decode(substr("from_address", 3), \'hex\')',
+        'to_address': 'decode(substr("to_address", 3), \'hex\')',
+    }
+
+    @classmethod
+    def get_load_columns(cls) -> Tuple[str, ...]:
+        """ Columns saved by bulk_load under the configured storage profile """
+        return cls.LEAN_COLUMNS if settings.transaction_storage == cls.Storage.LEAN else cls.LOAD_COLUMNS
+
+    @classmethod
+    def for_contract(cls, contract: Contract) -> Expression:
+        """ Condition matching transactions of contract, with both partition keys
+
+            Args:
+                contract - contract to match transactions of
+
+            Returns:
+                where clause expression
+        """
+        return (cls.chain == contract.chain_id) & (cls.contract == contract)
+
+    @classmethod
+    def bulk_load(
+            cls,
+            contract: Contract,
+            rows: Iterable[Sequence],
+            columns: Sequence[str] = LOAD_COLUMNS,
+    ) -> Tuple[int, int]:
+        """ Load transactions of contract with COPY through a staging table.
+
+            Rows are streamed into a temporary staging table as CSV and merged into transaction table with
+            a single INSERT ... SELECT. Addresses and hashes are validated by the database in one pass
+            over the staging table instead of per field, rows with invalid ones are skipped.
+            Transfers that are saved already are skipped by the unique transfer key.
+
+            Args:
+                contract - contract transactions belong to
+                rows - tuples of values of columns
+                columns - columns to save, a subset of LOAD_COLUMNS in the same order. Others are left NULL
+
+            Returns:
+                number of inserted and rejected rows
+        """
+
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+
+        names = ', '.join(f'"{column}"' for column in columns)
+        values = ', '.join(cls.LOAD_EXPRESSIONS.get(column, f'"{column}"') for column in columns)
+
+        with db.atomic():
+            cursor = db.cursor()
+
+            # addresses and hashes are staged as hex text, so malformed values reach validation instead of failing COPY,
+            # and are decoded into bytes on insert
+            cursor.execute('''
+                CREATE TEMPORARY TABLE IF NOT EXISTS "transaction_staging" (
+                    "block_number" integer, "timestamp" bigint, "hash" text, "nonce" integer, "block_hash" text,
+                    "index" integer, "log_index" integer, "from_address" text, "to_address" text,
+                    "value" numeric(78, 0), "gas" bigint, "gas_price" bigint, "gas_used" bigint,
+                    "cumulative_gas_used" bigint, "token_id" numeric(78, 0), "confirmations" bigint
+                ) ON COMMIT DELETE ROWS
+            ''')
+            cursor.execute('TRUNCATE "transaction_staging"')
+            cursor.copy_expert(f'COPY "transaction_staging" ({names}) FROM STDIN WITH (FORMAT csv)', buffer)
+
+            cursor.execute('''
+                DELETE FROM "transaction_staging"
+                WHERE "hash" !~* %(hash)s OR "block_hash" !~* %(hash)s
+                   OR "from_address" !~* %(address)s OR "to_address" !~* %(address)s
+            ''', {'hash': hash_regex.pattern, 'address': address_regex.pattern})
+            rejected = cursor.rowcount
+
+            cursor.execute(f'''
+                INSERT INTO "transaction" ("chain_id", "contract_id", {names}, "created_at")
+                SELECT %(chain_id)s, %(contract_id)s, {values}, now()
+                FROM "transaction_staging"
+                ON CONFLICT DO NOTHING
+            ''', {'chain_id': contract.chain_id, 'contract_id': contract.id})
+            inserted = cursor.rowcount
+
+        return inserted, rejected
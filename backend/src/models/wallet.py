@@ -30,3 +30,24 @@ class Wallet(BaseModel):
             OrganizationAdmin.wallet == self,
             OrganizationAdmin.status == OrganizationAdmin.Status.ACTIVE
         )
+
+    @classmethod
+    def set_super_admin(cls, address: str, is_super_admin: bool = True) -> int:
+        """ Grant or revoke super admin permissions of address on every chain.
+            JWT claims issued to address before are not trusted anymore, see RevocationEpoch.
+
+        Args:
+            address - wallet address
+            is_super_admin - whether address becomes or stops being a super admin
+
+        Returns:
+            number of wallets updated
+        """
+        from database import db
+        from models.revocation import RevocationEpoch
+
+        with db.atomic():
+            updated = cls.update(is_super_admin=is_super_admin).where(cls.address == address).execute()
+            RevocationEpoch.bump_wallet(address)
+
+        return updated
@@ -1,22 +1,22 @@
 import hashlib
-from typing import Optional
+from typing import Optional, List
 
 from fastapi import APIRouter
 
-from database import db
 from exceptions.exceptions import ApiError
 from models.contract import Contract
 from schemas.common import ResponseSchema
-from services.contract import process_contracts, process_contract
+from schemas.ingestion import ContractProcessingResult
+from services.contract import process_contracts
 from settings import settings
 
 router = APIRouter()
 
 
-@router.post("/{api_key}", response_model=ResponseSchema[str])
+@router.post("/{api_key}", response_model=ResponseSchema[List[ContractProcessingResult]])
 def process_contract(api_key: str, contract_id: Optional[int] = None):
-    """ Process contract. Processing includes fetching transactions from blockscan and saving them to the database,
-        then wallet_balances materialized view will get refreshed, as well as holder count will be updated on contracts.
+    """ Process contract. Processing includes fetching transactions from blockscan and saving them to the database.
+        Wallet balances and holder counts of contracts are updated along with saved transactions.
 
         Args:
             api_key - hash of application secret key concatenated with a prefix.
@@ -38,18 +38,9 @@ def process_contract(api_key: str, contract_id: Optional[int] = None):
         if contract is None:
             raise ApiError('Contract not found')
 
-        process_contract(contract)
+        results = process_contracts([contract])
     else:
         # refresh all contracts
-        process_contracts()
-
-    # update materialized views and count fields
-    db.execute_sql('refresh materialized view concurrently "public"."wallet_balances";')
-    db.execute_sql("""
-        UPDATE contract set holders = t.holders from (
-            select contract_id, count(*) as holders from transaction group by contract_id
-        ) t 
-        where contract.id = t.contract_id;
-    """)
-
-    return ResponseSchema(error=False, data="", message='Contracts processed')
+        results = process_contracts()
+
+    return ResponseSchema(error=False, data=results, message='Contracts processed')
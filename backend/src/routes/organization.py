@@ -11,6 +11,7 @@ from exceptions.exceptions import ApiError
 from models.chain import Chain
 from models.contract import Contract
 from models.organization import Organization, OrganizationContract
+from models.snapshot import BalanceSnapshot
 from models.wallet import Wallet
 from schemas.common import ResponseSchema, Web3Address
 from schemas.contract import Contract as ContractSchema
@@ -18,6 +19,8 @@ from schemas.organization import Breakdown, CreateContractRequest, AddAdminReque
     RemoveAdminRequest, UpdateContextRequest
 from schemas.profile import Profile
 from schemas.organization import Organization as OrgSchema
+from schemas.snapshot import CreateSnapshotRequest, Snapshot as SnapshotSchema, SnapshotBalance
+from services.snapshot import take_snapshot
 from services.user import UserServiceType, UserService
 
 router = APIRouter(dependencies=[UserService])
@@ -249,9 +252,64 @@ def update_context(
     # filter out empty values
     data.texts = {k: v for k, v in data.texts.items() if v}
 
-    context.update_context(**data.dict())
+    if data.snapshot_id and not BalanceSnapshot.select().where(
+            BalanceSnapshot.id == data.snapshot_id,
+            BalanceSnapshot.contract == context.contract,
+    ).exists():
+        raise ApiError('Snapshot does not exist')
+
+    # snapshot is changed only when sent, null unpins it. Clients unaware of snapshots keep it as it is
+    context.update_context(**data.dict(exclude=None if 'snapshot_id' in data.__fields_set__ else {'snapshot_id'}))
 
     return ResponseSchema(
         error=False,
         message="Context updated successfully"
     )
+
+
+@router.post("/snapshot/create", response_model=ResponseSchema[SnapshotSchema])
+def create_snapshot(
+        data: CreateSnapshotRequest,
+        context: OrganizationContract = RequireContext
+):
+    """ Take snapshot of balances of context contract at given block """
+
+    snapshot = take_snapshot(context.contract, data.block_number, data.title)
+
+    return ResponseSchema(
+        error=False,
+        data=snapshot,
+        message="Snapshot created successfully"
+    )
+
+
+@router.get("/snapshot/list", response_model=ResponseSchema[List[SnapshotSchema]])
+def list_snapshots(context: OrganizationContract = RequireContext):
+    """ List snapshots of context contract, latest block first """
+
+    return ResponseSchema(
+        error=False,
+        data=list(context.contract.snapshots.order_by(BalanceSnapshot.block_number.desc()))
+    )
+
+
+@router.get("/snapshot/{snapshot_id}/balances", response_model=ResponseSchema[List[SnapshotBalance]])
+def get_snapshot_balances(
+        snapshot_id: int,
+        address: Web3Address,
+        context: OrganizationContract = RequireContext
+):
+    """ Get balances wallet held at snapshot """
+
+    snapshot = BalanceSnapshot.get_or_none(
+        BalanceSnapshot.id == snapshot_id,
+        BalanceSnapshot.contract == context.contract,
+    )
+
+    if not snapshot:
+        raise ApiError('Snapshot does not exist')
+
+    return ResponseSchema(
+        error=False,
+        data=list(snapshot.get_balances(address))
+    )
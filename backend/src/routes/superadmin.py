@@ -4,13 +4,16 @@ from fastapi import APIRouter
 
 from dependencies.organization import GetOrganization
 from dependencies.superadmin import GetSuperAdmin
+from exceptions.exceptions import ApiError
 from models.chain import Chain
 from models.contract import Contract
 from models.organization import Organization
 from models.wallet import Wallet
 from schemas.common import ResponseSchema
-from schemas.superadmin import CreateOrganizationRequest
+from schemas.contract import Contract as ContractSchema
+from schemas.superadmin import CreateOrganizationRequest, UpdateContractSourceRequest
 from schemas.organization import Organization as OrgSchema
+from services.contract import switch_source
 
 # all endpoints attached to this router requre superadmin permissions
 router = APIRouter(dependencies=[GetSuperAdmin])
@@ -85,3 +88,20 @@ def get_organization(org: Organization = GetOrganization(required=True)):
         data=org
     )
 
+
+@router.post("/contract/{contract_id}/source", response_model=ResponseSchema[ContractSchema])
+def update_contract_source(contract_id: int, data: UpdateContractSourceRequest):
+    """ Choose where transfers of given contract are ingested from, see Contract.Source """
+
+    contract = Contract.get_or_none(Contract.id == contract_id)
+
+    if not contract:
+        raise ApiError('Contract not found')
+
+    switch_source(contract, data.source)
+
+    return ResponseSchema(
+        error=False,
+        data=contract,
+        message='Contract source updated successfully'
+    )
@@ -8,7 +8,7 @@ from exceptions.exceptions import ApiError
 from models.organization import OrganizationContract
 from schemas.common import ResponseSchema
 from schemas.profile import Profile
-from schemas.user import User, CreateProfile, UserContext, TokenBalance
+from schemas.user import User, CreateProfile, UserContext, TokenBalance, BalanceSummary
 from services.user import UserService, UserServiceType
 
 router = APIRouter()
@@ -36,18 +36,31 @@ def get_balances(user_service: UserServiceType = UserService, context: Organizat
     )
 
 
+@router.get("/balances/summary", response_model=ResponseSchema[BalanceSummary])
+def get_balance_summary(
+        user_service: UserServiceType = UserService,
+        context: OrganizationContract = GetContext(required=True)
+):
+    """ Get total balance, balance of whitelisted token IDs and balance of each whitelisted token ID owned """
+    return ResponseSchema(
+        error=False,
+        data=user_service.get_balance_summary(context)
+    )
+
+
 @router.get("/profile", response_model=ResponseSchema[UserContext])
 def get_profile(user_service: UserServiceType = UserService, context: OrganizationContract = GetContext(required=True)):
     """ Get own profile if it exists """
 
     profile = user_service.get_profile(context)
+    summary = user_service.get_balance_summary(context)
 
     return ResponseSchema(
         error=False,
         data=UserContext(
             profile=profile,
-            balance=user_service.get_balance(context),
-            relevant_balance=user_service.get_balance(context, only_relevant=True),
+            balance=summary.balance,
+            relevant_balance=summary.relevant_balance,
         )
     )
 
@@ -59,15 +72,15 @@ def create_profile(data: CreateProfile, user_service: UserServiceType = UserServ
     if user_service.get_profile(context) is not None:
         raise ApiError("You already have a profile")
 
-    balance = user_service.get_balance(context)
+    summary = user_service.get_balance_summary(context)
 
-    if balance < context.threshold:
+    if summary.balance < context.threshold:
         raise ApiError('Insufficient balance')
 
     if not user_service.has_required_tokens(context):
         raise ApiError('Insufficient tokens')
 
-    present_balances = user_service.get_required_tokens_balances(context)
+    present_balances = summary.token_balances
 
     required_balances = defaultdict(lambda: 0)
 
@@ -1,11 +1,13 @@
 from datetime import datetime, timedelta
+from typing import List
 
 import pytz as pytz
 from fastapi import APIRouter
 
-
+from dependencies.superadmin import GetSuperAdmin
+from dependencies.user import Identity
 from schemas.common import ResponseSchema
-from schemas.verification import SignableMessageRequest, VerificationRequest
+from schemas.verification import BulkVerificationRequest, SignableMessageRequest, VerificationRequest
 from services.verification import VerificationService
 
 router = APIRouter()
@@ -39,10 +41,22 @@ def verify(data: VerificationRequest):
             message="Invalid signature"
         )
 
-    token = VerificationService.create_jwt(data.wallet_address)
+    token = VerificationService.create_jwt(data.wallet_address, Identity.get_claims(data.wallet_address))
 
     return ResponseSchema(
         error=False,
         message="Successfully verified",
         data=token
     )
+
+
+@router.post("/verify/bulk", response_model=ResponseSchema[List[bool]], dependencies=[GetSuperAdmin])
+def verify_bulk(data: BulkVerificationRequest):
+    """ Check many signed messages at once, without verifying wallets or issuing tokens.
+        Limited to super admins, recovering hundreds of signatures costs seconds of CPU without coincurve.
+    """
+
+    return ResponseSchema(
+        error=False,
+        data=VerificationService.verify_many(data.items),
+    )
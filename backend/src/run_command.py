@@ -11,14 +11,31 @@ def root():
 
 
 @root.command()
-def init_views():
+@click.option("--contract-id", type=int, default=None, help="rebuild balances of a single contract")
+def rebuild_balances(contract_id):
     from database import db
+    from models.balance import Balance
+    from models.contract import Contract
 
-    logging.info("Initializing views")
-    with open("init.sql", "r") as f:
-        db.execute_sql(f.read())
+    contract = Contract.get_by_id(contract_id) if contract_id else None
 
-    logging.info("Views initialized")
+    logging.info("Rebuilding wallet balances")
+    with db.atomic():
+        Balance.rebuild(contract)
+
+    logging.info("Wallet balances rebuilt")
+
+
+@root.command()
+@click.argument("address")
+@click.option("--revoke", is_flag=True, help="take super admin permissions away instead of granting them")
+def set_super_admin(address, revoke):
+    from models.wallet import Wallet
+
+    if not Wallet.set_super_admin(address.lower(), not revoke):
+        raise click.ClickException(f"Wallet {address} does not exist")
+
+    logging.info(f"Super admin permissions of {address} {'revoked' if revoke else 'granted'}")
 
 
 if __name__ == "__main__":
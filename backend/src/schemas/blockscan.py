@@ -1,4 +1,6 @@
-from typing import Optional
+from itertools import chain
+from operator import itemgetter
+from typing import Optional, List, Dict, Any, Iterable, Iterator, Sequence, Tuple
 
 from pydantic import BaseModel, Field
 
@@ -23,12 +25,128 @@ class BlockScanTransaction(BaseModel):
     cumulative_gas_used: int = Field(alias="cumulativeGasUsed")
     input: str
     token_id: Optional[int] = Field(alias="tokenID")
+    # position of the transfer log within the block; token transfer lists usually omit it
+    log_index: Optional[int] = Field(alias="logIndex")
     confirmations: int
 
     def get_value(self):
         return self.token_value or self.value
 
 
+class TransactionBatch:
+    """ Token transfers held as columns, one list per field, in ascending block order.
+
+        Pages are decoded column by column instead of into a model per transfer. Numeric fields are converted
+        here, addresses and hashes are validated by the database when the batch is loaded.
+    """
+
+    COLUMNS = (
+        'block_number', 'timestamp', 'hash', 'nonce', 'block_hash', 'index', 'log_index', 'from_address',
+        'to_address', 'value', 'gas', 'gas_price', 'gas_used', 'cumulative_gas_used', 'token_id', 'confirmations',
+    )
+
+    block_number: List[int]
+    timestamp: List[int]
+    hash: List[str]
+    nonce: List[int]
+    block_hash: List[str]
+    index: List[int]
+    log_index: List[Optional[int]]
+    from_address: List[str]
+    to_address: List[str]
+    value: List[Optional[int]]
+    gas: List[int]
+    gas_price: List[int]
+    gas_used: List[int]
+    cumulative_gas_used: List[int]
+    token_id: List[Optional[int]]
+    confirmations: List[int]
+
+    def __init__(self, **columns: list):
+        for column in self.COLUMNS:
+            setattr(self, column, columns.get(column, []))
+
+    def __len__(self) -> int:
+        return len(self.block_number)
+
+    @classmethod
+    def from_items(cls, items: List[Dict[str, Any]]) -> 'TransactionBatch':
+        """ Decode items of a blockscan transfer list page
+
+            Args:
+                items - result of the page
+
+            Returns:
+                batch of transfers
+        """
+
+        def column(key: str) -> List[str]:
+            return list(map(itemgetter(key), items))
+
+        def numbers(key: str) -> List[int]:
+            return list(map(int, column(key)))
+
+        def optional_numbers(key: str) -> List[Optional[int]]:
+            return [int(item[key]) if item.get(key) not in (None, '') else None for item in items]
+
+        return cls(
+            block_number=numbers('blockNumber'),
+            timestamp=numbers('timeStamp'),
+            hash=column('hash'),
+            nonce=numbers('nonce'),
+            block_hash=column('blockHash'),
+            index=numbers('transactionIndex'),
+            log_index=optional_numbers('logIndex'),
+            from_address=column('from'),
+            to_address=column('to'),
+            # ERC1155 lists carry amount in tokenValue
+            value=[
+                token_value or value
+                for token_value, value in zip(optional_numbers('tokenValue'), optional_numbers('value'))
+            ],
+            gas=numbers('gas'),
+            gas_price=numbers('gasPrice'),
+            gas_used=numbers('gasUsed'),
+            cumulative_gas_used=numbers('cumulativeGasUsed'),
+            token_id=optional_numbers('tokenID'),
+            confirmations=numbers('confirmations'),
+        )
+
+    @classmethod
+    def from_transactions(cls, transactions: Iterable[BlockScanTransaction]) -> 'TransactionBatch':
+        """ Batch of transfers given as models """
+
+        transactions = list(transactions)
+
+        return cls(
+            index=[transaction.transaction_index for transaction in transactions],
+            value=[transaction.get_value() for transaction in transactions],
+            **{
+                column: [getattr(transaction, column) for transaction in transactions]
+                for column in cls.COLUMNS if column not in ('index', 'value')
+            }
+        )
+
+    @classmethod
+    def concat(cls, batches: Sequence['TransactionBatch']) -> 'TransactionBatch':
+        if len(batches) == 1:
+            return batches[0]
+
+        return cls(**{
+            column: list(chain.from_iterable(getattr(batch, column) for batch in batches)) for column in cls.COLUMNS
+        })
+
+    def slice(self, start: int, stop: int) -> 'TransactionBatch':
+        if start == 0 and stop >= len(self):
+            return self
+
+        return TransactionBatch(**{column: getattr(self, column)[start:stop] for column in self.COLUMNS})
+
+    def rows(self, columns: Sequence[str]) -> Iterator[Tuple]:
+        """ Batch as row tuples of given columns """
+        return zip(*(getattr(self, column) for column in columns))
+
+
 class TokenInfo(BaseModel):
     contract_address: Web3Address = Field(alias="contractAddress")
     name: str = Field(alias="tokenName")
@@ -14,6 +14,7 @@ class Context(BaseModel):
     title: Optional[str]
     image: Optional[AnyUrl]
     texts: Dict[str, str]
+    snapshot_id: Optional[int]
 
     class Config:
         orm_mode = True
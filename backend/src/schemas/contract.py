@@ -11,6 +11,7 @@ class Contract(BaseModel):
     id: int
     token_name: str
     address: Web3Address
+    holders: int
     context_uuid: Optional[UUID]
     threshold: Optional[int]
     title: Optional[str]
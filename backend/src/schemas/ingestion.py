@@ -0,0 +1,26 @@
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class IngestionMetrics(BaseModel):
+    """ Row counts of one or more ingested batches """
+
+    batches: int = 0
+    received: int = 0
+    inserted: int = 0
+    duplicates: int = 0
+    rejected: int = 0
+
+    def __add__(self, other: 'IngestionMetrics') -> 'IngestionMetrics':
+        return IngestionMetrics(**{
+            field: getattr(self, field) + getattr(other, field) for field in self.__fields__
+        })
+
+
+class ContractProcessingResult(BaseModel):
+    contract_id: int
+    success: bool
+    error: Optional[str]
+    metrics: IngestionMetrics = IngestionMetrics()
+    duration: float = 0
@@ -52,6 +52,7 @@ class UpdateContextRequest(BaseModel):
     title: Optional[str]
     image: Optional[AnyUrl]
     texts: Optional[dict]
+    snapshot_id: Optional[int]
 
 
 class ContextWithOrg(Context):
@@ -0,0 +1,27 @@
+import datetime
+from typing import Optional
+
+from pydantic import BaseModel, Field, NonNegativeInt
+
+
+class Snapshot(BaseModel):
+    id: int
+    block_number: int
+    title: Optional[str]
+    created_at: datetime.datetime
+
+    class Config:
+        orm_mode = True
+
+
+class SnapshotBalance(BaseModel):
+    token_id: Optional[int]
+    balance: float
+
+    class Config:
+        orm_mode = True
+
+
+class CreateSnapshotRequest(BaseModel):
+    block_number: NonNegativeInt
+    title: Optional[str] = Field(None, max_length=50)
@@ -24,3 +24,16 @@ class CreateOrganizationRequest(BaseModel):
             contracts.append(contract_id)
 
         return contracts
+
+
+class UpdateContractSourceRequest(BaseModel):
+    source: int
+
+    @validator('source')
+    def validate_source(cls, v):
+        from models.contract import Contract
+
+        if v not in (Contract.Source.BLOCKSCAN, Contract.Source.RPC):
+            raise ValueError(f'Invalid source {v}')
+
+        return v
@@ -43,3 +43,9 @@ class TokenBalance(BaseModel):
 
     class Config:
         orm_mode = True
+
+
+class BalanceSummary(BaseModel):
+    balance: float
+    relevant_balance: float
+    token_balances: List[TokenBalance]
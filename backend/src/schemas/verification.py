@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, conlist
 from schemas.common import Web3Address
 
 
@@ -10,3 +10,7 @@ class VerificationRequest(BaseModel):
 
 class SignableMessageRequest(BaseModel):
     wallet_address: Web3Address
+
+
+class BulkVerificationRequest(BaseModel):
+    items: conlist(VerificationRequest, min_items=1, max_items=500)
@@ -0,0 +1,115 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from database import db
+from models.backfill import BackfillRange
+from models.checkpoint import IngestionCheckpoint
+from models.contract import Contract
+from schemas.ingestion import IngestionMetrics
+from settings import settings
+
+
+def plan_backfill(contract: Contract) -> List[BackfillRange]:
+    """ Split contract history, from the first transfer up to the current block, into block ranges to be backfilled.
+        Incremental ingestion continues after the current block.
+
+    Args:
+        contract - contract to plan backfill for
+
+    Returns:
+        created ranges, empty if contract has no transfers
+    """
+
+    source = contract.get_source()
+    first_block = source.get_first_block(contract)
+
+    if first_block is None:
+        return []
+
+    tip = source.get_block_number(contract.chain)
+    size = settings.backfill_range_size
+
+    rows = [
+        {
+            'contract': contract,
+            'start_block': start_block,
+            'end_block': min(start_block + size - 1, tip),
+            'block': start_block - 1,
+        }
+        for start_block in range(first_block, tip + 1, size)
+    ]
+
+    logging.info(f'Planned backfill of {contract.address} in {len(rows)} ranges from block {first_block} to {tip}')
+
+    with db.atomic():
+        BackfillRange.insert_many(rows).execute()
+        IngestionCheckpoint.advance(contract, tip)
+
+    return BackfillRange.get_pending(contract)
+
+
+def run_backfill(contract: Contract, finalized_block: Optional[int] = None) -> IngestionMetrics:
+    """ Fetch pending backfill ranges of contract concurrently. Every bulk of a range is committed on its own,
+        along with the position reached in the range, so a failed range resumes from there on the next run.
+        Short database transactions keep concurrent ranges from holding locks on balances they share across
+        statements and page fetches. All ranges are attempted, the first error is raised afterwards.
+
+    Args:
+        contract - contract to backfill
+        finalized_block - last final block of the chain, blocks after it are tracked until they are final
+
+    Returns:
+        ingestion metrics of all ranges
+    """
+
+    from services.contract import ingest_transactions
+
+    ranges = BackfillRange.get_pending(contract)
+
+    if not ranges:
+        return IngestionMetrics()
+
+    logging.info(f'Backfilling {len(ranges)} ranges of {contract.address}')
+
+    source = contract.get_source()
+
+    def backfill(backfill_range: BackfillRange):
+        try:
+            metrics = ingest_transactions(
+                contract,
+                source.get_transactions(contract, backfill_range.block + 1, backfill_range.end_block),
+                writers=1,
+                checkpoint=backfill_range,
+                finalized_block=finalized_block,
+            )
+
+            BackfillRange.update(
+                status=BackfillRange.Status.DONE,
+                transactions=metrics.received,
+            ).where(BackfillRange.id == backfill_range.id).execute()
+        except Exception as e:
+            logging.exception(
+                f'Failed to backfill blocks {backfill_range.start_block}-{backfill_range.end_block} '
+                f'of {contract.address}'
+            )
+            return e
+
+        return metrics
+
+    def backfill_in_thread(backfill_range: BackfillRange):
+        with db.connection_context():
+            return backfill(backfill_range)
+
+    if settings.backfill_workers <= 1 or len(ranges) <= 1:
+        results = [backfill(backfill_range) for backfill_range in ranges]
+    else:
+        with ThreadPoolExecutor(max_workers=settings.backfill_workers, thread_name_prefix='backfill') as pool:
+            results = list(pool.map(backfill_in_thread, ranges))
+
+    errors = [result for result in results if isinstance(result, Exception)]
+
+    if errors:
+        raise errors[0]
+
+    return sum(results, IngestionMetrics())
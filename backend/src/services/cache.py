@@ -0,0 +1,83 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+from settings import settings
+
+
+class VersionedCache:
+    """ Thread safe process-wide cache of values with a time to live, grouped by scope.
+
+        Invalidating a scope bumps its version instead of looking up its entries, entries cached under
+        an older version are treated as missing. The least recently stored entries are evicted over max_size.
+    """
+
+    def __init__(self, max_size: int = 10000):
+        """ Initialize cache.
+
+            Args:
+                max_size - maximum amount of entries kept
+        """
+
+        self.max_size = max_size
+        self._entries: 'OrderedDict[Hashable, Tuple[float, int, Any]]' = OrderedDict()
+        self._versions: Dict[Hashable, int] = {}
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, scope: Hashable, key: Hashable, compute: Callable[[], Any], ttl: float) -> Any:
+        """ Get value cached under key, computing and storing it if it is missing, expired or invalidated
+
+            Args:
+                scope - scope the value is invalidated with
+                key - key of the value within scope
+                compute - function computing the value
+                ttl - seconds the value is kept for
+
+            Returns:
+                cached or computed value
+        """
+
+        with self._lock:
+            version = self._versions.get(scope, 0)
+            entry = self._entries.get((scope, key))
+
+        if entry is not None:
+            expires_at, entry_version, value = entry
+            if entry_version == version and expires_at > time.monotonic():
+                return value
+
+        # computed outside of the lock, concurrent misses of the same key may compute it more than once
+        value = compute()
+
+        with self._lock:
+            # scope invalidated while computing, the value may predate it
+            if self._versions.get(scope, 0) == version:
+                self._entries[(scope, key)] = (time.monotonic() + ttl, version, value)
+                self._entries.move_to_end((scope, key))
+
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+
+        return value
+
+    def invalidate(self, scope: Hashable):
+        """ Drop all values cached under scope
+
+            Args:
+                scope - scope to invalidate
+        """
+        with self._lock:
+            self._versions[scope] = self._versions.get(scope, 0) + 1
+
+    def clear(self):
+        """ Drop all values """
+        with self._lock:
+            self._entries.clear()
+
+
+# balance lookups of wallets, scoped by contract id and invalidated when its transfers are saved
+balance_cache = VersionedCache(settings.balance_cache_size)
+
+# balances of wallets read from the chain, scoped by contract id
+live_balance_cache = VersionedCache(settings.balance_cache_size)
@@ -1,77 +1,406 @@
-import datetime
+import itertools
 import logging
-from typing import List
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from typing import List, Optional, Dict, Hashable, Iterator, Iterable, Tuple, Union
 
-from adapters.blockscan import Blockscan
+from database import db
+from models.backfill import BackfillRange
+from models.checkpoint import IngestionCheckpoint, UnfinalizedBlock
 from models.contract import Contract
 from models.organization import OrganizationContract
 from models.transaction import Transaction
-from schemas.blockscan import BlockScanTransaction
+from schemas.blockscan import TransactionBatch
+from schemas.ingestion import ContractProcessingResult, IngestionMetrics
+from services.backfill import plan_backfill, run_backfill
+from services.cache import balance_cache
+from services.finality import get_finalized_block, reconcile_unfinalized
+from services.pipeline import run_pipeline
+from settings import settings
 
 
-def process_contracts():
-    """ Process all contracts """
+def process_contracts(contracts: Optional[List[Contract]] = None) -> List[ContractProcessingResult]:
+    """ Process contracts in a worker pool.
 
-    for contract in Contract.select().join(OrganizationContract).where(
+    Contracts are processed concurrently by up to settings.process_workers threads. On top of that,
+    no more than settings.process_workers_per_chain contracts of the same chain and
+    settings.process_workers_per_api_key contracts sharing a transfer source limit (blockscan API key
+    or RPC endpoint, see Contract.source) are processed at once.
+    A failure of one contract does not affect the others.
+
+    Args:
+        contracts - contracts to process. Defaults to all contracts of active contexts
+
+    Returns:
+        processing result of each contract, in the same order as contracts
+    """
+
+    if contracts is None:
+        contracts = list(Contract.select().join(OrganizationContract).where(
             OrganizationContract.status == OrganizationContract.Status.ACTIVE
-    ).distinct():
-        process_contract(contract)
+        ).distinct())
+
+    if settings.process_workers <= 1 or len(contracts) <= 1:
+        return [_process_isolated(contract) for contract in contracts]
+
+    # semaphores are created upfront, so worker threads only ever read these mappings
+    limits: Dict[int, List[threading.BoundedSemaphore]] = {}
+    semaphores: Dict[Hashable, threading.BoundedSemaphore] = {}
+
+    for contract in contracts:
+        keys = [('chain', contract.chain_id, settings.process_workers_per_chain)]
+
+        try:
+            throttle_key = contract.get_source().get_throttle_key(contract.chain)
+            keys.append(('api_key', throttle_key, settings.process_workers_per_api_key))
+        except ValueError:
+            pass
+
+        limits[contract.id] = [
+            semaphores.setdefault((kind, key), threading.BoundedSemaphore(max(limit, 1)))
+            for kind, key, limit in keys
+        ]
+
+    def worker(contract: Contract) -> ContractProcessingResult:
+        with ExitStack() as stack:
+            # always acquired in the same order (chain, then api key), which rules out deadlocks
+            for semaphore in limits[contract.id]:
+                stack.enter_context(semaphore)
+
+            with db.connection_context():
+                return _process_isolated(contract)
+
+    results = {}
+
+    with ThreadPoolExecutor(max_workers=settings.process_workers, thread_name_prefix='process-contract') as pool:
+        ordered = _interleave_by_chain(contracts)
+        for contract, result in zip(ordered, pool.map(worker, ordered)):
+            results[contract.id] = result
+
+    return [results[contract.id] for contract in contracts]
+
+
+def _interleave_by_chain(contracts: List[Contract]) -> List[Contract]:
+    """ Order contracts round-robin by chain, so workers waiting on a busy chain's limit don't starve other chains """
+
+    by_chain = defaultdict(list)
+    for contract in contracts:
+        by_chain[contract.chain_id].append(contract)
+
+    return [
+        contract for group in itertools.zip_longest(*by_chain.values())
+        for contract in group if contract is not None
+    ]
+
+
+def _process_isolated(contract: Contract) -> ContractProcessingResult:
+    """ Process single contract, turning any failure into an unsuccessful result """
+
+    started_at = time.monotonic()
+
+    try:
+        metrics = process_contract(contract)
+    except Exception as e:
+        logging.exception(f'Failed to process contract {contract.id} ({contract.address})')
+        return ContractProcessingResult(
+            contract_id=contract.id,
+            success=False,
+            error=str(e),
+            duration=time.monotonic() - started_at,
+        )
+
+    return ContractProcessingResult(
+        contract_id=contract.id,
+        success=True,
+        metrics=metrics,
+        duration=time.monotonic() - started_at,
+    )
 
 
-def process_contract(contract: Contract):
-    """ Save new transactions for given contract
+def process_contract(contract: Contract) -> IngestionMetrics:
+    """ Save new transactions for given contract.
+
+    History of a newly added contract is backfilled first, fetching block ranges concurrently.
+    After that, transactions are fetched from the ingestion checkpoint on, from the source chosen for the contract.
+    Transactions saved in blocks that were not final are checked against the chain first and rolled back on a reorg.
+    Cached balances of the contract are dropped once its transactions are committed.
 
     Args:
         contract - contract to process
+
+    Returns:
+        ingestion metrics
+    """
+
+    metrics = IngestionMetrics()
+    finalized_block = get_finalized_block(contract) if settings.finality_enabled else None
+
+    if settings.backfill_enabled:
+        if not BackfillRange.exists_for(contract) and IngestionCheckpoint.get_for(contract).id is None:
+            plan_backfill(contract)
+
+        # raises if any range failed, so incremental fetch does not run ahead of a gap in history
+        metrics += run_backfill(contract, finalized_block=finalized_block)
+
+    if finalized_block is not None:
+        reconcile_unfinalized(contract, finalized_block)
+
+    checkpoint = IngestionCheckpoint.get_for(contract)
+
+    metrics += ingest_transactions(
+        contract,
+        contract.get_source().get_transactions(contract, checkpoint.block + 1),
+        checkpoint=checkpoint,
+        finalized_block=finalized_block,
+    )
+
+    # transfers rolled back on a reorg are committed by now
+    balance_cache.invalidate(contract.id)
+
+    return metrics
+
+
+def switch_source(contract: Contract, source: int):
+    """ Ingest transfers of contract from another source from now on, see Contract.Source.
+
+    Sources order transfers within a block differently and only RPC has real log indexes, so a cursor inside
+    a block does not carry over. Transfers saved of the block following the checkpoint are deleted in the same
+    database transaction and the whole block is fetched again from the new source.
+
+    Args:
+        contract - contract to switch source of
+        source - source to ingest from
+    """
+
+    with db.atomic():
+        checkpoint = IngestionCheckpoint.get_for(contract)
+
+        if checkpoint.cursor:
+            Transaction.delete().where(
+                Transaction.for_contract(contract),
+                Transaction.block_number == checkpoint.block + 1,
+            ).execute()
+
+            IngestionCheckpoint.rewind(contract, checkpoint.block)
+
+        contract.source = source
+        contract.save(only=[Contract.source])
+
+    balance_cache.invalidate(contract.id)
+
+
+def ingest_transactions(
+        contract: Contract,
+        batches: Iterable[TransactionBatch],
+        writers: Optional[int] = None,
+        checkpoint: Optional[Union[IngestionCheckpoint, BackfillRange]] = None,
+        finalized_block: Optional[int] = None,
+) -> IngestionMetrics:
+    """ Save transactions for given contract.
+
+    Fetching and saving are pipelined: next page is fetched from blockscan while the previous
+    bulk is being written to the database. Fetched batches are regrouped into bulks of settings.ingestion_batch_size.
+
+    With a checkpoint, transactions are expected to start at the block following it. Transfers of that block
+    saved by the previous run are skipped, and the checkpoint is advanced in the database transaction of
+    every bulk, as far as all preceding bulks are committed.
+
+    Args:
+        contract - contract to save transactions for
+        batches - transactions to save in ascending block order, usually a generator fetching them page by page
+        writers - number of writer threads, defaults to settings.ingestion_writers
+        checkpoint - checkpoint of contract, or backfill range with its position, to resume from and advance
+        finalized_block - last final block of the chain, blocks after it are tracked until they are final
+
+    Returns:
+        ingestion metrics summed over all bulks
     """
 
-    bulk: List[BlockScanTransaction] = []
+    metrics = IngestionMetrics()
+    lock = threading.Lock()
+    progress = _Progress()
+    batches = _with_log_index(batches)
+
+    def bulks() -> Iterator[Tuple[int, TransactionBatch, Tuple[int, int]]]:
+        """ Bulks of transactions along with the position reached once the bulk is saved """
+
+        parts: List[TransactionBatch] = []
+        size = 0
+        block, in_block = checkpoint.block if checkpoint else None, 0
+
+        for batch in batches:
+            start = 0
+
+            for i, block_number in enumerate(batch.block_number):
+                if size + i - start >= settings.ingestion_batch_size:
+                    parts.append(batch.slice(start, i))
+                    start = i
+
+                    # bulk completes its last block only if this transaction starts a new one
+                    position = (block, 0) if block_number != block else (block - 1, in_block)
+                    yield progress.next_sequence(), TransactionBatch.concat(parts), position
+                    parts, size = [], 0
 
-    for transaction in Blockscan.get_transactions(contract):
-        bulk.append(transaction)
-        if len(bulk) >= 1000:
-            logging.info(f'Saving bulk of {len(bulk)} transactions')
-            save_transactions(transactions=bulk, contract=contract)
-            bulk.clear()
+                if block_number != block:
+                    block, in_block = block_number, 0
 
-    if bulk:
-        logging.info(f'Saving {len(bulk)} leftover transactions')
-        save_transactions(transactions=bulk, contract=contract)
+                in_block += 1
 
+                if checkpoint and block == checkpoint.block + 1 and in_block <= checkpoint.cursor:
+                    # saved by the previous run
+                    if i > start:
+                        parts.append(batch.slice(start, i))
+                        size += i - start
+                    start = i + 1
 
-def save_transactions(transactions: List[BlockScanTransaction], contract: Contract):
+            if len(batch) > start:
+                parts.append(batch.slice(start, len(batch)))
+                size += len(batch) - start
+
+        if size:
+            yield progress.next_sequence(), TransactionBatch.concat(parts), (block, 0)
+
+    def write(item: Tuple[int, TransactionBatch, Tuple[int, int]]):
+        nonlocal metrics
+
+        sequence, bulk, position = item
+
+        logging.info(f'Saving bulk of {len(bulk)} transactions')
+        batch_metrics = save_transactions(
+            batch=bulk,
+            contract=contract,
+            position=progress.reached(sequence, position) if checkpoint else None,
+            checkpoint=checkpoint,
+            finalized_block=finalized_block,
+        )
+        progress.commit(sequence, position)
+
+        with lock:
+            metrics += batch_metrics
+
+    # load related chain upfront, so writer threads don't race fetching it
+    _ = contract.chain
+
+    try:
+        run_pipeline(
+            bulks(),
+            write,
+            queue_size=settings.ingestion_queue_size,
+            workers=writers or settings.ingestion_writers,
+        )
+    finally:
+        # bulks committed after a concurrent writer could not include them in its checkpoint
+        if checkpoint and progress.position:
+            _advance(contract, checkpoint, progress.position)
+
+    return metrics
+
+
+def _with_log_index(batches: Iterable[TransactionBatch]) -> Iterator[TransactionBatch]:
+    """ Number transfers lacking log index by their order within the transaction, counted from the start of the block.
+
+    Blocks are always fetched from their beginning, so the numbering is the same whenever a block is fetched again.
+    """
+
+    block = None
+    ordinals: Dict[str, int] = defaultdict(int)
+
+    for batch in batches:
+        log_indexes = batch.log_index
+
+        for i, (block_number, transaction_hash) in enumerate(zip(batch.block_number, batch.hash)):
+            if block_number != block:
+                block = block_number
+                ordinals.clear()
+
+            if log_indexes[i] is None:
+                log_indexes[i] = ordinals[transaction_hash]
+
+            ordinals[transaction_hash] += 1
+
+        yield batch
+
+
+def _advance(contract: Contract, checkpoint: Optional[Union[IngestionCheckpoint, BackfillRange]], position):
+    """ Move position of backfill range, or ingestion checkpoint of contract otherwise, forward """
+    if isinstance(checkpoint, BackfillRange):
+        BackfillRange.advance(checkpoint.id, *position)
+    else:
+        IngestionCheckpoint.advance(contract, *position)
+
+
+class _Progress:
+    """ Tracks bulks committed by concurrent writers, so the checkpoint never skips a bulk that is not committed yet """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sequence = 0
+        self.committed: Dict[int, Tuple[int, int]] = {}
+        self.next = 0
+        self.position: Optional[Tuple[int, int]] = None
+
+    def next_sequence(self) -> int:
+        self.sequence += 1
+        return self.sequence - 1
+
+    def commit(self, sequence: int, position: Tuple[int, int]):
+        """ Mark bulk as committed """
+        with self.lock:
+            self.committed[sequence] = position
+            while self.next in self.committed:
+                self.position = self.committed.pop(self.next)
+                self.next += 1
+
+    def reached(self, sequence: int, position: Tuple[int, int]) -> Optional[Tuple[int, int]]:
+        """ Position reached once given bulk commits, None if some preceding bulk is not committed yet """
+        with self.lock:
+            reached, following = self.position, self.next
+            while following == sequence or following in self.committed:
+                reached = position if following == sequence else self.committed[following]
+                following += 1
+
+            return reached if following > sequence else None
+
+
+def save_transactions(
+        batch: TransactionBatch,
+        contract: Contract,
+        position: Optional[Tuple[int, int]] = None,
+        finalized_block: Optional[int] = None,
+        checkpoint: Optional[Union[IngestionCheckpoint, BackfillRange]] = None,
+) -> IngestionMetrics:
     """ Save bulk of transactions for given contract into the database in one operation
 
     Args:
-        transactions - transactions to save
+        batch - transactions to save
         contract - contract to save transactions for
+        position - block and cursor to advance the ingestion checkpoint to, in the same database transaction
+        finalized_block - last final block of the chain, blocks after it are tracked in the same database transaction
+        checkpoint - backfill range to advance to position instead of the ingestion checkpoint
+
+    Returns:
+        row counts of the bulk, taken from statement results
     """
-    rows = []
-
-    logging.info(f'Saving transactions...')
-
-    for transaction in transactions:
-        rows.append({
-            'chain': contract.chain,
-            'contract': contract,
-            'block_number': transaction.block_number,
-            'timestamp': datetime.datetime.fromtimestamp(transaction.timestamp, tz=datetime.timezone.utc),
-            'hash': transaction.hash,
-            'nonce': transaction.nonce,
-            'block_hash': transaction.block_hash,
-            'index': transaction.transaction_index,
-            'from_address': transaction.from_address,
-            'to_address': transaction.to_address,
-            'value': transaction.get_value(),
-            'gas': transaction.gas,
-            'gas_price': transaction.gas_price,
-            'gas_used': transaction.gas_used,
-            'cumulative_gas_used': transaction.cumulative_gas_used,
-            'token_id': transaction.token_id,
-            'confirmations': transaction.confirmations,
-        })
-
-    count_before = Transaction.select().count()
-    Transaction.insert_many(rows).execute()
-    count_after = Transaction.select().count()
-    logging.info(f'Inserted {count_after - count_before} new transactions out of {len(rows)} total')
+
+    with db.atomic():
+        columns = Transaction.get_load_columns()
+        inserted, rejected = Transaction.bulk_load(contract, batch.rows(columns), columns)
+
+        if position:
+            _advance(contract, checkpoint, position)
+
+        if finalized_block is not None:
+            UnfinalizedBlock.track(contract, batch, finalized_block)
+
+    balance_cache.invalidate(contract.id)
+
+    return IngestionMetrics(
+        batches=1,
+        received=len(batch),
+        inserted=inserted,
+        duplicates=len(batch) - inserted - rejected,
+        rejected=rejected,
+    )
@@ -0,0 +1,85 @@
+import logging
+from typing import Dict, Optional, Set
+
+from database import db
+from models.checkpoint import IngestionCheckpoint, UnfinalizedBlock
+from models.contract import Contract
+from models.transaction import Transaction
+from settings import settings
+
+
+def get_finalized_block(contract: Contract) -> int:
+    """ Get the last block of contract chain that is final, i.e. at least finality depth blocks deep
+
+    Args:
+        contract - contract to get finalized block for
+
+    Returns:
+        block number
+    """
+
+    depth = settings.finality_depth.get(contract.chain_id, settings.finality_depth_default)
+
+    return contract.get_source().get_block_number(contract.chain) - depth
+
+
+def reconcile_unfinalized(contract: Contract, finalized_block: int) -> Optional[int]:
+    """ Check transfers saved in blocks that were not final yet against the chain.
+
+    Transfers of the tracked blocks are fetched again and block hashes are compared with the ones they were saved at.
+    From the first block that differs (reorganized, or transfers appeared or disappeared) on, saved transfers are
+    deleted and the checkpoint is moved back, so they are fetched again by the incremental ingestion.
+    Blocks that are final by now stop being tracked, finalized history is never fetched again.
+
+    Args:
+        contract - contract to reconcile
+        finalized_block - last final block of the chain
+
+    Returns:
+        first block rolled back, None if saved transfers match the chain
+    """
+
+    saved: Dict[int, str] = {
+        block.block_number: block.block_hash
+        for block in UnfinalizedBlock.select().where(UnfinalizedBlock.contract == contract)
+    }
+
+    if not saved:
+        return None
+
+    first_block, last_block = min(saved), max(saved)
+    fetched: Dict[int, Set[str]] = {}
+
+    for batch in contract.get_source().get_transactions(contract, first_block, last_block):
+        for block_number, block_hash in zip(batch.block_number, batch.block_hash):
+            fetched.setdefault(block_number, set()).add(block_hash.lower())
+
+    rollback_block = next(
+        (block for block in sorted(saved.keys() | fetched.keys()) if fetched.get(block) != {saved.get(block)}),
+        None,
+    )
+
+    with db.atomic():
+        if rollback_block is not None:
+            logging.warning(
+                f'Chain of {contract.address} reorganized at block {rollback_block}, rolling back transfers'
+            )
+
+            Transaction.delete().where(
+                Transaction.for_contract(contract),
+                Transaction.block_number >= rollback_block,
+            ).execute()
+
+            UnfinalizedBlock.delete().where(
+                UnfinalizedBlock.contract == contract,
+                UnfinalizedBlock.block_number >= rollback_block,
+            ).execute()
+
+            IngestionCheckpoint.rewind(contract, rollback_block - 1)
+
+        UnfinalizedBlock.delete().where(
+            UnfinalizedBlock.contract == contract,
+            UnfinalizedBlock.block_number <= finalized_block,
+        ).execute()
+
+    return rollback_block
@@ -0,0 +1,104 @@
+import queue
+import threading
+from typing import Iterable, Callable, TypeVar, List
+
+from database import db
+
+T = TypeVar("T")
+
+_DONE = object()
+
+
+def run_pipeline(items: Iterable[T], consume: Callable[[T], None], queue_size: int = 4, workers: int = 1):
+    """ Run producer/consumer pipeline.
+
+    Items are pulled from `items` in a background thread and handed over to `consume` through a bounded queue,
+    so producing the next item (e.g. fetching the next page) overlaps with consuming the previous one.
+    Producer blocks once consumers fall `queue_size` items behind. An error raised by consume stops the pipeline
+    right away, while items produced before a producer error are still consumed. The first error is re-raised
+    in the calling thread.
+
+    Args:
+        items - iterable producing work items, iterated in a background thread
+        consume - function called for every item. With a single worker it runs in the calling thread,
+                  otherwise in worker threads, each with own database connection
+        queue_size - maximum amount of produced, but not yet consumed items
+        workers - number of consumers
+    """
+
+    workers = max(workers, 1)
+    pending: queue.Queue = queue.Queue(maxsize=max(queue_size, 1))
+    stop = threading.Event()
+    errors: List[Exception] = []
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                pending.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put(item):
+                    return
+        except Exception as e:
+            # items produced before the error are still consumed
+            errors.append(e)
+        finally:
+            for _ in range(workers):
+                put(_DONE)
+            _close_connection()
+
+    def consume_all():
+        while not stop.is_set():
+            try:
+                item = pending.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            if item is _DONE:
+                return
+
+            try:
+                consume(item)
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+
+    def consume_in_thread():
+        try:
+            consume_all()
+        finally:
+            _close_connection()
+
+    producer = threading.Thread(target=produce, name='pipeline-producer', daemon=True)
+    producer.start()
+
+    try:
+        if workers == 1:
+            consume_all()
+        else:
+            consumers = [
+                threading.Thread(target=consume_in_thread, name=f'pipeline-consumer-{i}', daemon=True)
+                for i in range(workers)
+            ]
+            for consumer in consumers:
+                consumer.start()
+            for consumer in consumers:
+                consumer.join()
+    finally:
+        stop.set()
+        producer.join()
+
+    if errors:
+        raise errors[0]
+
+
+def _close_connection():
+    """ Close database connection of current thread if one was opened """
+    if not db.is_closed():
+        db.close()
@@ -0,0 +1,180 @@
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from eth_hash.auto import keccak
+
+from settings import settings
+
+try:
+    import coincurve
+except ImportError:
+    coincurve = None
+
+
+class PythonBackend:
+    """ Public key recovery in pure python through eth_keys, same implementation web3 falls back to """
+
+    name = 'python'
+
+    @classmethod
+    def recover_many(cls, signatures: Sequence[Tuple[bytes, bytes, int]]) -> List[Optional[bytes]]:
+        """ Recover public keys of signatures
+
+            Args:
+                signatures - 32 byte hash of signed message, 64 byte r and s and recovery id 0 or 1 of each signature
+
+            Returns:
+                64 byte uncompressed public key without prefix of each signature, None if it is not a point of the curve
+        """
+        from eth_keys.backends.native.ecdsa import ecdsa_raw_recover
+
+        result = []
+
+        for message_hash, rs, recovery_id in signatures:
+            try:
+                result.append(ecdsa_raw_recover(
+                    message_hash,
+                    (recovery_id, int.from_bytes(rs[:32], 'big'), int.from_bytes(rs[32:], 'big')),
+                ))
+            except Exception:
+                result.append(None)
+
+        return result
+
+
+class CoincurveBackend:
+    """ Public key recovery in libsecp256k1 through coincurve, used when it is installed.
+        Calls the library directly with one context and output buffers reused across signatures.
+    """
+
+    name = 'coincurve'
+
+    @classmethod
+    def recover_many(cls, signatures: Sequence[Tuple[bytes, bytes, int]]) -> List[Optional[bytes]]:
+        """ Recover public keys of signatures, see PythonBackend.recover_many """
+        from coincurve._libsecp256k1 import ffi, lib
+
+        context = coincurve.context.GLOBAL_CONTEXT.ctx
+        signature = ffi.new('secp256k1_ecdsa_recoverable_signature *')
+        public_key = ffi.new('secp256k1_pubkey *')
+        output = ffi.new('unsigned char[65]')
+        output_length = ffi.new('size_t *')
+        result = []
+
+        for message_hash, rs, recovery_id in signatures:
+            if not (
+                lib.secp256k1_ecdsa_recoverable_signature_parse_compact(context, signature, rs, recovery_id) and
+                lib.secp256k1_ecdsa_recover(context, public_key, signature, message_hash)
+            ):
+                result.append(None)
+                continue
+
+            output_length[0] = 65
+            lib.secp256k1_ec_pubkey_serialize(
+                context, output, output_length, public_key, lib.SECP256K1_EC_UNCOMPRESSED,
+            )
+            result.append(ffi.buffer(output, 65)[1:])
+
+        return result
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_backends() -> list:
+    """ Recovery backends available in this environment, fastest first """
+    return [CoincurveBackend, PythonBackend] if coincurve is not None else [PythonBackend]
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """ Process pool shared by bulk recoveries, of settings.signature_workers processes """
+    global _pool
+
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=settings.signature_workers)
+
+        return _pool
+
+
+def hash_message(message: str) -> bytes:
+    """ Hash of text message as signed by personal_sign (EIP-191) """
+    data = message.encode('utf-8')
+    return keccak(b'\x19Ethereum Signed Message:\n' + str(len(data)).encode() + data)
+
+
+def parse_signature(signature: str) -> Optional[Tuple[bytes, int]]:
+    """ Split 65 byte hex signature into r and s bytes and recovery id
+
+        Args:
+            signature - hex signature, v either 0/1 or 27/28
+
+        Returns:
+            r and s bytes and recovery id, None if signature is malformed
+    """
+
+    try:
+        raw = bytes.fromhex(signature[2:] if signature.startswith('0x') else signature)
+    except ValueError:
+        return None
+
+    if len(raw) != 65:
+        return None
+
+    recovery_id = raw[64] - 27 if raw[64] >= 27 else raw[64]
+
+    if recovery_id not in (0, 1):
+        return None
+
+    return raw[:64], recovery_id
+
+
+def recover_address(message: str, signature: str, backend=None) -> Optional[str]:
+    """ Recover address which signed text message
+
+        Args:
+            message - signed message
+            signature - hex signature
+            backend - recovery backend, fastest available by default
+
+        Returns:
+            lowercase address, None if signature is invalid
+    """
+    return recover_addresses([(message, signature)], backend)[0]
+
+
+def recover_addresses(items: Iterable[Tuple[str, str]], backend=None) -> List[Optional[str]]:
+    """ Recover addresses which signed many text messages, see recover_address.
+
+        Signatures are parsed and messages hashed up front, then public keys are recovered by the backend
+        in one call, split across settings.signature_workers processes for batches of at least
+        settings.signature_pool_threshold signatures.
+
+        Args:
+            items - message and signature pairs
+            backend - recovery backend, fastest available by default
+
+        Returns:
+            recovered address of each pair, in order
+    """
+
+    backend = backend or get_backends()[0]
+    parsed = [(message, parse_signature(signature)) for message, signature in items]
+    signatures = [(hash_message(message), *signature) for message, signature in parsed if signature is not None]
+
+    if settings.signature_workers > 1 and len(signatures) >= settings.signature_pool_threshold:
+        size = -(-len(signatures) // settings.signature_workers)
+        chunks = [signatures[start:start + size] for start in range(0, len(signatures), size)]
+        public_keys = iter([key for keys in get_pool().map(backend.recover_many, chunks) for key in keys])
+    else:
+        public_keys = iter(backend.recover_many(signatures))
+
+    result = []
+
+    for _, signature in parsed:
+        public_key = next(public_keys) if signature is not None else None
+        result.append('0x' + keccak(public_key)[-20:].hex() if public_key is not None else None)
+
+    return result
@@ -0,0 +1,61 @@
+import logging
+from typing import Optional
+
+from database import db
+from exceptions.exceptions import ApiError
+from models.backfill import BackfillRange
+from models.checkpoint import IngestionCheckpoint, UnfinalizedBlock
+from models.contract import Contract
+from models.snapshot import BalanceSnapshot
+
+
+def take_snapshot(contract: Contract, block_number: int, title: Optional[str] = None) -> BalanceSnapshot:
+    """ Materialize balances of contract at given block.
+
+    Transfers up to the block must be saved and final, so the snapshot never changes afterwards.
+    The snapshot stores changes against the previous snapshot of the contract. A snapshot taken between two existing
+    ones becomes the base of the following one, which is recomputed against it.
+
+    Args:
+        contract - contract to take snapshot of
+        block_number - block to take balances at, inclusive
+        title - optional label shown to admins
+
+    Returns:
+        created snapshot
+    """
+
+    if block_number > IngestionCheckpoint.get_for(contract).block:
+        raise ApiError(f'Transfers up to block {block_number} are not saved yet')
+
+    if BackfillRange.select().where(
+            BackfillRange.contract == contract,
+            BackfillRange.status == BackfillRange.Status.PENDING,
+            BackfillRange.start_block <= block_number,
+    ).exists():
+        raise ApiError(f'History up to block {block_number} is still being backfilled')
+
+    if UnfinalizedBlock.select().where(
+            UnfinalizedBlock.contract == contract,
+            UnfinalizedBlock.block_number <= block_number,
+    ).exists():
+        raise ApiError(f'Block {block_number} is not final yet')
+
+    with db.atomic():
+        if BalanceSnapshot.select().where(
+                BalanceSnapshot.contract == contract,
+                BalanceSnapshot.block_number == block_number,
+        ).exists():
+            raise ApiError(f'Snapshot at block {block_number} already exists')
+
+        snapshot = BalanceSnapshot.create(contract=contract, block_number=block_number, title=title)
+        snapshot.materialize()
+
+        following = snapshot.get_next()
+
+        if following:
+            following.materialize()
+
+    logging.info(f'Snapshot of {contract.address} taken at block {block_number}')
+
+    return snapshot
@@ -1,13 +1,20 @@
+import logging
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+import requests
 from fastapi import Depends
-from peewee import fn
 
+from adapters.rpc import Rpc
 from dependencies.user import AuthService, AuthServiceType
-from exceptions.exceptions import ApiError
+from exceptions.exceptions import ApiError, RpcError
 from models.balance import Balance
 
-from models.organization import OrganizationContract, Organization, OrganizationAdmin
+from models.organization import OrganizationContract, Organization
 from models.profile import Profile
-from schemas.user import User
+from models.wallet import Wallet
+from schemas.user import User, BalanceSummary, TokenBalance
+from services.cache import VersionedCache, balance_cache, live_balance_cache
+from settings import settings
 
 
 class UserServiceType:
@@ -15,6 +22,8 @@ class UserServiceType:
 
     def __init__(self, auth_service):
         self.auth_service: AuthServiceType = auth_service
+        # balance lookups made within this request, see _get_cached
+        self._balances: Dict[Hashable, Any] = {}
 
     def create_profile(self, context: OrganizationContract, **kwargs) -> Profile:
         """ Create a profile for user in given context
@@ -27,7 +36,7 @@ class UserServiceType:
             created profile
         """
 
-        wallet = self.auth_service.get_wallet(context.contract.chain, or_create=True)
+        wallet = self.auth_service.get_wallet(context.contract.chain_id, or_create=True)
 
         if Profile.select().where(
                 Profile.wallet == wallet,
@@ -72,7 +81,8 @@ class UserServiceType:
         return self.auth_service.get_profile(context)
 
     def get_balance(self, context: OrganizationContract, only_relevant: bool = False) -> int:
-        """ Get wallet balance of given contract. If it is erc1155, return sum across all token ids
+        """ Get wallet balance of given contract. If it is erc1155, return sum across all token ids.
+            Balance at the snapshot of context if it references one.
 
         Args:
             context - context to get balance for
@@ -82,29 +92,151 @@ class UserServiceType:
             token balance
         """
 
-        q = Balance.select(
-            fn.SUM(Balance.balance)
-        ).where(
-            Balance.address == self.auth_service.get_wallet().address,
-            Balance.contract == context.contract,
-        ).group_by(
-            Balance.address,
-            Balance.contract
+        summary = self.get_balance_summary(context)
+
+        return summary.relevant_balance if only_relevant else summary.balance
+
+    def get_balance_summary(self, context: OrganizationContract) -> BalanceSummary:
+        """ Get total, whitelisted and per token balances of wallet in context, all read with one query.
+            Balances at the snapshot of context if it references one. With settings.live_balance_enabled,
+            balances that don't meet the context requirements are read from the contract instead.
+
+        Args:
+            context - context to get balances in
+
+        Returns:
+            balance summary
+        """
+
+        summary = self._get_cached(
+            context,
+            'summary',
+            lambda: self._query_balance_summary(context),
+            balance_cache,
+            settings.balance_cache_ttl,
         )
 
-        if only_relevant and context.token_id_whitelist:
-            q = q.where(Balance.token_id.in_(context.token_id_whitelist))
+        # indexed balances lag behind the chain, so only wallets falling short cost RPC calls
+        if settings.live_balance_enabled and not context.snapshot_id and not self._is_eligible(context, summary):
+            summary = self._get_cached(
+                context,
+                'live_summary',
+                lambda: self._get_live_balance_summary(context, summary),
+                live_balance_cache,
+                settings.live_balance_ttl,
+            )
+
+        return summary
+
+    def _is_eligible(self, context: OrganizationContract, summary: BalanceSummary) -> bool:
+        return summary.balance >= context.threshold and bool(not context.token_id_whitelist or summary.token_balances)
+
+    def _query_balance_summary(self, context: OrganizationContract) -> BalanceSummary:
+        address = self.auth_service.wallet_address
+
+        if context.snapshot_id:
+            rows = context.snapshot.get_balances(address).tuples()
+        else:
+            rows = Balance.select(Balance.token_id, Balance.balance).where(
+                Balance.address == address,
+                Balance.contract == context.contract,
+            ).tuples()
+
+        return self._summarize(context, rows)
+
+    def _get_live_balance_summary(self, context: OrganizationContract, indexed: BalanceSummary) -> BalanceSummary:
+        """ Balance summary of wallet read from the contract through RPC, indexed one if it can't be read.
+            ERC1155 balances can only be read of whitelisted tokens, as held tokens are not known otherwise.
+
+        Args:
+            context - context to get balances in
+            indexed - balance summary from indexed balances
+
+        Returns:
+            balance summary
+        """
+
+        contract = context.contract
+
+        if contract.chain_id not in settings.rpc_endpoints or (
+                contract.erc_standard == 1155 and not context.token_id_whitelist
+        ):
+            return indexed
 
-        balance = q.scalar()
+        try:
+            rows = Rpc.get_balances(contract, self.auth_service.wallet_address, context.token_id_whitelist)
+        except (RpcError, requests.RequestException) as e:
+            logging.warning(f'Could not read live balances of {contract.address}: {e}')
+            return indexed
 
-        decimals = context.contract.decimals
+        return self._summarize(context, rows)
 
-        balance = balance or 0
+    def _summarize(self, context: OrganizationContract, rows: Iterable[Tuple[Optional[int], int]]) -> BalanceSummary:
+        """ Balance summary out of token id and balance pairs of wallet """
 
-        return balance / 10 ** decimals
+        whitelist = set(context.token_id_whitelist)
+        total, relevant = 0, 0
+        token_balances = []
+
+        for token_id, balance in rows:
+            balance = balance or 0
+            total += balance
+
+            if token_id in whitelist:
+                relevant += balance
+
+                if balance > 0:
+                    token_balances.append(TokenBalance(token_id=token_id, balance=balance))
+
+        # whitelist not enforced
+        if not whitelist:
+            relevant = total
+
+        unit = 10 ** context.contract.decimals
+
+        return BalanceSummary(
+            balance=total / unit,
+            relevant_balance=relevant / unit,
+            token_balances=sorted(token_balances, key=lambda token_balance: token_balance.token_id),
+        )
+
+    def _get_cached(
+            self,
+            context: OrganizationContract,
+            kind: str,
+            compute: Callable[[], Any],
+            cache: VersionedCache,
+            ttl: float,
+    ) -> Any:
+        """ Balance lookup of this wallet in context, computed once per request. With ttl it is also cached
+            across requests, until it expires or the contract scope of the cache is invalidated.
+
+        Args:
+            context - context of the lookup
+            kind - name of the lookup
+            compute - function making the lookup
+            cache - process-wide cache to keep the lookup in
+            ttl - seconds the lookup is kept for across requests, 0 for none
+
+        Returns:
+            result of the lookup
+        """
+
+        key = (
+            kind, self.auth_service.wallet_address, context.contract_id, context.snapshot_id,
+            tuple(context.token_id_whitelist),
+        )
+
+        if key not in self._balances:
+            if ttl > 0:
+                self._balances[key] = cache.get_or_compute(context.contract_id, key, compute, ttl)
+            else:
+                self._balances[key] = compute()
+
+        return self._balances[key]
 
     def has_access(self, organization: Organization):
-        """ Whether user has access to organization
+        """ Whether user has access to organization, answered from the identity loaded with the request
 
         Args:
             organization - organization user trying to access
@@ -115,11 +247,7 @@ class UserServiceType:
         if self.is_super_admin():
             return True
 
-        return OrganizationAdmin.select().where(
-            OrganizationAdmin.wallet == self.auth_service.get_wallet(),
-            OrganizationAdmin.organization == organization,
-            OrganizationAdmin.status == OrganizationAdmin.Status.ACTIVE
-        ).exists()
+        return organization.id in self.auth_service.identity.organization_ids
 
     def get_me(self) -> User:
         """ Gather user data into one object
@@ -127,10 +255,18 @@ class UserServiceType:
             Returns:
                 user
         """
+        organization_ids = self.auth_service.identity.organization_ids
+        wallet = self.auth_service.get_wallet()
+
+        if self.auth_service.identity.claims_based:
+            wallet = Wallet.get_by_id(wallet.id)
+
         return User(
-            wallet=self.auth_service.get_wallet(),
+            wallet=wallet,
             is_super_admin=self.is_super_admin(),
-            organizations=list(self.auth_service.get_wallet().get_administrated_organizations()),
+            organizations=list(
+                Organization.select().where(Organization.id.in_(organization_ids)).order_by(Organization.id)
+            ) if organization_ids else [],
         )
 
     def is_super_admin(self) -> bool:
@@ -155,10 +291,11 @@ class UserServiceType:
         if not context.token_id_whitelist:
             return True
 
-        return self.get_required_tokens_balances(context).exists()
+        return bool(self.get_required_tokens_balances(context))
 
-    def get_required_tokens_balances(self, context: OrganizationContract):
-        """ Query returning all balances which have contracts whitelisted in context
+    def get_required_tokens_balances(self, context: OrganizationContract) -> List[TokenBalance]:
+        """ All balances which have contracts whitelisted in context.
+            Balances at the snapshot of context if it references one.
 
             Args:
                 context - context in which to get balances
@@ -166,12 +303,7 @@ class UserServiceType:
             Returns:
                 whitelisted balances
         """
-        return Balance.select(Balance.balance, Balance.token_id, Balance.address, Balance.contract).where(
-            Balance.address == self.auth_service.get_wallet().address,
-            Balance.contract == context.contract,
-            Balance.token_id.in_(context.token_id_whitelist),
-            Balance.balance > 0
-        )
+        return self.get_balance_summary(context).token_balances
 
 
 def user_service_dependency(auth_service=AuthService):
@@ -1,22 +1,16 @@
 import datetime
 import hashlib
 import re
-from typing import Optional
+from typing import Any, Dict, List, Optional, Sequence
 
 import pytz
 import jwt
 
 from exceptions.exceptions import ApiError
 from models.wallet import Wallet
+from schemas.verification import VerificationRequest
+from services.signature import recover_address, recover_addresses
 from settings import settings
-from web3.auto import w3
-from eth_account.messages import defunct_hash_message
-
-
-def recover_address(message, signature):
-    message_hash = defunct_hash_message(text=message)
-    address = w3.eth.account.recoverHash(message_hash, signature=signature)
-    return address
 
 
 class VerificationService:
@@ -37,7 +31,14 @@ class VerificationService:
         return msg_hash
 
     @classmethod
-    def verify(cls, wallet_address: str, signature: str, message: str) -> Optional[Wallet]:
+    def check_message(cls, wallet_address: str, message: str):
+        """ Check message was generated for wallet and has not expired, see get_message
+
+            Args:
+                wallet_address - address message was requested for
+                message - signed message
+        """
+
         match = re.match(r'.*(s*[a-f0-9]{64})\.([0-9]{10})', message)
 
         if not match:
@@ -52,9 +53,13 @@ class VerificationService:
         if expires_at < int(datetime.datetime.now(tz=pytz.utc).timestamp()):
             raise ApiError("Signature expired")
 
+    @classmethod
+    def verify(cls, wallet_address: str, signature: str, message: str) -> Optional[Wallet]:
+        cls.check_message(wallet_address, message)
+
         recovered_address = recover_address(message, signature)
 
-        if not recovered_address.lower() == wallet_address.lower():
+        if recovered_address is None or recovered_address != wallet_address.lower():
             return None
 
         wallet, _ = Wallet.get_or_create(
@@ -68,10 +73,49 @@ class VerificationService:
         return wallet
 
     @classmethod
-    def create_jwt(cls, wallet_address):
+    def verify_many(cls, requests: Sequence[VerificationRequest]) -> List[bool]:
+        """ Check many signed messages at once, without creating wallets of signers
+
+            Args:
+                requests - wallet addresses with their signed messages
+
+            Returns:
+                whether each message is valid and signed by its wallet, in order
+        """
+
+        checked = []
+
+        for request in requests:
+            try:
+                cls.check_message(request.wallet_address, request.message)
+            except ApiError:
+                continue
+
+            checked.append(request)
+
+        # signature recovery dominates, done in one batch for messages that passed the cheap checks
+        signers = dict(zip(
+            map(id, checked),
+            recover_addresses((request.message, request.signature) for request in checked),
+        ))
+
+        return [signers.get(id(request)) == request.wallet_address.lower() for request in requests]
+
+    @classmethod
+    def create_jwt(cls, wallet_address, claims: Optional[Dict[str, Any]] = None):
+        """ Create JWT of wallet, valid for a day
+
+            Args:
+                wallet_address - address of verified wallet
+                claims - identity claims, see Identity.get_claims. Without them identity is loaded on every request
+
+            Returns:
+                encoded token
+        """
 
         token = jwt.encode(
             {
+                **(claims or {}),
                 "wallet_address": wallet_address,
                 "exp": datetime.datetime.utcnow() + datetime.timedelta(days=1),
             },
@@ -29,8 +29,69 @@ class Settings(BaseSettings):
     bscscan_api_url: str = Field("https://api.bscscan.com/api", env="BSCSCAN_API_URL")
     polygon_api_url: str = Field("https://api.polygonscan.com/api", env="POLYGONSCAN_API_URL")
 
+    # blockscan client; documented limit is 5 requests per second per API key
+    blockscan_rate_limit: float = Field(5, env="BLOCKSCAN_RATE_LIMIT")
+    blockscan_chain_rate_limit: float = Field(5, env="BLOCKSCAN_CHAIN_RATE_LIMIT")
+    blockscan_max_retries: int = Field(5, env="BLOCKSCAN_MAX_RETRIES")
+    blockscan_backoff: float = Field(0.5, env="BLOCKSCAN_BACKOFF")
+    blockscan_timeout: float = Field(30, env="BLOCKSCAN_TIMEOUT")
+    blockscan_pool_size: int = Field(10, env="BLOCKSCAN_POOL_SIZE")
+    # parse transfer lists incrementally from the response body instead of loading whole pages
+    blockscan_streaming: bool = Field(True, env="BLOCKSCAN_STREAMING")
+
     rpc_endpoints: Dict[int, str] = Field(..., env="RPC_ENDPOINTS")
 
+    # RPC transfer source; eth_getLogs calls over rpc_batch_size consecutive block windows are sent in one request,
+    # window size adapts between 1 block and rpc_log_window_max to what the node accepts
+    rpc_rate_limit: float = Field(10, env="RPC_RATE_LIMIT")
+    rpc_max_retries: int = Field(5, env="RPC_MAX_RETRIES")
+    rpc_backoff: float = Field(0.5, env="RPC_BACKOFF")
+    rpc_timeout: float = Field(30, env="RPC_TIMEOUT")
+    rpc_pool_size: int = Field(10, env="RPC_POOL_SIZE")
+    rpc_batch_size: int = Field(10, env="RPC_BATCH_SIZE")
+    rpc_log_window: int = Field(2000, env="RPC_LOG_WINDOW")
+    rpc_log_window_max: int = Field(100000, env="RPC_LOG_WINDOW_MAX")
+
+    # contract processing worker pool; 1 processes contracts one after another in the calling thread
+    process_workers: int = Field(8, env="PROCESS_WORKERS")
+    process_workers_per_chain: int = Field(4, env="PROCESS_WORKERS_PER_CHAIN")
+    process_workers_per_api_key: int = Field(2, env="PROCESS_WORKERS_PER_API_KEY")
+
+    # ingestion pipeline: transactions are written in batches, up to queue_size batches are fetched ahead of writers
+    ingestion_batch_size: int = Field(1000, env="INGESTION_BATCH_SIZE")
+    ingestion_queue_size: int = Field(4, env="INGESTION_QUEUE_SIZE")
+    ingestion_writers: int = Field(1, env="INGESTION_WRITERS")
+
+    # storage profile of transactions: "full" saves every fetched column, "lean" only the ones balances
+    # are computed from, leaving gas, nonce, block hash, transaction index and confirmations empty
+    transaction_storage: str = Field("full", env="TRANSACTION_STORAGE")
+
+    # history of newly added contracts is fetched in block ranges of backfill_range_size, concurrently
+    backfill_enabled: bool = Field(True, env="BACKFILL_ENABLED")
+    backfill_range_size: int = Field(50000, env="BACKFILL_RANGE_SIZE")
+    backfill_workers: int = Field(4, env="BACKFILL_WORKERS")
+
+    # seconds wallet balance lookups are cached for across requests within a process, 0 caches them per request only.
+    # Cached balances of a contract are dropped when its transfers are saved by this process
+    balance_cache_ttl: float = Field(0, env="BALANCE_CACHE_TTL")
+    balance_cache_size: int = Field(10000, env="BALANCE_CACHE_SIZE")
+
+    # wallets whose indexed balance doesn't meet the context requirements are checked against the contract
+    # through rpc_endpoints, so tokens acquired since the last ingestion count. Results are kept for live_balance_ttl
+    live_balance_enabled: bool = Field(False, env="LIVE_BALANCE_ENABLED")
+    live_balance_ttl: float = Field(15, env="LIVE_BALANCE_TTL")
+
+    # processes recovering signatures of bulk verifications of at least signature_pool_threshold signatures;
+    # 1 recovers them in the calling thread
+    signature_workers: int = Field(1, env="SIGNATURE_WORKERS")
+    signature_pool_threshold: int = Field(100, env="SIGNATURE_POOL_THRESHOLD")
+
+    # blocks less than finality_depth blocks deep may still be reorganized; transfers saved in them are checked
+    # against the chain on every run until they are final. Depth is per chain id, finality_depth_default otherwise
+    finality_enabled: bool = Field(True, env="FINALITY_ENABLED")
+    finality_depth: Dict[int, int] = Field({1: 64, 56: 15, 137: 256}, env="FINALITY_DEPTH")
+    finality_depth_default: int = Field(64, env="FINALITY_DEPTH_DEFAULT")
+
     # default chains that always exist
     chains = {
         1: 'Ethereum',
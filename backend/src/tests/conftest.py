@@ -1,6 +1,7 @@
 import asyncio
 import datetime
 import inspect
+import io
 import itertools
 import json
 import os
@@ -15,6 +16,7 @@ import requests
 from freezegun import freeze_time
 from requests import Response
 
+from adapters.blockscan import Blockscan
 from dependencies.user import AuthServiceType
 from models.contract import Contract
 from models.organization import Organization, OrganizationContract
@@ -46,14 +48,11 @@ def database():
 
     # drop all tables
     for table in db.execute_sql("select table_name from information_schema.tables where table_schema='public'"):
-        db.execute_sql(f"DROP TABLE {table[0]} CASCADE")
+        # partitions are dropped along with their parent table
+        db.execute_sql(f"DROP TABLE IF EXISTS \"{table[0]}\" CASCADE")
 
     os.system("pem migrate")
 
-    # execute init.sql (materialized view)
-    with open("init.sql", "r") as f:
-        db.execute_sql(f.read())
-
     # initialize database
     from models.chain import Chain
 
@@ -86,17 +85,39 @@ def mock_settings():
         for k, v in kwargs.items():
             old[k] = getattr(settings, k)
             setattr(settings, k, v)
-        yield
-        for k, v in old.items():
-            setattr(settings, k, v)
+        try:
+            yield
+        finally:
+            for k, v in old.items():
+                setattr(settings, k, v)
 
     return context
 
 
+@pytest.fixture(scope="function", autouse=True)
+def chain_tip():
+    """ Current block of every chain, so tests run with finality checks enabled as configured by default.
+        Blocks up to 936 are final on chains using the default depth of 64 blocks.
+    """
+
+    with patch.object(Blockscan, "get_block_number", return_value=1000) as get_block_number:
+        yield get_block_number
+
+
+@pytest.fixture(scope="function", autouse=True)
+def first_block():
+    """ First block with transfers of every contract, so history of contracts processed for the first time
+        is backfilled as configured by default, in one range up to the chain tip.
+    """
+
+    with patch.object(Blockscan, "get_first_block", return_value=0) as get_first_block:
+        yield get_first_block
+
+
 @pytest.fixture
 def requests_mock() -> Callable:
     """
-    Mocks 'requests.api.request' method to return data from fixtures
+    Mocks 'requests.api.request' and 'requests.Session.request' methods to return data from fixtures
 
     Returns:
         Function that accepts list of fixture names and returns a context manager, that mocks 'httpx.request' method
@@ -184,6 +205,7 @@ def requests_mock() -> Callable:
                 r = Response()
                 r.status_code = fixture["response"]["status"]
                 r._content = json.dumps(fixture["response"]["body"]).encode()
+                r.raw = io.BytesIO(r._content)
                 r.headers = fixture["response"].get("headers", {})
                 return r
 
@@ -195,7 +217,11 @@ def requests_mock() -> Callable:
                 f"headers: {kwargs.get('headers')}"
             )
 
-        with patch.object(requests.api, "request", request):
+        def session_request(session: requests.Session, method: str, url: str, **kwargs: Any):
+            kwargs.pop("timeout", None)
+            return request(method, url, **kwargs)
+
+        with patch.object(requests.api, "request", request), patch.object(requests.Session, "request", session_request):
             yield Mock
 
         assert Mock.all_called(), "Not all fixtures were called"
@@ -1,18 +1,301 @@
+from unittest.mock import patch
+
+import pytest
+import requests
+from eth_abi import encode_abi
+
 from adapters.blockscan import Blockscan
+from adapters.rpc import Rpc, TRANSFER_TOPIC, TRANSFER_SINGLE_TOPIC, TRANSFER_BATCH_TOPIC, BALANCE_OF_SELECTOR, \
+    OWNER_OF_SELECTOR, BALANCE_OF_BATCH_SELECTOR
+from exceptions.exceptions import BlockscanError, BlockscanEmptyResult, RpcError, RpcLimitError
 from models.chain import Chain
+from schemas.blockscan import TransactionBatch
 
 
 class TestBlockscan:
 
-    def test_get_transactions(self, requests_mock, contract_1):
+    @pytest.mark.parametrize("streaming", [True, False])
+    def test_get_transactions(self, requests_mock, mock_settings, contract_1, streaming):
+
+        with mock_settings(blockscan_streaming=streaming), requests_mock("blockscan/transactions"):
+            batches = Blockscan.get_transactions(contract_1)
+
+            assert sum(len(batch) for batch in batches) == 3
+
+    def test_get_transactions_stream_interrupted(self, mock_settings, contract_1):
+
+        items = [
+            {
+                "blockNumber": str(block),
+                "timeStamp": "0",
+                "hash": f"0x{i:064x}",
+                "nonce": "0",
+                "blockHash": f"0x{block:064x}",
+                "from": "0x0000000000000000000000000000000000000001",
+                "to": "0x0000000000000000000000000000000000000002",
+                "value": "1",
+                "transactionIndex": str(i),
+                "gas": "0",
+                "gasPrice": "0",
+                "gasUsed": "0",
+                "cumulativeGasUsed": "0",
+                "input": "deprecated",
+                "confirmations": "0",
+            }
+            for i, block in enumerate([1, 2, 2, 3])
+        ]
+        start_blocks = []
+
+        def request(chain, params, stream=False):
+            start_blocks.append(params['startblock'])
+            result = [item for item in items if int(item['blockNumber']) >= params['startblock']]
+
+            def interrupted():
+                # connection drops after the third transfer
+                yield from result[:3]
+                raise requests.ConnectionError('Connection reset by peer')
+
+            if len(start_blocks) == 1:
+                return interrupted()
+
+            if not result:
+                raise BlockscanEmptyResult('No transactions found')
+
+            return iter(result)
+
+        with mock_settings(ingestion_batch_size=1), patch.object(Blockscan, '_request', side_effect=request):
+            transactions = TransactionBatch.concat(list(Blockscan.get_transactions(contract_1, 1)))
+
+        # block 1 was passed on before the connection dropped, so reading continues from block 2
+        assert start_blocks == [1, 2, 4]
+        assert transactions.block_number == [1, 2, 2, 3]
+
+    @pytest.mark.parametrize("blocks, received", [
+        ([1, 2, 2, 2, 2, 2, 2, 2, 3, 4], 10),  # block 2 fits into result window from both ends
+        ([1, 2, 2, 2, 2, 2, 2, 2, 2, 2, 3], 10),  # one transfer of block 2 is out of reach
+        ([1, 1, 2, 2, 3, 3, 3, 4, 5], 9),
+    ])
+    def test_get_transactions_dense_block(self, contract_1, blocks, received):
+
+        items = [
+            {
+                "blockNumber": str(block),
+                "timeStamp": "0",
+                "hash": f"0x{i:064x}",
+                "nonce": "0",
+                "blockHash": f"0x{block:064x}",
+                "from": "0x0000000000000000000000000000000000000001",
+                "to": "0x0000000000000000000000000000000000000002",
+                "value": "1",
+                "transactionIndex": str(i),
+                "gas": "0",
+                "gasPrice": "0",
+                "gasUsed": "0",
+                "cumulativeGasUsed": "0",
+                "input": "deprecated",
+                "confirmations": "0",
+            }
+            for i, block in enumerate(blocks)
+        ]
+
+        def request(chain, params, stream=False):
+            """ Emulates blockscan API paging, including its result window """
 
-        with requests_mock("blockscan/transactions"):
-            transactions = Blockscan.get_transactions(contract_1)
+            assert params['page'] * params['offset'] <= Blockscan.result_window
 
-            assert len(list(transactions)) == 3
+            end_block = float('inf') if params['endblock'] == 'latest' else params['endblock']
+            result = [item for item in items if params['startblock'] <= int(item['blockNumber']) <= end_block]
+
+            if params['sort'] == 'desc':
+                result.reverse()
+
+            result = result[(params['page'] - 1) * params['offset']:params['page'] * params['offset']]
+
+            if not result:
+                raise BlockscanEmptyResult('No transactions found')
+
+            return result
+
+        with patch.object(Blockscan, 'page_size', 2), patch.object(Blockscan, 'result_window', 4), \
+                patch.object(Blockscan, '_request', side_effect=request):
+            transactions = TransactionBatch.concat(list(Blockscan.get_transactions(contract_1)))
+
+        assert len(transactions) == received
+        assert transactions.block_number == sorted(transactions.block_number)
+        assert len(set(transactions.hash)) == received
+        assert transactions.block_number[-1] == blocks[-1]
+
+    def test_transaction_batch_from_items(self):
+
+        item = {
+            "blockNumber": "2",
+            "timeStamp": "1648262847",
+            "hash": "0x0000000000000000000000000000000000000000000000000000000000000001",
+            "nonce": "1",
+            "blockHash": "0x0000000000000000000000000000000000000000000000000000000000000002",
+            "from": "0x0000000000000000000000000000000000000001",
+            "to": "0x0000000000000000000000000000000000000002",
+            "tokenID": "7",
+            "tokenValue": "3",
+            "transactionIndex": "60",
+            "gas": "380379",
+            "gasPrice": "30052496546",
+            "gasUsed": "253586",
+            "cumulativeGasUsed": "10750072",
+            "input": "deprecated",
+            "confirmations": "12214889",
+        }
+
+        batch = TransactionBatch.from_items([item, {**item, "tokenID": "8", "logIndex": "5"}])
+
+        assert len(batch) == 2
+        assert batch.block_number == [2, 2]
+        assert batch.index == [60, 60]
+        assert batch.value == [3, 3]
+        assert batch.token_id == [7, 8]
+        assert batch.log_index == [None, 5]
+        assert batch.slice(1, 2).token_id == [8]
+        assert list(batch.rows(("block_number", "token_id"))) == [(2, 7), (2, 8)]
+
+        with pytest.raises(ValueError):
+            TransactionBatch.from_items([{**item, "gas": "lots"}])
 
     def test_get_info(self, requests_mock):
 
         with requests_mock("blockscan/tokeninfo"):
             info = Blockscan.get_info("0xdAC17F958D2ee523a2206206994597C13D831ec7", Chain.get_by_id(1))
             assert info.name == "Tether USD"
+
+    def test_get_info_retries_rate_limited(self, requests_mock, mock_settings):
+
+        with mock_settings(blockscan_backoff=0), \
+                requests_mock("blockscan/tokeninfo_rate_limited", "blockscan/tokeninfo"):
+            info = Blockscan.get_info("0xdAC17F958D2ee523a2206206994597C13D831ec7", Chain.get_by_id(1))
+            assert info.name == "Tether USD"
+
+    def test_get_info_error(self, requests_mock):
+
+        with requests_mock("blockscan/tokeninfo_invalid_key"):
+            with pytest.raises(BlockscanError, match="Invalid API Key"):
+                Blockscan.get_info("0xdAC17F958D2ee523a2206206994597C13D831ec7", Chain.get_by_id(1))
+
+
+def topic(value: int) -> str:
+    return f"0x{value:064x}"
+
+
+def log(block: int, log_index: int, topics: list, words: list) -> dict:
+    return {
+        "blockNumber": hex(block),
+        "blockHash": topic(block),
+        "blockTimestamp": hex(1648262847 + block),
+        "transactionHash": topic(block * 1000 + log_index),
+        "transactionIndex": hex(log_index),
+        "logIndex": hex(log_index),
+        "topics": topics,
+        "data": "0x" + "".join(f"{word:064x}" for word in words),
+        "removed": False,
+    }
+
+
+class TestRpc:
+
+    def test_decode_logs(self, contract_2):
+
+        logs = [
+            # TransferBatch(operator, from, to, ids=[7, 8], values=[1, 2])
+            log(5, 1, [TRANSFER_BATCH_TOPIC, topic(9), topic(1), topic(2)], [64, 160, 2, 7, 8, 2, 1, 2]),
+            # TransferSingle(operator, from, to, id=7, value=3)
+            log(5, 0, [TRANSFER_SINGLE_TOPIC, topic(9), topic(2), topic(3)], [7, 3]),
+            # ERC721 Transfer(from, to, tokenId=4)
+            log(6, 0, [TRANSFER_TOPIC, topic(3), topic(4), topic(4)], []),
+            # ERC20 Transfer(from, to, value=10)
+            log(6, 1, [TRANSFER_TOPIC, topic(4), topic(5)], [10]),
+            {**log(6, 2, [TRANSFER_TOPIC, topic(4), topic(5)], [10]), "removed": True},
+        ]
+
+        batch = Rpc._decode_logs(contract_2, logs, tip=10)
+
+        assert batch.block_number == [5, 5, 5, 6, 6]
+        assert batch.log_index == [0, 1, 1, 0, 1]
+        assert batch.token_id == [7, 7, 8, 4, None]
+        assert batch.value == [3, 1, 2, None, 10]
+        assert batch.from_address == [f"0x{2:040x}", f"0x{1:040x}", f"0x{1:040x}", f"0x{3:040x}", f"0x{4:040x}"]
+        assert batch.to_address[0] == f"0x{3:040x}"
+        assert batch.timestamp[0] == 1648262852
+        assert batch.confirmations == [5, 5, 5, 4, 4]
+        assert batch.gas == [None] * 5
+
+    def test_get_transactions_shrinks_window(self, mock_settings, contract_1):
+
+        requested = []
+
+        def batch(chain, calls):
+            results = []
+            for method, params in calls:
+                if method == "eth_blockNumber":
+                    results.append(hex(99))
+                    continue
+
+                first, last = int(params[0]["fromBlock"], 16), int(params[0]["toBlock"], 16)
+                requested.append((first, last))
+
+                if last - first >= 15:
+                    results.append(RpcLimitError("query returned more than 10000 results"))
+                else:
+                    results.append([
+                        log(block, 0, [TRANSFER_TOPIC, topic(1), topic(2)], [1]) for block in range(first, last + 1)
+                    ])
+            return results
+
+        with mock_settings(rpc_log_window=10, rpc_log_window_max=40, rpc_batch_size=3), \
+                patch.object(Rpc, "_batch", side_effect=batch):
+            transactions = TransactionBatch.concat(list(Rpc.get_transactions(contract_1, 0)))
+
+        assert transactions.block_number == list(range(100))
+        # window grows after a full batch, the refused one is halved and the next batch starts from it
+        assert requested[:7] == [(0, 9), (10, 19), (20, 29), (30, 49), (50, 69), (70, 89), (30, 39)]
+
+    def test_get_transactions_single_block_over_limit(self, mock_settings, contract_1):
+
+        def batch(chain, calls):
+            if calls[0][0] == "eth_blockNumber":
+                return [hex(0)]
+            return [RpcLimitError("response size exceeded")]
+
+        with patch.object(Rpc, "_batch", side_effect=batch):
+            with pytest.raises(RpcLimitError):
+                list(Rpc.get_transactions(contract_1, 0))
+
+    def test_get_balances_erc1155(self, contract_2):
+
+        wallet = f"0x{16:040x}"
+        calls = []
+
+        def batch(chain, batch_calls):
+            calls.extend(batch_calls)
+            return ["0x" + encode_abi(["uint256[]"], [[4, 0]]).hex()]
+
+        with patch.object(Rpc, "_batch", side_effect=batch):
+            balances = Rpc.get_balances(contract_2, wallet, [3, 1, 3])
+
+        assert balances == [(1, 4), (3, 0)]
+
+        (method, (call, block)), = calls
+        assert (method, call["to"], block) == ("eth_call", contract_2.address, "latest")
+        assert call["data"] == BALANCE_OF_BATCH_SELECTOR + encode_abi(
+            ["address[]", "uint256[]"], [[wallet, wallet], [1, 3]]
+        ).hex()
+
+    def test_get_balances_erc721(self, contract_1):
+
+        contract_1.erc_standard = 721
+        wallet = f"0x{16:040x}"
+
+        def batch(chain, calls):
+            assert [call["data"][:10] for _, (call, _) in calls] == [BALANCE_OF_SELECTOR] + [OWNER_OF_SELECTOR] * 3
+            # token 5 is owned by someone else, token 6 doesn't exist
+            return [topic(3), topic(16), topic(17), RpcError("execution reverted")]
+
+        with patch.object(Rpc, "_batch", side_effect=batch):
+            assert Rpc.get_balances(contract_1, wallet, [4, 5, 6]) == [(4, 1), (None, 2)]
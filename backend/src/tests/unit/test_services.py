@@ -1,4 +1,8 @@
 import datetime
+import itertools
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import patch
 
 import pytest
@@ -7,13 +11,22 @@ from freezegun import freeze_time
 
 from adapters.blockscan import Blockscan
 from database import db
-from exceptions.exceptions import ApiError
+from exceptions.exceptions import ApiError, RpcError
+from models.backfill import BackfillRange
 from models.balance import Balance
+from models.checkpoint import IngestionCheckpoint, UnfinalizedBlock
 from models.contract import Contract
+from models.organization import OrganizationContract
 from models.profile import Profile
+from models.revocation import RevocationEpoch
 from models.transaction import Transaction
 from models.wallet import Wallet
-from schemas.blockscan import BlockScanTransaction
+from schemas.blockscan import BlockScanTransaction, TransactionBatch
+from schemas.ingestion import IngestionMetrics
+from schemas.verification import VerificationRequest
+from services.pipeline import run_pipeline
+from services.signature import PythonBackend, get_backends, recover_address, recover_addresses
+from services.user import UserServiceType
 from services.verification import VerificationService
 from tests.conftest import user_service_of
 
@@ -58,6 +71,65 @@ class TestVerification:
 
             assert not Wallet.select().where(Wallet.address == "0x0d846e45dbf44203cbc540dca4b9c2f646c52cd2").exists()
 
+    def test_recover_address(self):
+        message = "Please sign this message to verify your address: " \
+                  "3438041c16b80630e2caca34975b150d627ce0596ae87252cfb26cffa94db8af.1674728600"
+        signature = "0x7222f70f3778efe4e3b47fde37fc0c89a08bee60e870cda5a50aa94e31052a88" \
+                    "0ead5e189ac665688b62e0074115fe165f54795e78c074514af848ee623ffce11b"
+
+        for backend in get_backends():
+            assert recover_address(message, signature, backend) == "0x0d846e45dbf44203cbc540dca4b9c2f646c52cd1"
+
+        # v as recovery id instead of 27/28
+        assert recover_address(message, signature[:-2] + "00", PythonBackend) == \
+               "0x0d846e45dbf44203cbc540dca4b9c2f646c52cd1"
+
+        assert recover_address(message, "0x1234") is None
+        assert recover_address(message, "not hex") is None
+        assert recover_address(message, "0x" + "00" * 65) is None
+        assert recover_address(message, signature[:-2] + "1d") is None
+
+    def test_recover_addresses(self, mock_settings):
+        message = "Please sign this message to verify your address: " \
+                  "3438041c16b80630e2caca34975b150d627ce0596ae87252cfb26cffa94db8af.1674728600"
+        signature = "0x7222f70f3778efe4e3b47fde37fc0c89a08bee60e870cda5a50aa94e31052a88" \
+                    "0ead5e189ac665688b62e0074115fe165f54795e78c074514af848ee623ffce11b"
+        items = [(message, signature), (message, "0x1234"), (message, "0x" + "00" * 65), (message, signature)] * 3
+        addresses = ["0x0d846e45dbf44203cbc540dca4b9c2f646c52cd1", None, None,
+                     "0x0d846e45dbf44203cbc540dca4b9c2f646c52cd1"] * 3
+
+        for backend in get_backends():
+            assert recover_addresses(items, backend) == addresses
+
+            # split across processes, in order
+            with mock_settings(signature_workers=2, signature_pool_threshold=1):
+                assert recover_addresses(items, backend) == addresses
+
+    def test_verify_many(self):
+        address = "0x0d846e45dbf44203cbc540dca4b9c2f646c52cd1"
+        message = "Please sign this message to verify your address: " \
+                  "3438041c16b80630e2caca34975b150d627ce0596ae87252cfb26cffa94db8af.1674728600"
+        signature = "0x7222f70f3778efe4e3b47fde37fc0c89a08bee60e870cda5a50aa94e31052a88" \
+                    "0ead5e189ac665688b62e0074115fe165f54795e78c074514af848ee623ffce11b"
+
+        requests = [
+            VerificationRequest(wallet_address=address, signature=signature, message=message),
+            # message of another wallet
+            VerificationRequest(wallet_address=address[:-1] + "2", signature=signature, message=message),
+            # signed by another wallet
+            VerificationRequest(wallet_address=address, signature=signature[:-2] + "1c", message=message),
+            VerificationRequest(wallet_address=address, signature="0x", message=message),
+            VerificationRequest(wallet_address=address, signature=signature, message="Invalid"),
+        ]
+
+        with freeze_time(datetime.datetime.fromtimestamp(1674728300, tz=pytz.UTC)):
+            assert VerificationService.verify_many(requests) == [True, False, False, False, False]
+
+        with freeze_time(datetime.datetime.fromtimestamp(1674728700, tz=pytz.UTC)):
+            assert VerificationService.verify_many(requests[:1]) == [False]
+
+        assert not Wallet.select().exists()
+
     def test_create_jwt(self):
         with freeze_time(datetime.datetime.fromtimestamp(0, tz=pytz.utc)):
             jwt = VerificationService.create_jwt("0x0000000000000000000000000000000000000000")
@@ -124,11 +196,15 @@ class TestContractService:
         ]
 
         with patch.object(Blockscan, 'get_transactions') as p:
-            p.return_value = return_value
+            p.return_value = [TransactionBatch.from_transactions(return_value)]
             from services.contract import process_contract
             process_contract(contract_20)
 
-        db.execute_sql('refresh materialized view concurrently "public"."wallet_balances";')
+        # history up to the chain tip is backfilled first, followed by incremental fetch
+        assert [(r.start_block, r.end_block, r.status) for r in contract_20.backfill_ranges] == [
+            (0, 1000, BackfillRange.Status.DONE),
+        ]
+        assert [c[0][1] for c in p.call_args_list] == [0, 1001]
 
         assert Balance.select().where(
             Balance.contract == contract_20,
@@ -203,12 +279,10 @@ class TestContractService:
         ]
 
         with patch.object(Blockscan, 'get_transactions') as p:
-            p.return_value = return_value
+            p.return_value = [TransactionBatch.from_transactions(return_value)]
             from services.contract import process_contract
             process_contract(contract_1155)
 
-        db.execute_sql('refresh materialized view concurrently "public"."wallet_balances";')
-
         assert Balance.select().where(
             Balance.contract == contract_1155,
             Balance.address == "0x0000000000000000000000000000000000000001",
@@ -230,6 +304,579 @@ class TestContractService:
             Balance.token_id == 1,
         ).exists()
 
+    @pytest.mark.parametrize("workers", [1, 4])
+    def test_process_contracts_isolates_failures(self, mock_settings, workers):
+
+        contracts = [
+            Contract.create(
+                address=f"0x{i:040x}",
+                token_name=f"TEST {i}",
+                erc_standard=20,
+                holders=0,
+                chain=chain,
+                decimals=18
+            )
+            for i, chain in enumerate([1, 1, 56, 137], start=1)
+        ]
+
+        def process(contract):
+            if contract.id == contracts[1].id:
+                raise ValueError('Blockscan is down')
+            return IngestionMetrics(received=contract.id)
+
+        from services.contract import process_contracts
+
+        with mock_settings(process_workers=workers), patch('services.contract.process_contract', side_effect=process):
+            results = process_contracts(contracts)
+
+        assert [result.contract_id for result in results] == [contract.id for contract in contracts]
+        assert [result.success for result in results] == [True, False, True, True]
+        assert results[1].error == 'Blockscan is down'
+        assert results[2].metrics.received == contracts[2].id
+
+    def test_process_contract_backfill(self, mock_settings):
+
+        contract_20 = Contract.create(
+            address="0x0000000000000000000000000000000000000000",
+            token_name="TEST",
+            erc_standard=20,
+            holders=0,
+            chain=1,
+            decimals=18
+        )
+
+        def get_transactions(contract, start_block=None, end_block=None):
+            if start_block == 60:
+                raise ValueError('Blockscan is down')
+            return [TransactionBatch.from_transactions(
+                BlockScanTransaction.construct(
+                    block_number=block_number,
+                    timestamp=0,
+                    hash=f"0x{block_number:064x}",
+                    nonce=0,
+                    block_hash="0x0000000000000000000000000000000000000000000000000000000000000000",
+                    transaction_index=0,
+                    index=0,
+                    from_address="0x0000000000000000000000000000000000000001",
+                    to_address="0x0000000000000000000000000000000000000002",
+                    value=1,
+                    token_value=0,
+                    gas=0,
+                    gas_price=0,
+                    gas_used=0,
+                    cumulative_gas_used=0,
+                    input="",
+                    token_id=None,
+                    confirmations=0
+                )
+                for block_number in [start_block, end_block]
+            )]
+
+        from services.contract import process_contract
+
+        # every block is final, reorgs are covered by test_process_contract_rolls_back_reorganized_blocks
+        with mock_settings(backfill_range_size=50, backfill_workers=1, finality_depth={1: 0}), \
+                patch.object(Blockscan, 'get_first_block', return_value=10), \
+                patch.object(Blockscan, 'get_block_number', return_value=120), \
+                patch.object(Blockscan, 'get_transactions', side_effect=get_transactions) as p:
+
+            with pytest.raises(ValueError, match='Blockscan is down'):
+                process_contract(contract_20)
+
+            # incremental fetch does not run while history has a gap
+            assert p.call_count == 3
+
+            assert [
+                (r.start_block, r.end_block, r.status, r.transactions)
+                for r in contract_20.backfill_ranges.order_by(BackfillRange.start_block)
+            ] == [
+                (10, 59, BackfillRange.Status.DONE, 2),
+                (60, 109, BackfillRange.Status.PENDING, 0),
+                (110, 120, BackfillRange.Status.DONE, 2),
+            ]
+
+            assert Transaction.select().where(Transaction.contract == contract_20).count() == 4
+
+            p.side_effect = lambda contract, start_block=None, end_block=None: (
+                get_transactions(contract, start_block + 1, end_block) if start_block == 60 else []
+            )
+            process_contract(contract_20)
+
+            # only the failed range is fetched again, followed by incremental fetch
+            assert p.call_count == 5
+            assert not BackfillRange.get_pending(contract_20)
+            assert Transaction.select().where(Transaction.contract == contract_20).count() == 6
+
+    def test_backfill_range_resumes_from_position(self, contract_1, mock_settings):
+
+        transfers = [transfer(10), transfer(11, 0), transfer(11, 1), transfer(11, 2), transfer(12)]
+
+        def interrupted(contract, start_block=None, end_block=None):
+            yield TransactionBatch.from_transactions(transfers[:3])
+            raise ValueError('Blockscan is down')
+
+        BackfillRange.create(contract=contract_1, start_block=10, end_block=19, block=9)
+
+        from services.backfill import run_backfill
+
+        with mock_settings(ingestion_batch_size=2, backfill_workers=1), \
+                patch.object(Blockscan, 'get_transactions', side_effect=interrupted) as p:
+
+            with pytest.raises(ValueError, match='Blockscan is down'):
+                run_backfill(contract_1)
+
+            # bulks saved before the error are kept, along with the position they reached
+            backfill_range = BackfillRange.get(contract=contract_1)
+            assert (backfill_range.status, backfill_range.block, backfill_range.cursor) == (
+                BackfillRange.Status.PENDING, 10, 1,
+            )
+
+            p.side_effect = lambda contract, start_block=None, end_block=None: iter([
+                TransactionBatch.from_transactions(transfers[1:])
+            ])
+            run_backfill(contract_1)
+
+        p.assert_called_with(contract_1, 11, 19)
+        assert BackfillRange.get(contract=contract_1).status == BackfillRange.Status.DONE
+        assert Transaction.select().where(Transaction.contract == contract_1).count() == 5
+
+    def test_backfill_ranges_write_concurrently(self, mock_settings):
+
+        first, second = "0x0000000000000000000000000000000000000001", "0x0000000000000000000000000000000000000002"
+
+        def mint(block_number, to_address):
+            minted = transfer(block_number, from_address="0x0000000000000000000000000000000000000000")
+            minted.to_address = to_address
+            return minted
+
+        # ranges mint to the same wallets in opposite order
+        mints = {10: [mint(10, first), mint(11, second)], 20: [mint(20, second), mint(21, first)]}
+
+        def setup():
+            contract = Contract.create(
+                address="0x00000000000000000000000000000000000000cc",
+                token_name="TEST",
+                erc_standard=20,
+                holders=0,
+                chain=1,
+                decimals=0,
+            )
+            BackfillRange.insert_many([
+                {
+                    'contract': contract,
+                    'start_block': start_block,
+                    'end_block': start_block + 9,
+                    'block': start_block - 1,
+                }
+                for start_block in mints
+            ]).execute()
+            return contract
+
+        def teardown(contract):
+            Transaction.delete().where(Transaction.for_contract(contract)).execute()
+            db.execute_sql('DELETE FROM "wallet_balances" WHERE "contract_id" = %s', (contract.id,))
+            db.execute_sql('DELETE FROM "wallet_holdings" WHERE "contract_id" = %s', (contract.id,))
+            BackfillRange.delete().where(BackfillRange.contract == contract).execute()
+            Contract.delete_by_id(contract.id)
+
+        # every range writes one bulk, then waits for the other to write its own before writing the next one
+        barrier = threading.Barrier(2, timeout=10)
+
+        def save(*args, **kwargs):
+            metrics = save_transactions(*args, **kwargs)
+            barrier.wait()
+            return metrics
+
+        from services.backfill import run_backfill
+        from services.contract import save_transactions
+
+        # ranges write through connections of their own, so the contract is committed outside of the test transaction
+        contract = run_committed(setup)
+
+        try:
+            with mock_settings(ingestion_batch_size=1, backfill_workers=2), \
+                    patch('services.contract.save_transactions', side_effect=save), \
+                    patch.object(Blockscan, 'get_transactions', side_effect=lambda contract, start_block, end_block: [
+                        TransactionBatch.from_transactions(mints[start_block])
+                    ]):
+                metrics = run_backfill(contract)
+
+            assert metrics.inserted == 4
+            assert not BackfillRange.get_pending(contract)
+            assert sorted((b.address, b.balance) for b in Balance.select().where(Balance.contract == contract)) == [
+                (first, 2), (second, 2),
+            ]
+            assert Contract.get_by_id(contract.id).holders == 2
+        finally:
+            run_committed(lambda: teardown(contract))
+
+    def test_bulk_load_rejects_invalid_rows(self, contract_1):
+
+        row = (
+            1, 0, "0x" + "0" * 64, 0, "0x" + "0" * 64, 0, 0,
+            "0x0000000000000000000000000000000000000001", "0x0000000000000000000000000000000000000002",
+            1, 0, 0, 0, 0, None, 0
+        )
+        invalid_row = row[:7] + ("0xinvalid",) + row[8:]
+
+        inserted, rejected = Transaction.bulk_load(contract_1, [row, invalid_row])
+
+        assert (inserted, rejected) == (1, 1)
+        assert Transaction.get(Transaction.contract == contract_1).timestamp == datetime.datetime.fromtimestamp(
+            0, tz=pytz.UTC
+        )
+
+    def test_addresses_and_hashes_are_stored_as_bytes(self, contract_1):
+
+        Transaction.bulk_load(contract_1, [(
+            1, 0, "0x" + "AB" * 32, 0, "0x" + "0" * 64, 0, 0,
+            "0x0000000000000000000000000000000000000001", "0x0000000000000000000000000000000000000002",
+            1, 0, 0, 0, 0, None, 0
+        )])
+
+        assert db.execute_sql(
+            'SELECT octet_length("hash"), octet_length("from_address") FROM "transaction" WHERE "contract_id" = %s',
+            (contract_1.id,)
+        ).fetchone() == (32, 20)
+        assert Transaction.get(Transaction.hash == "0x" + "ab" * 32).hash == "0x" + "ab" * 32
+        assert Contract.get(Contract.address == contract_1.address.upper().replace("0X", "0x")) == contract_1
+
+    def test_save_transactions_metrics(self, contract_1):
+
+        from services.contract import save_transactions
+
+        metrics = save_transactions(TransactionBatch.from_transactions([transfer(1), transfer(2)]), contract_1)
+
+        assert metrics == IngestionMetrics(batches=1, received=2, inserted=2)
+
+        metrics = save_transactions(TransactionBatch.from_transactions(
+            [transfer(2), transfer(3), transfer(4, from_address="0xinvalid")]
+        ), contract_1)
+
+        assert metrics == IngestionMetrics(batches=1, received=3, inserted=1, duplicates=1, rejected=1)
+        assert metrics + metrics == IngestionMetrics(batches=2, received=6, inserted=2, duplicates=2, rejected=2)
+
+    def test_save_transactions_lean_storage(self, contract_1, mock_settings):
+
+        from services.contract import save_transactions
+
+        with mock_settings(transaction_storage=Transaction.Storage.LEAN):
+            metrics = save_transactions(TransactionBatch.from_transactions([transfer(1), transfer(2)]), contract_1)
+
+        assert metrics == IngestionMetrics(batches=1, received=2, inserted=2)
+
+        saved = Transaction.select().where(Transaction.contract == contract_1).order_by(Transaction.block_number)
+        assert [(t.block_number, t.log_index, t.value, t.from_address) for t in saved] == [
+            (1, 0, 1, "0x0000000000000000000000000000000000000001"),
+            (2, 0, 1, "0x0000000000000000000000000000000000000001"),
+        ]
+        assert {(t.nonce, t.block_hash, t.index, t.gas, t.confirmations) for t in saved} == {(None,) * 5}
+
+    def test_balances_follow_transactions(self, contract_1):
+
+        from services.contract import save_transactions
+
+        def balances():
+            return {
+                (b.address[-1], b.balance) for b in Balance.select(Balance.address, Balance.balance).where(
+                    Balance.contract == contract_1
+                )
+            }
+
+        batch = TransactionBatch.from_transactions([
+            transfer(1), transfer(2, from_address="0x0000000000000000000000000000000000000003"), transfer(3),
+        ])
+        save_transactions(batch, contract_1)
+        save_transactions(batch, contract_1)
+
+        assert balances() == {("1", -2), ("2", 3), ("3", -1)}
+
+        Transaction.delete().where(Transaction.for_contract(contract_1), Transaction.block_number >= 2).execute()
+        assert balances() == {("1", -1), ("2", 1), ("3", 0)}
+
+        Balance.rebuild(contract_1)
+        assert balances() == {("1", -1), ("2", 1)}
+
+    def test_holders_follow_balances(self, contract_2):
+
+        from services.contract import save_transactions
+
+        def holders():
+            return Contract.get_by_id(contract_2.id).holders
+
+        def send(block_number, token_id, from_address, to_address):
+            item = transfer(block_number, from_address=from_address)
+            item.to_address, item.token_id = to_address, token_id
+            return item
+
+        zero, first, second = (f"0x{i:040x}" for i in (0, 1, 2))
+
+        # two tokens minted to the first wallet, it holds them both
+        save_transactions(TransactionBatch.from_transactions([
+            send(1, 1, zero, first), send(2, 2, zero, first),
+        ]), contract_2)
+        assert holders() == 1
+
+        # one token passed on, both wallets hold one
+        save_transactions(TransactionBatch.from_transactions([send(3, 1, first, second)]), contract_2)
+        assert holders() == 2
+
+        # the first wallet gives away its last token
+        save_transactions(TransactionBatch.from_transactions([send(4, 2, first, second)]), contract_2)
+        assert holders() == 1
+
+        Transaction.delete().where(Transaction.for_contract(contract_2), Transaction.block_number >= 3).execute()
+        assert holders() == 1
+
+        Balance.rebuild(contract_2)
+        assert holders() == 1
+        assert [(bytes(address), tokens) for address, tokens in db.execute_sql(
+            'SELECT "address", "tokens" FROM "wallet_holdings" WHERE "contract_id" = %s', (contract_2.id,)
+        )] == [(bytes.fromhex(first[2:]), 2)]
+
+    def test_holders_with_concurrent_writers(self):
+
+        # the zero address mints and burns
+        wallets = [f"0x{i:040x}" for i in range(9)]
+
+        def send(block_number, index, from_address, to_address):
+            sent = transfer(block_number, index, from_address=from_address)
+            sent.to_address = to_address
+            return sent
+
+        def setup():
+            return Contract.create(
+                address="0x00000000000000000000000000000000000000cd",
+                token_name="TEST",
+                erc_standard=20,
+                holders=0,
+                chain=1,
+                decimals=0,
+            )
+
+        def teardown(contract):
+            Transaction.delete().where(Transaction.for_contract(contract)).execute()
+            db.execute_sql('DELETE FROM "wallet_balances" WHERE "contract_id" = %s', (contract.id,))
+            db.execute_sql('DELETE FROM "wallet_holdings" WHERE "contract_id" = %s', (contract.id,))
+            Contract.delete_by_id(contract.id)
+
+        from services.contract import save_transactions
+
+        contract = run_committed(setup)
+
+        def write(writer):
+            # bulks of every writer move single tokens between the same wallets, crossing zero all the time
+            generator = random.Random(writer)
+
+            with db.connection_context():
+                for bulk in range(20):
+                    block_number = writer * 1000 + bulk
+                    save_transactions(TransactionBatch.from_transactions([
+                        send(block_number, index, *generator.sample(wallets, 2))
+                        for index in range(4)
+                    ]), contract)
+
+        try:
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                list(pool.map(write, range(4)))
+
+            holders = Balance.select().where(Balance.contract == contract, Balance.balance > 0).count()
+            assert Contract.get_by_id(contract.id).holders == holders
+        finally:
+            run_committed(lambda: teardown(contract))
+
+    def test_ingest_transactions_is_idempotent(self, contract_1):
+
+        def transfers():
+            # two transfers in one transaction, without log index
+            first, second = transfer(5), transfer(5, from_address="0x0000000000000000000000000000000000000003")
+            first.log_index = second.log_index = None
+            return [TransactionBatch.from_transactions([first, second, transfer(6)])]
+
+        from services.contract import ingest_transactions
+
+        assert ingest_transactions(contract_1, transfers()).inserted == 3
+        assert ingest_transactions(contract_1, transfers()) == IngestionMetrics(batches=1, received=3, duplicates=3)
+
+        assert [t.log_index for t in Transaction.select().where(
+            Transaction.contract == contract_1
+        ).order_by(Transaction.id)] == [0, 1, 0]
+
+    def test_process_contract_resumes_from_checkpoint(self, contract_1, mock_settings, first_block):
+
+        # contract without history, nothing to backfill
+        first_block.return_value = None
+        transfers = [transfer(5, 0), transfer(5, 1), transfer(5, 2), transfer(6), transfer(7)]
+
+        def interrupted(contract, start_block=None, end_block=None):
+            yield TransactionBatch.from_transactions(transfers[:3])
+            raise ValueError('Blockscan is down')
+
+        from services.contract import process_contract
+
+        with mock_settings(ingestion_batch_size=2), \
+                patch.object(Blockscan, 'get_transactions', side_effect=interrupted) as p:
+
+            with pytest.raises(ValueError, match='Blockscan is down'):
+                process_contract(contract_1)
+
+            # first bulk ends inside block 5
+            assert IngestionCheckpoint.get_for(contract_1).position == (4, 2)
+
+            p.side_effect = lambda contract, start_block=None, end_block=None: iter([
+                TransactionBatch.from_transactions(transfers),
+            ])
+            metrics = process_contract(contract_1)
+
+        p.assert_called_with(contract_1, 5)
+        assert metrics == IngestionMetrics(batches=2, received=3, inserted=3)
+        assert IngestionCheckpoint.get_for(contract_1).position == (7, 0)
+        assert Transaction.select().where(Transaction.contract == contract_1).count() == 5
+
+    def test_switch_source_refetches_partial_block(self, contract_1, mock_settings, first_block):
+
+        # contract without history, nothing to backfill
+        first_block.return_value = None
+        transfers = [transfer(4), transfer(5, 0), transfer(5, 1), transfer(5, 2)]
+
+        def interrupted(contract, start_block=None, end_block=None):
+            yield TransactionBatch.from_transactions(transfers)
+            raise ValueError('Blockscan is down')
+
+        from services.contract import switch_source, process_contract
+
+        with mock_settings(ingestion_batch_size=2), \
+                patch.object(Blockscan, 'get_transactions', side_effect=interrupted):
+            with pytest.raises(ValueError, match='Blockscan is down'):
+                process_contract(contract_1)
+
+        assert IngestionCheckpoint.get_for(contract_1).position == (4, 1)
+
+        switch_source(contract_1, Contract.Source.RPC)
+
+        assert Contract.get_by_id(contract_1.id).source == Contract.Source.RPC
+        assert IngestionCheckpoint.get_for(contract_1).position == (4, 0)
+        assert [t.block_number for t in Transaction.select().where(Transaction.contract == contract_1)] == [4]
+
+        # checkpoint at a block boundary has nothing to refetch
+        switch_source(contract_1, Contract.Source.BLOCKSCAN)
+        assert IngestionCheckpoint.get_for(contract_1).position == (4, 0)
+        assert Transaction.select().where(Transaction.contract == contract_1).count() == 1
+
+    def test_process_contract_rolls_back_reorganized_blocks(self, contract_1, mock_settings):
+
+        def block(block_number, fork=0):
+            item = transfer(block_number)
+            item.block_hash = f"0x{fork:032x}{block_number:032x}"
+            return item
+
+        chain = {85: block(85), 95: block(95), 96: block(96)}
+
+        def get_transactions(contract, start_block=None, end_block=None):
+            return [TransactionBatch.from_transactions([
+                item for number, item in sorted(chain.items())
+                if number >= start_block and (end_block is None or number <= end_block)
+            ])]
+
+        from services.contract import process_contract
+
+        def tracked():
+            return [(b.block_number, b.block_hash[-2:]) for b in contract_1.unfinalized_blocks.order_by(
+                UnfinalizedBlock.block_number
+            )]
+
+        with mock_settings(finality_enabled=True, finality_depth={1: 10}), \
+                patch.object(Blockscan, 'get_block_number', return_value=100) as tip, \
+                patch.object(Blockscan, 'get_transactions', side_effect=get_transactions) as p:
+
+            process_contract(contract_1)
+            assert tracked() == [(95, '5f'), (96, '60')]
+
+            # block 96 is replaced by a fork with another transfer, block 97 follows
+            chain[96], chain[97] = block(96, fork=1), block(97, fork=1)
+            tip.return_value = 102
+            process_contract(contract_1)
+
+            assert p.call_args_list[-2][0] == (contract_1, 95, 96)
+            assert p.call_args_list[-1][0] == (contract_1, 96)
+            assert tracked() == [(95, '5f'), (96, '60'), (97, '61')]
+            assert UnfinalizedBlock.get(block_number=96).block_hash == f"0x{1:032x}{96:032x}"
+            assert [t.block_hash for t in Transaction.select().where(
+                Transaction.contract == contract_1, Transaction.block_number == 96
+            )] == [f"0x{1:032x}{96:032x}"]
+
+            # all tracked blocks are final now, they are checked once more and not fetched again
+            tip.return_value = 120
+            process_contract(contract_1)
+
+            assert p.call_args_list[-2][0] == (contract_1, 95, 97)
+            assert tracked() == []
+            assert Transaction.select().where(Transaction.contract == contract_1).count() == 4
+
+
+def run_committed(function):
+    """ Run function in another thread with a database connection of its own, outside of the test transaction """
+    def run():
+        with db.connection_context():
+            return function()
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(run).result()
+
+
+def transfer(block_number, index=0, from_address="0x0000000000000000000000000000000000000001"):
+    return BlockScanTransaction.construct(
+        block_number=block_number,
+        timestamp=0,
+        hash=f"0x{block_number:032x}{index:032x}",
+        nonce=0,
+        block_hash="0x0000000000000000000000000000000000000000000000000000000000000000",
+        transaction_index=index,
+        log_index=index,
+        from_address=from_address,
+        to_address="0x0000000000000000000000000000000000000002",
+        value=1,
+        gas=0,
+        gas_price=0,
+        gas_used=0,
+        cumulative_gas_used=0,
+        token_id=None,
+        confirmations=0
+    )
+
+
+class TestPipeline:
+
+    @pytest.mark.parametrize("workers", [1, 3])
+    def test_run_pipeline(self, workers):
+        consumed = []
+
+        run_pipeline(range(100), consumed.append, queue_size=2, workers=workers)
+
+        assert sorted(consumed) == list(range(100))
+
+    def test_run_pipeline_producer_error(self):
+        consumed = []
+
+        def produce():
+            yield 1
+            raise ValueError('Fetch failed')
+
+        with pytest.raises(ValueError, match='Fetch failed'):
+            run_pipeline(produce(), consumed.append)
+
+        assert consumed == [1]
+
+    @pytest.mark.parametrize("workers", [1, 3])
+    def test_run_pipeline_consumer_error(self, workers):
+
+        def consume(item):
+            if item == 5:
+                raise ValueError('Write failed')
+
+        with pytest.raises(ValueError, match='Write failed'):
+            run_pipeline(itertools.count(), consume, queue_size=2, workers=workers)
+
 
 class TestUserService:
 
@@ -403,8 +1050,6 @@ class TestUserService:
             token_id=4
         )
 
-        db.execute_sql('refresh materialized view concurrently "public"."wallet_balances";')
-
         assert user_service.get_balance(context_2, only_relevant=True) == 6
         assert user_service.get_balance(context_2) == 11
 
@@ -448,7 +1093,7 @@ class TestUserService:
     )
     @freeze_time(datetime.datetime.fromtimestamp(0, tz=pytz.UTC))
     def test_has_required_tokens(self, context_2, user_service, transactions, expected):
-        for from_, to, value, token_id in transactions:
+        for log_index, (from_, to, value, token_id) in enumerate(transactions):
             Transaction.create(
                 contract=context_2.contract,
                 from_address=from_,
@@ -464,11 +1109,261 @@ class TestUserService:
                 hash="0x0000000000000000000000000000000000000000000000000000000000000000",
                 block_hash="0x0000000000000000000000000000000000000000000000000000000000000000",
                 index=0,
+                log_index=log_index,
                 chain=1,
                 confirmations=1,
                 token_id=token_id
             )
 
-        db.execute_sql('refresh materialized view concurrently "public"."wallet_balances";')
-
         assert user_service.has_required_tokens(context_2) is expected
+
+    @freeze_time(datetime.datetime.fromtimestamp(0, tz=pytz.UTC))
+    def test_snapshot_balances(self, context_2, user_service):
+
+        from services.contract import save_transactions
+        from services.snapshot import take_snapshot
+
+        def send(block_number, token_id, value, from_address, to_address):
+            item = transfer(block_number, from_address=from_address)
+            item.to_address, item.token_id, item.value = to_address, token_id, value
+            return item
+
+        zero, other = (f"0x{i:040x}" for i in (0, 1))
+        user = user_service.auth_service.get_wallet(or_create=True).address
+
+        save_transactions(TransactionBatch.from_transactions([
+            send(1, 1, 5, zero, user),
+            send(2, 1, 2, user, other), send(2, 2, 1, zero, user),
+            send(3, 4, 1, zero, user),
+            send(5, 1, 3, user, other), send(5, 2, 1, user, zero),
+        ]), context_2.contract)
+        IngestionCheckpoint.advance(context_2.contract, 10)
+
+        # the snapshot at block 4 lands between the two others, the one at block 6 is recomputed against it
+        first, last = take_snapshot(context_2.contract, 1), take_snapshot(context_2.contract, 6)
+        middle = take_snapshot(context_2.contract, 4, title="Merch drop")
+
+        def held(snapshot):
+            return {(b.token_id, b.balance) for b in snapshot.get_balances(user)}
+
+        assert held(first) == {(1, 5)}
+        assert held(middle) == {(1, 3), (2, 1), (4, 1)}
+        assert held(last) == {(4, 1)}
+
+        context_2.update_context(snapshot_id=middle.id)
+        context = OrganizationContract.get_by_id(context_2.id)
+
+        assert user_service.get_balance(context) == 5
+        assert user_service.get_balance(context, only_relevant=True) == 4
+        assert {(b.token_id, b.balance) for b in user_service.get_required_tokens_balances(context)} == {(1, 3), (2, 1)}
+
+        context.update_context(snapshot_id=last.id)
+        context = OrganizationContract.get_by_id(context_2.id)
+
+        assert user_service.get_balance(context, only_relevant=True) == 0
+        assert user_service.has_required_tokens(context) is False
+
+        # live balances are unaffected
+        assert user_service.get_balance(context_2) == 1
+
+        with pytest.raises(ApiError):
+            take_snapshot(context_2.contract, 4)
+
+        with pytest.raises(ApiError):
+            take_snapshot(context_2.contract, 11)
+
+    @freeze_time(datetime.datetime.fromtimestamp(0, tz=pytz.UTC))
+    def test_balance_cache(self, context_2, user_service, mock_settings):
+
+        from services.cache import balance_cache
+        from services.contract import save_transactions
+
+        def mint(block_number, token_id):
+            item = transfer(block_number, from_address="0x0000000000000000000000000000000000000000")
+            item.to_address, item.token_id = user_service.auth_service.wallet_address, token_id
+            return TransactionBatch.from_transactions([item])
+
+        def mint_unnoticed(block_number, token_id):
+            # saved behind the back of the cache
+            columns = Transaction.get_load_columns()
+            Transaction.bulk_load(context_2.contract, mint(block_number, token_id).rows(columns), columns)
+
+        save_transactions(mint(1, 1), context_2.contract)
+
+        # cached within the request
+        assert user_service.get_balance(context_2) == 1
+        mint_unnoticed(2, 1)
+        assert user_service.get_balance(context_2) == 1
+        assert user_service.get_balance(context_2, only_relevant=True) == 1
+        assert [b.balance for b in user_service.get_required_tokens_balances(context_2)] == [1]
+
+        # not across requests by default
+        assert user_service_of(user_service.auth_service.get_wallet()).get_balance(context_2) == 2
+
+        balance_cache.clear()
+
+        with mock_settings(balance_cache_ttl=60):
+            assert user_service_of(user_service.auth_service.get_wallet()).get_balance(context_2) == 2
+            mint_unnoticed(3, 1)
+            assert user_service_of(user_service.auth_service.get_wallet()).get_balance(context_2) == 2
+
+            # saving transfers of the contract drops its cached balances
+            save_transactions(mint(4, 1), context_2.contract)
+            assert user_service_of(user_service.auth_service.get_wallet()).get_balance(context_2) == 4
+
+        balance_cache.clear()
+
+    @freeze_time(datetime.datetime.fromtimestamp(0, tz=pytz.UTC))
+    def test_get_balance_summary(self, context_2, user_service):
+
+        from services.contract import save_transactions
+
+        def send(log_index, token_id, value, from_address, to_address):
+            item = transfer(1, index=log_index, from_address=from_address)
+            item.to_address, item.token_id, item.value = to_address, token_id, value
+            return item
+
+        zero, other = (f"0x{i:040x}" for i in (0, 1))
+        user = user_service.auth_service.wallet_address
+
+        save_transactions(TransactionBatch.from_transactions([
+            send(0, 3, 2, zero, user), send(1, 1, 5, zero, user), send(2, 4, 4, zero, user),
+            send(3, 2, 1, zero, user), send(4, 2, 1, user, other),
+        ]), context_2.contract)
+
+        with patch.object(db, 'execute_sql', wraps=db.execute_sql) as execute_sql:
+            summary = user_service.get_balance_summary(context_2)
+
+            assert user_service.get_balance(context_2) == 11
+            assert user_service.get_balance(context_2, only_relevant=True) == 7
+            assert user_service.has_required_tokens(context_2)
+
+        assert execute_sql.call_count == 1
+
+        assert (summary.balance, summary.relevant_balance) == (11, 7)
+        assert [(b.token_id, b.balance) for b in summary.token_balances] == [(1, 5), (3, 2)]
+
+    @freeze_time(datetime.datetime.fromtimestamp(0, tz=pytz.UTC))
+    def test_live_balance_fallback(self, context_2, user_service, mock_settings):
+
+        from adapters.rpc import Rpc
+        from services.cache import live_balance_cache
+
+        def service():
+            return user_service_of(user_service.auth_service.get_wallet())
+
+        live_balance_cache.clear()
+
+        with mock_settings(live_balance_enabled=True, rpc_endpoints={1: "http://node"}):
+
+            # nothing indexed, token 2 was just acquired
+            with patch.object(Rpc, "get_balances", return_value=[(1, 0), (2, 1), (3, 0)]) as get_balances:
+                assert service().get_balance(context_2, only_relevant=True) == 1
+                assert [(b.token_id, b.balance) for b in service().get_required_tokens_balances(context_2)] == [(2, 1)]
+
+            # read once, later requests are served from cache
+            get_balances.assert_called_once_with(
+                context_2.contract, user_service.auth_service.wallet_address, [1, 2, 3]
+            )
+
+            live_balance_cache.clear()
+
+            # node failing leaves indexed balances
+            with patch.object(Rpc, "get_balances", side_effect=RpcError("execution reverted")):
+                assert service().get_balance(context_2) == 0
+
+        live_balance_cache.clear()
+
+        # eligible wallets are not checked
+        Balance.insert(
+            address=user_service.auth_service.wallet_address, chain=1, contract=context_2.contract,
+            token_id=1, balance=1, date=datetime.datetime.now(),
+        ).execute()
+
+        with mock_settings(live_balance_enabled=True, rpc_endpoints={1: "http://node"}), \
+                patch.object(Rpc, "get_balances") as get_balances:
+            assert service().get_balance(context_2) == 1
+
+        get_balances.assert_not_called()
+
+    def test_identity_is_loaded_once(self, context_1, organization_1):
+
+        address = "0x0000000000000000000000000000000000000011"
+        wallet = Wallet.create(address=address, chain=1)
+        polygon_wallet = Wallet.create(address=address, chain=137)
+        organization_1.add_admin(polygon_wallet)
+
+        with patch.object(db, 'execute_sql', wraps=db.execute_sql) as execute_sql:
+            user_service = user_service_of(wallet)
+
+            assert user_service.auth_service.get_wallet() == wallet
+            assert user_service.auth_service.get_wallet(137) == polygon_wallet
+            assert user_service.has_access(organization_1)
+            assert user_service.is_super_admin() is False
+
+        assert execute_sql.call_count == 1
+        assert user_service.auth_service.identity.organization_ids == {organization_1.id}
+        assert [organization.id for organization in user_service.get_me().organizations] == [organization_1.id]
+
+    def test_identity_claims(self, organization_1):
+
+        from dependencies.user import AuthServiceType, Identity
+
+        address = "0x0000000000000000000000000000000000000011"
+        wallet = Wallet.create(address=address, chain=1)
+        organization_1.add_admin(wallet)
+
+        token = VerificationService.create_jwt(address, Identity.get_claims(address))
+
+        with patch.object(db, 'execute_sql', wraps=db.execute_sql) as execute_sql:
+            auth_service = AuthServiceType(token=token)
+
+            assert auth_service.identity.claims_based
+            assert auth_service.get_wallet().id == wallet.id
+            assert UserServiceType(auth_service).has_access(organization_1)
+
+        # only epochs of the wallet and its organizations are read
+        assert execute_sql.call_count == 1
+
+        # epochs are not cached, a bump made by any process outdates the claims right away
+        RevocationEpoch.bump_organizations([organization_1.id])
+        assert AuthServiceType(token=token).identity.claims_based is False
+        token = VerificationService.create_jwt(address, Identity.get_claims(address))
+
+        # removing the admin outdates the claims, identity is loaded from the database again
+        organization_1.remove_admin(wallet)
+        auth_service = AuthServiceType(token=token)
+
+        assert auth_service.identity.claims_based is False
+        assert UserServiceType(auth_service).has_access(organization_1) is False
+
+        auth_service = AuthServiceType(token=VerificationService.create_jwt(address, Identity.get_claims(address)))
+
+        assert auth_service.identity.claims_based
+        assert UserServiceType(auth_service).has_access(organization_1) is False
+
+        # tokens without claims keep working
+        assert AuthServiceType(token=VerificationService.create_jwt(address)).identity.claims_based is False
+
+    def test_super_admin_claims_are_revoked(self):
+
+        from dependencies.user import AuthServiceType, Identity
+
+        address = "0x0000000000000000000000000000000000000012"
+        Wallet.create(address=address, chain=1)
+        Wallet.create(address=address, chain=137)
+
+        assert Wallet.set_super_admin(address) == 2
+
+        token = VerificationService.create_jwt(address, Identity.get_claims(address))
+        auth_service = AuthServiceType(token=token)
+        assert auth_service.identity.claims_based and auth_service.is_super_admin()
+
+        Wallet.set_super_admin(address, False)
+
+        # claims issued as super admin are outdated, identity is loaded from the database again
+        auth_service = AuthServiceType(token=token)
+        assert auth_service.identity.claims_based is False
+        assert auth_service.is_super_admin() is False
+
+        assert Wallet.set_super_admin("0x0000000000000000000000000000000000000013") == 0